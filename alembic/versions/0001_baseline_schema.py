@@ -0,0 +1,260 @@
+"""baseline schema
+
+The schema as Base.metadata.create_all left it before migrations were introduced.
+Databases created that way are brought up to date in place: missing tables are
+created, nullable columns added since a table was created are added, and
+activity_sessions.title is filled in for older rows.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:24:57.245112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# A snapshot rather than app.models, so this revision keeps meaning the same schema as the models change
+meta = sa.MetaData()
+
+sa.Table(
+    'content_blobs', meta,
+    sa.Column('digest', sa.String(length=64), nullable=False),
+    sa.Column('encoding', sa.String(length=10), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('digest')
+)
+
+sa.Table(
+    'generation_cache', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cache_key', sa.String(length=64), nullable=False),
+    sa.Column('selected_category', sa.String(length=50), nullable=False),
+    sa.Column('selected_duration', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=255), nullable=True),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=True),
+    sa.Column('usage', sa.JSON(), nullable=True),
+    sa.Column('hit_count', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('last_accessed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.Index('ix_generation_cache_cache_key', 'cache_key'),
+    sa.Index('ix_generation_cache_id', 'id')
+)
+
+sa.Table(
+    'generation_telemetry', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('category', sa.String(length=50), nullable=True),
+    sa.Column('duration', sa.Integer(), nullable=True),
+    sa.Column('source', sa.String(length=20), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=True),
+    sa.Column('outcome', sa.String(length=20), nullable=False),
+    sa.Column('queue_wait_ms', sa.Integer(), nullable=True),
+    sa.Column('latency_ms', sa.Integer(), nullable=True),
+    sa.Column('ttft_ms', sa.Integer(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('input_tokens', sa.Integer(), nullable=True),
+    sa.Column('output_tokens', sa.Integer(), nullable=True),
+    sa.Column('cache_read_input_tokens', sa.Integer(), nullable=True),
+    sa.Column('cache_creation_input_tokens', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.Index('ix_generation_telemetry_created_at', 'created_at'),
+    sa.Index('ix_generation_telemetry_id', 'id')
+)
+
+sa.Table(
+    'parents', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('password_hash'),
+    sa.Index('ix_parents_id', 'id')
+)
+
+sa.Table(
+    'reimbursement_items', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('points_cost', sa.Integer(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.Index('ix_reimbursement_items_id', 'id')
+)
+
+sa.Table(
+    'system_config', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('config_key', sa.String(length=100), nullable=False),
+    sa.Column('config_value', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('config_key'),
+    sa.Index('ix_system_config_id', 'id')
+)
+
+sa.Table(
+    'users', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.Index('ix_users_id', 'id')
+)
+
+sa.Table(
+    'activity_sessions', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('selected_duration', sa.Integer(), nullable=False),
+    sa.Column('selected_materials', sa.JSON(), nullable=False),
+    sa.Column('selected_objectives', sa.JSON(), nullable=False),
+    sa.Column('selected_category', sa.String(length=50), nullable=False),
+    sa.Column('title', sa.String(length=255), nullable=True),
+    sa.Column('anthropic_prompt', sa.Text(), nullable=True),
+    sa.Column('prompt_template_id', sa.String(length=64), nullable=True),
+    sa.Column('prompt_variables', sa.JSON(), nullable=True),
+    sa.Column('generated_activity', sa.JSON(), nullable=False),
+    sa.Column('raw_content_digest', sa.String(length=64), nullable=True),
+    sa.Column('generation_timestamp', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('alternate_activities', sa.JSON(), nullable=True),
+    sa.Column('regenerated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('start_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('pause_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('resume_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('actual_duration', sa.Integer(), nullable=True),
+    sa.Column('extensions_used', sa.Integer(), nullable=True),
+    sa.Column('max_possible_score', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['raw_content_digest'], ['content_blobs.digest']),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    sa.PrimaryKeyConstraint('id'),
+    sa.Index('ix_activity_sessions_id', 'id')
+)
+
+sa.Table(
+    'daily_stats', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('activities_completed', sa.Integer(), nullable=True),
+    sa.Column('total_points', sa.Integer(), nullable=True),
+    sa.Column('total_time_minutes', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'date', name='uq_user_date'),
+    sa.Index('ix_daily_stats_id', 'id')
+)
+
+sa.Table(
+    'reimbursement_history', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('item_name', sa.String(), nullable=False),
+    sa.Column('points_cost', sa.Integer(), nullable=False),
+    sa.Column('redeemed_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    sa.PrimaryKeyConstraint('id'),
+    sa.Index('ix_reimbursement_history_id', 'id')
+)
+
+sa.Table(
+    'token_ledger', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('requests', sa.Integer(), nullable=True),
+    sa.Column('input_tokens', sa.Integer(), nullable=True),
+    sa.Column('output_tokens', sa.Integer(), nullable=True),
+    sa.Column('cache_read_input_tokens', sa.Integer(), nullable=True),
+    sa.Column('cache_creation_input_tokens', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'date', name='uq_token_ledger_user_date'),
+    sa.Index('ix_token_ledger_id', 'id')
+)
+
+sa.Table(
+    'weekly_reimbursement_status', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('week_start_date', sa.Date(), nullable=False),
+    sa.Column('can_reimburse', sa.Boolean(), nullable=True),
+    sa.Column('last_reimbursement_date', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    sa.PrimaryKeyConstraint('id'),
+    sa.Index('ix_weekly_reimbursement_status_id', 'id')
+)
+
+sa.Table(
+    'activity_scores', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('session_id', sa.Integer(), nullable=False),
+    sa.Column('parent_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('scored_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['parent_id'], ['parents.id']),
+    sa.ForeignKeyConstraint(['session_id'], ['activity_sessions.id']),
+    sa.PrimaryKeyConstraint('id'),
+    sa.Index('ix_activity_scores_id', 'id')
+)
+
+sa.Table(
+    'point_deductions', meta,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('points_deducted', sa.Integer(), nullable=False),
+    sa.Column('deduction_date', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('reimbursement_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['reimbursement_id'], ['reimbursement_history.id']),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    sa.PrimaryKeyConstraint('id'),
+    sa.Index('ix_point_deductions_id', 'id')
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table in meta.sorted_tables:
+        if not inspector.has_table(table.name):
+            table.create(bind)
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                op.add_column(table.name, sa.Column(column.name, column.type, nullable=True))
+
+    sessions = meta.tables["activity_sessions"]
+    op.execute(
+        sessions.update()
+        .where(sessions.c.title.is_(None))
+        .values(title=sa.func.substr(sessions.c.generated_activity["title"].as_string(), 1, 255))
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(meta.sorted_tables):
+        op.drop_table(table.name)
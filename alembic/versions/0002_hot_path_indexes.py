@@ -0,0 +1,41 @@
+"""hot path indexes
+
+Indexes for the most frequent filters: a child's sessions by status and age,
+scores by session, and a child's deductions, redemptions and weekly status.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:25:27.853358
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_activity_sessions_user_status_created", "activity_sessions", ["user_id", "status", "created_at"]),
+    ("ix_activity_scores_session_id", "activity_scores", ["session_id"]),
+    ("ix_point_deductions_user_id", "point_deductions", ["user_id"]),
+    ("ix_reimbursement_history_user_redeemed", "reimbursement_history", ["user_id", "redeemed_at"]),
+    ("ix_weekly_reimbursement_status_user_week", "weekly_reimbursement_status", ["user_id", "week_start_date"])
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,56 @@
+"""user balances
+
+Each child's lifetime points earned, spent, balance and scored-activity count,
+filled in here from daily_stats, point_deductions and activity_sessions.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:28:27.130994
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    balances = op.create_table('user_balances',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('lifetime_earned', sa.Integer(), nullable=False),
+    sa.Column('spent', sa.Integer(), nullable=False),
+    sa.Column('balance', sa.Integer(), nullable=False),
+    sa.Column('scored_activities', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    users = sa.table('users', sa.column('id'))
+    daily_stats = sa.table('daily_stats', sa.column('user_id'), sa.column('total_points'))
+    point_deductions = sa.table('point_deductions', sa.column('user_id'), sa.column('points_deducted'))
+    activity_sessions = sa.table('activity_sessions', sa.column('id'), sa.column('user_id'), sa.column('status'))
+
+    earned = sa.select(sa.func.coalesce(sa.func.sum(daily_stats.c.total_points), 0))\
+        .where(daily_stats.c.user_id == users.c.id).scalar_subquery()
+    spent = sa.select(sa.func.coalesce(sa.func.sum(point_deductions.c.points_deducted), 0))\
+        .where(point_deductions.c.user_id == users.c.id).scalar_subquery()
+    scored = sa.select(sa.func.count(activity_sessions.c.id))\
+        .where(activity_sessions.c.user_id == users.c.id, activity_sessions.c.status == 'scored').scalar_subquery()
+    op.execute(balances.insert().from_select(
+        ['user_id', 'lifetime_earned', 'spent', 'balance', 'scored_activities'],
+        sa.select(users.c.id, earned, spent, sa.case((earned - spent > 0, earned - spent), else_=0), scored)
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_balances')
@@ -0,0 +1,30 @@
+"""activity created index
+
+All activity sessions newest first, for keyset pagination of the admin
+activity pages on (created_at, id).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:33:06.512773
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_activity_sessions_created_at', 'activity_sessions', ['created_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_activity_sessions_created_at', table_name='activity_sessions')
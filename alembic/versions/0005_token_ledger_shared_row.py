@@ -0,0 +1,76 @@
+"""token ledger shared row
+
+Usage not made for a particular child is kept under user_id 0 instead of NULL,
+so the unique (user_id, date) constraint also allows one such row per day.
+Duplicate NULL rows are merged, and user_id is no longer a foreign key.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 14:02:41.207311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SHARED_USER_ID = 0
+COUNTERS = ['requests', 'input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens']
+
+
+def _create_ledger(user_id: sa.Column, *constraints) -> sa.Table:
+    return op.create_table('token_ledger',
+    sa.Column('id', sa.Integer(), nullable=False),
+    user_id,
+    sa.Column('date', sa.Date(), nullable=False),
+    *[sa.Column(name, sa.Integer(), nullable=True) for name in COUNTERS],
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    *constraints,
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'date', name='uq_token_ledger_user_date')
+    )
+
+
+def _rebuild_ledger(user_id_from, user_id: sa.Column, *constraints):
+    """Recreate token_ledger with a new user_id column, merging rows that now share a (user_id, date)"""
+    ledger = sa.table('token_ledger', sa.column('user_id', sa.Integer()), sa.column('date', sa.Date()),
+                      sa.column('updated_at', sa.DateTime(timezone=True)),
+                      *[sa.column(name, sa.Integer()) for name in COUNTERS])
+    key = user_id_from(ledger.c.user_id).label('user_id')
+    rows = op.get_bind().execute(
+        sa.select(key, ledger.c.date, *[sa.func.sum(ledger.c[name]).label(name) for name in COUNTERS],
+                  sa.func.max(ledger.c.updated_at).label('updated_at'))
+        .group_by(key, ledger.c.date)
+    ).mappings().all()
+
+    op.drop_index('ix_token_ledger_id', table_name='token_ledger')
+    op.drop_table('token_ledger')
+    table = _create_ledger(user_id, *constraints)
+    op.create_index('ix_token_ledger_id', 'token_ledger', ['id'])
+    if rows:
+        op.bulk_insert(table, [dict(row) for row in rows])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _rebuild_ledger(
+        lambda user_id: sa.func.coalesce(user_id, SHARED_USER_ID),
+        sa.Column('user_id', sa.Integer(), nullable=False)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rebuild_ledger(
+        lambda user_id: sa.func.nullif(user_id, SHARED_USER_ID),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'])
+    )
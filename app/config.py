@@ -6,12 +6,52 @@ import os
 class Settings(BaseSettings):
     # Anthropic API Configuration
     anthropic_api_key: str
+    anthropic_base_url: Optional[str] = None  # e.g. http://127.0.0.1:8765 for fake_anthropic_server.py
     anthropic_model: str = "claude-3-haiku-20240307"
     anthropic_max_tokens: int = 1500
     anthropic_temperature: float = 0.7
+    anthropic_timeout_seconds: float = 30.0
+    anthropic_connect_timeout_seconds: float = 5.0
+    anthropic_max_connections: int = 10
+    anthropic_max_keepalive_connections: int = 5
+    anthropic_keepalive_expiry_seconds: float = 60.0
+    anthropic_max_concurrent_requests: int = 4
+    anthropic_prompt_caching_enabled: bool = True
+    
+    # Retry, hedging and circuit breaker policy for Anthropic calls
+    anthropic_retry_max_attempts: int = 3
+    anthropic_retry_base_delay_seconds: float = 0.5
+    anthropic_retry_max_delay_seconds: float = 4.0
+    anthropic_request_deadline_seconds: float = 30.0
+    anthropic_hedging_enabled: bool = False
+    anthropic_hedge_after_seconds: float = 0.0  # 0 uses the observed p95 latency
+    anthropic_circuit_failure_threshold: int = 5
+    anthropic_circuit_reset_seconds: float = 30.0
+    
+    # Model and max_tokens routing by activity duration, category and observed latency
+    anthropic_routing_enabled: bool = True
+    anthropic_fallback_model: str = ""  # faster model used when the primary misses its SLO; empty disables
+    anthropic_latency_slo_seconds: float = 10.0  # p95 target for the primary model
+    anthropic_tokens_base: int = 1000
+    anthropic_tokens_per_minute: int = 200  # added per minute of selected duration, capped at anthropic_max_tokens
+    anthropic_routing_min_samples: int = 20
     
     # Database Configuration
     database_url: str = "sqlite:///./galactic_academy.db"
+    async_database_url: str = ""  # empty derives it from database_url (sqlite+aiosqlite, postgresql+asyncpg)
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_timeout_seconds: float = 30.0
+    database_pool_recycle_seconds: int = 1800
+    database_pool_pre_ping: bool = True
+    
+    # SQLite storage profile, applied on every connection; an empty value keeps SQLite's default
+    sqlite_journal_mode: str = "WAL"  # readers no longer wait for writers
+    sqlite_synchronous: str = "NORMAL"  # durable in WAL mode except across power loss
+    sqlite_busy_timeout_ms: int = 5000  # wait for a lock instead of failing with "database is locked"
+    sqlite_cache_size_kib: int = 16384
+    sqlite_mmap_size_mb: int = 64
+    sqlite_temp_store: str = "MEMORY"
     
     # Application Configuration
     secret_key: str
@@ -26,6 +66,63 @@ class Settings(BaseSettings):
     extension_penalty: int = 5
     max_extensions_per_activity: int = 2
     regenerate_cooldown_minutes: int = 15
+    activity_alternates_count: int = 1  # alternates generated per activity for instant regenerate; 0 disables
+    # Stream generated activities to the review page over Server-Sent Events
+    activity_streaming_enabled: bool = True
+    activity_structured_output_enabled: bool = True  # JSON via tool use instead of parsing free text
+    
+    # Near-duplicate detection over each child's full activity history
+    activity_similarity_enabled: bool = True
+    activity_similarity_threshold: float = 0.6  # estimated Jaccard similarity of word shingles
+    activity_similarity_max_regenerations: int = 1
+    
+    # Identical generate requests within this window reuse the same session
+    generation_coalesce_window_seconds: int = 10
+    
+    # In-process generation job queue (used when streaming is disabled)
+    generation_queue_enabled: bool = True
+    generation_queue_workers: int = 2
+    generation_queue_max_depth: int = 20
+    generation_job_retention_seconds: int = 600
+    
+    # Pre-generated activity pool per (category, duration) bucket
+    activity_pool_enabled: bool = True
+    activity_pool_size_per_bucket: int = 2
+    activity_pool_max_age_minutes: int = 360
+    activity_pool_refill_interval_seconds: int = 30
+    
+    # Persistent cache of generations keyed on normalized selections
+    generation_cache_enabled: bool = True
+    generation_cache_ttl_hours: int = 72
+    generation_cache_max_entries: int = 500
+    generation_cache_max_tokens_step: int = 500  # routed max_tokens is rounded up to a multiple of this in cache keys
+    
+    # Local procedural generator: fallback when Anthropic fails or a request is over budget
+    offline_generator_enabled: bool = True
+    instant_mode_enabled: bool = True  # let children skip Anthropic and get an offline activity right away
+    
+    # Token budgets and admission control for generations (0 disables a limit)
+    token_budget_enabled: bool = True
+    child_daily_token_budget: int = 50000
+    global_daily_token_budget: int = 1000000
+    child_requests_per_minute: float = 2.0
+    child_request_burst: int = 3
+    global_requests_per_minute: float = 30.0
+    global_request_burst: int = 10
+    global_tokens_per_minute: int = 40000
+    
+    # Content-addressed storage of activity bodies and prompt templates
+    content_blob_compression_enabled: bool = True
+    content_blob_compress_min_bytes: int = 256  # smaller payloads are stored uncompressed
+    
+    # Child page banner stats, read in one query per request; also cached per child when set (0 disables)
+    banner_stats_cache_ttl_seconds: int = 0
+    
+    # Admin activity management page
+    admin_activities_page_size: int = 50
+    
+    # Admin generation telemetry report
+    telemetry_report_max_days: int = 30  # longest window a report may cover
     
     # Materials Configuration
     min_materials_selection: int = 3
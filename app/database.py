@@ -1,17 +1,96 @@
-from sqlalchemy import create_engine, MetaData
+import logging
+import os
+from typing import Dict, Any
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, MetaData, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from app.config import settings
 
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """The SQLite storage profile from settings; empty values leave SQLite's default"""
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout_ms,
+        # Negative cache_size is in KiB rather than pages
+        "cache_size": -settings.sqlite_cache_size_kib if settings.sqlite_cache_size_kib else None,
+        "mmap_size": settings.sqlite_mmap_size_mb * 1024 * 1024 if settings.sqlite_mmap_size_mb else None,
+        "temp_store": settings.sqlite_temp_store
+    }
+
+
+def apply_sqlite_pragmas(sync_engine: Engine, pragmas: Dict[str, Any]):
+    """Run the pragmas on every new connection; most of them only last for the connection"""
+    pragmas = {name: value for name, value in pragmas.items() if value not in (None, "")}
+    
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """Pool sizing and health checks; an in-memory SQLite database keeps SQLAlchemy's single-connection pool"""
+    options = {"pool_pre_ping": settings.database_pool_pre_ping}
+    if ":memory:" not in url and "mode=memory" not in url:
+        options.update(
+            pool_size=settings.database_pool_size,
+            max_overflow=settings.database_max_overflow,
+            pool_timeout=settings.database_pool_timeout_seconds,
+            pool_recycle=settings.database_pool_recycle_seconds
+        )
+    return options
+
+
+def make_engine(url: str, pragmas: Dict[str, Any] = None) -> Engine:
+    """Create a sync engine; SQLite connections get the storage profile (sqlite_pragmas() unless given)"""
+    if not url.startswith("sqlite"):
+        return create_engine(url, **engine_options(url))
+    sqlite_engine = create_engine(url, connect_args={"check_same_thread": False}, **engine_options(url))
+    apply_sqlite_pragmas(sqlite_engine, sqlite_pragmas() if pragmas is None else pragmas)
+    return sqlite_engine
+
+
 # Create database engine
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+engine = make_engine(settings.database_url)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def get_async_database_url() -> str:
+    """The database URL with an asyncio driver: aiosqlite for SQLite, asyncpg for PostgreSQL"""
+    if settings.async_database_url:
+        return settings.async_database_url
+    url = settings.database_url
+    for prefix, async_prefix in (("sqlite://", "sqlite+aiosqlite://"),
+                                 ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+                                 ("postgresql://", "postgresql+asyncpg://")):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+# Async engine and session factory for code running on the event loop; same database as engine
+async_engine = create_async_engine(get_async_database_url(), **engine_options(get_async_database_url()))
+if async_engine.dialect.name == "sqlite":
+    apply_sqlite_pragmas(async_engine.sync_engine, sqlite_pragmas())
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create base class for models
 Base = declarative_base()
 
@@ -28,6 +107,35 @@ def get_db():
         db.close()
 
 
-def create_tables():
-    """Create all database tables"""
-    Base.metadata.create_all(bind=engine) 
\ No newline at end of file
+async def get_async_db():
+    """Dependency to get an async database session, for routes whose queries shouldn't block the event loop"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def alembic_config(connection=None) -> Config:
+    """Alembic configuration for this project, optionally bound to an open connection"""
+    config = Config(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini"))
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def run_migrations(revision: str = "head"):
+    """Upgrade the database schema with Alembic (same as `python -m alembic upgrade head`)"""
+    with engine.begin() as connection:
+        command.upgrade(alembic_config(connection), revision)
+
+
+def check_migrations() -> bool:
+    """Whether the database is at the latest migration; logs how to upgrade it if not"""
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    with engine.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+    if current != head:
+        logger.warning(f"Database schema is at revision {current}, latest is {head}; "
+                       f"run `python -m alembic upgrade head`")
+        return False
+    logger.info(f"Database schema is at revision {current}")
+    return True
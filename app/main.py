@@ -8,9 +8,12 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, RedirectResponse
 from sqlalchemy.orm import Session
-from app.database import get_db, create_tables
+from app.database import get_db, check_migrations, async_engine
 from app.config import settings
 from app.routers import auth, activities, scoring, dashboard, admin, reimbursement
+from app.services.anthropic_service import AnthropicService
+from app.services.telemetry_service import TelemetryService
+from app.services.token_budget_service import TokenBudgetService
 from starlette.middleware.sessions import SessionMiddleware
 
 # --- Logging Setup ---
@@ -75,8 +78,22 @@ app.include_router(reimbursement.router, prefix="/reimbursement", tags=["reimbur
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database tables on startup"""
-    create_tables()
+    """Check the database schema is migrated and start background workers on startup"""
+    # The schema is managed by Alembic: `python -m alembic upgrade head`
+    check_migrations()
+    activities.activity_service.pool_service.start()
+    activities.generation_queue.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers, finish pending writes and release shared connection pools on shutdown"""
+    await activities.generation_queue.stop()
+    await activities.activity_service.pool_service.stop()
+    await AnthropicService.aclose()
+    await TelemetryService.flush()
+    await TokenBudgetService.flush()
+    await async_engine.dispose()
 
 
 @app.get("/", response_class=HTMLResponse)
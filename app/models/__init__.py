@@ -5,6 +5,11 @@ from .scoring import ActivityScore
 from .config import SystemConfig
 from .daily_stats import DailyStats
 from .reimbursement import ReimbursementHistory, WeeklyReimbursementStatus, ReimbursementItem, PointDeduction
+from .generation_cache import GenerationCacheEntry
+from .token_ledger import TokenLedgerEntry
+from .generation_telemetry import GenerationTelemetry
+from .content_blob import ContentBlob
+from .user_balance import UserBalance
 
 __all__ = [
     "User",
@@ -16,5 +21,10 @@ __all__ = [
     "ReimbursementHistory",
     "WeeklyReimbursementStatus",
     "ReimbursementItem",
-    "PointDeduction"
+    "PointDeduction",
+    "GenerationCacheEntry",
+    "TokenLedgerEntry",
+    "GenerationTelemetry",
+    "ContentBlob",
+    "UserBalance"
 ] 
\ No newline at end of file
@@ -1,7 +1,7 @@
 from sqlalchemy import Column, Integer, String, DateTime, Text, JSON
 from sqlalchemy.sql import func
-from sqlalchemy import ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import ForeignKey, Index
+from sqlalchemy.orm import relationship, deferred
 from app.database import Base
 
 
@@ -18,10 +18,18 @@ class ActivitySession(Base):
     selected_objectives = Column(JSON, nullable=False)
     selected_category = Column(String(50), nullable=False)
     
-    # Generated content
-    anthropic_prompt = Column(Text)
-    generated_activity = Column(JSON, nullable=False)
+    # Summary of the generated activity for list pages, so they needn't load the content below
+    title = Column(String(255))
+    
+    # Generated content; the "content" group is loaded on first access, or up front by detail queries
+    anthropic_prompt = deferred(Column(Text), group="content")  # only on rows not yet compacted; see ActivityService.get_prompt
+    prompt_template_id = Column(String(64))  # e.g. activity_prompt@94530fafb553
+    prompt_variables = deferred(Column(JSON), group="content")  # the prompt is rebuilt from these and the template version
+    generated_activity = deferred(Column(JSON, nullable=False), group="content")  # parsed activity without raw_content
+    raw_content_digest = Column(String(64), ForeignKey("content_blobs.digest"))
     generation_timestamp = Column(DateTime(timezone=True))
+    alternate_activities = deferred(Column(JSON), group="content")  # extra candidates served by "give me a different one"
+    regenerated_at = Column(DateTime(timezone=True))
     
     # Session tracking
     start_time = Column(DateTime(timezone=True))
@@ -34,6 +42,13 @@ class ActivitySession(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
+    # A child's sessions by status, newest first (dashboards, history, active-activity checks),
+    # and every session newest first (admin activity pages)
+    __table_args__ = (
+        Index("ix_activity_sessions_user_status_created", "user_id", "status", "created_at"),
+        Index("ix_activity_sessions_created_at", "created_at")
+    )
+    
     # Relationships
     user = relationship("User", backref="activity_sessions")
     scores = relationship("ActivityScore", back_populates="session")
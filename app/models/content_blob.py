@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class ContentBlob(Base):
+    __tablename__ = "content_blobs"
+    
+    # sha256 of the uncompressed UTF-8 payload, so identical payloads share one row
+    digest = Column(String(64), primary_key=True)
+    encoding = Column(String(10), nullable=False, default="identity")  # identity, zlib
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)  # uncompressed bytes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<ContentBlob(digest='{self.digest[:12]}', encoding='{self.encoding}', size={self.size})>"
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class GenerationCacheEntry(Base):
+    __tablename__ = "generation_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # Hash of the normalized selections and template version; several entries can share a key
+    cache_key = Column(String(64), nullable=False, index=True)
+    selected_category = Column(String(50), nullable=False)
+    selected_duration = Column(Integer, nullable=False)
+    
+    title = Column(String(255))
+    content = Column(Text, nullable=False)
+    model = Column(String(100))
+    usage = Column(JSON)
+    
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_accessed_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    def __repr__(self):
+        return f"<GenerationCacheEntry(id={self.id}, cache_key='{self.cache_key}', hits={self.hit_count})>"
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class GenerationTelemetry(Base):
+    __tablename__ = "generation_telemetry"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    user_id = Column(Integer)  # null for background generations such as pool refills
+    category = Column(String(50))
+    duration = Column(Integer)
+    source = Column(String(20), nullable=False)  # anthropic, stream, cache, pool, offline, pool_refill, alternate
+    model = Column(String(100))
+    outcome = Column(String(20), nullable=False)  # success, failed, fallback
+    
+    # Timings in milliseconds; upstream ones are null when the API wasn't called
+    queue_wait_ms = Column(Integer)
+    latency_ms = Column(Integer)
+    ttft_ms = Column(Integer)
+    attempts = Column(Integer, default=0)
+    
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    cache_read_input_tokens = Column(Integer, default=0)
+    cache_creation_input_tokens = Column(Integer, default=0)
+    
+    def __repr__(self):
+        return f"<GenerationTelemetry(id={self.id}, source='{self.source}', outcome='{self.outcome}')>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Date
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Date, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -26,6 +26,8 @@ class ReimbursementHistory(Base):
     points_cost = Column(Integer, nullable=False)
     redeemed_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (Index("ix_reimbursement_history_user_redeemed", "user_id", "redeemed_at"),)
+    
     # Relationships
     user = relationship("User", back_populates="reimbursements")
     point_deduction = relationship("PointDeduction", back_populates="reimbursement", uselist=False)
@@ -41,6 +43,8 @@ class WeeklyReimbursementStatus(Base):
     can_reimburse = Column(Boolean, default=True)
     last_reimbursement_date = Column(DateTime(timezone=True), nullable=True)
     
+    __table_args__ = (Index("ix_weekly_reimbursement_status_user_week", "user_id", "week_start_date"),)
+    
     # Relationship
     user = relationship("User", back_populates="weekly_reimbursement_status")
 
@@ -50,7 +54,7 @@ class PointDeduction(Base):
     __tablename__ = "point_deductions"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     points_deducted = Column(Integer, nullable=False)
     deduction_date = Column(DateTime(timezone=True), server_default=func.now())
     reimbursement_id = Column(Integer, ForeignKey("reimbursement_history.id"), nullable=False)
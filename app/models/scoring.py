@@ -9,7 +9,7 @@ class ActivityScore(Base):
     __tablename__ = "activity_scores"
     
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("activity_sessions.id"), nullable=False)
+    session_id = Column(Integer, ForeignKey("activity_sessions.id"), nullable=False, index=True)
     parent_id = Column(Integer, ForeignKey("parents.id"), nullable=False)
     score = Column(Integer, nullable=False)
     scored_at = Column(DateTime(timezone=True), server_default=func.now())
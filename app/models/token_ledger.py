@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, Date, DateTime
+from sqlalchemy.sql import func
+from sqlalchemy import UniqueConstraint
+from app.database import Base
+
+# user_id of the row for generations not made for a particular child, e.g. activity pool
+# refills. A real value rather than NULL, so the unique (user_id, date) constraint covers it
+SHARED_USER_ID = 0
+
+
+class TokenLedgerEntry(Base):
+    __tablename__ = "token_ledger"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # A child's users.id, or SHARED_USER_ID; not a foreign key as the shared row has no user
+    user_id = Column(Integer, nullable=False)
+    date = Column(Date, nullable=False)
+    requests = Column(Integer, default=0)
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    cache_read_input_tokens = Column(Integer, default=0)
+    cache_creation_input_tokens = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (UniqueConstraint('user_id', 'date', name='uq_token_ledger_user_date'),)
+    
+    def __repr__(self):
+        return f"<TokenLedgerEntry(id={self.id}, user_id={self.user_id}, date={self.date})>"
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, DateTime
+from sqlalchemy.sql import func
+from sqlalchemy import ForeignKey
+from app.database import Base
+
+
+class UserBalance(Base):
+    """
+    A child's points, kept in step with daily_stats and point_deductions by
+    BalanceService in the same transaction as each change to them.
+    """
+    __tablename__ = "user_balances"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    lifetime_earned = Column(Integer, nullable=False, default=0)  # SUM(daily_stats.total_points)
+    spent = Column(Integer, nullable=False, default=0)  # SUM(point_deductions.points_deducted)
+    balance = Column(Integer, nullable=False, default=0)  # earned - spent, never below zero
+    scored_activities = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<UserBalance(user_id={self.user_id}, balance={self.balance})>"
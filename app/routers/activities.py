@@ -1,15 +1,15 @@
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from app.database import get_db
 from app.models.user import User
 from app.models.activity import ActivitySession
-from app.models.daily_stats import DailyStats
 from app.services.activity_service import ActivityService
 from app.services.session_service import SessionService
-from app.services.scoring_service import ScoringService
+from app.services.banner_stats_service import BannerStatsService
+from app.services.generation_queue_service import GenerationQueueService
 from app.config import settings
 from fastapi.templating import Jinja2Templates
 from typing import List
@@ -24,11 +24,12 @@ router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 activity_service = ActivityService()
 session_service = SessionService()
-scoring_service = ScoringService()
+banner_stats_service = BannerStatsService()
+generation_queue = GenerationQueueService(activity_service)
 
 
 @router.get("/setup", response_class=HTMLResponse)
-async def activity_setup_page(request: Request, db: Session = Depends(get_db)):
+def activity_setup_page(request: Request, db: Session = Depends(get_db)):
     """Show activity setup page"""
     user_id = request.session.get("user_id")
     if not user_id:
@@ -37,13 +38,14 @@ async def activity_setup_page(request: Request, db: Session = Depends(get_db)):
     logger.info(f"User {user_id} accessed activity setup page")
 
     # Stats for banner
-    daily_stats = scoring_service.get_daily_stats(db, user_id)
-    total_activities = db.query(ActivitySession).filter(ActivitySession.user_id == user_id, ActivitySession.status == "scored").count()
-    total_points = db.query(func.coalesce(func.sum(DailyStats.total_points), 0)).filter(DailyStats.user_id == user_id).scalar()
+    banner = banner_stats_service.get(db, user_id, request)
+    daily_stats = banner["daily_stats"]
+    total_activities = banner["total_activities"]
+    total_points = banner["total_points"]
     max_activities_per_day = settings.max_activities_per_day
     
     # Check if user can start new activity
-    if not scoring_service.can_start_new_activity(db, user_id):
+    if not banner["can_start_new"]:
         today_stats = daily_stats
         session = db.query(ActivitySession).filter(
             ActivitySession.user_id == user_id,
@@ -78,7 +80,8 @@ async def activity_setup_page(request: Request, db: Session = Depends(get_db)):
         "daily_stats": daily_stats,
         "total_activities": total_activities,
         "total_points": total_points,
-        "max_activities_per_day": max_activities_per_day
+        "max_activities_per_day": max_activities_per_day,
+        "instant_mode_enabled": settings.instant_mode_enabled and settings.offline_generator_enabled
     })
 
 
@@ -89,7 +92,7 @@ async def generate_activity(
     materials: List[str] = Form(...),
     objectives: List[str] = Form(...),
     category: str = Form(...),
-    db: Session = Depends(get_db)
+    instant: bool = Form(False)
 ):
     """Generate a new activity"""
     logger.info("Starting activity generation")
@@ -114,11 +117,42 @@ async def generate_activity(
         logger.error(f"Invalid category: {category}")
         raise HTTPException(status_code=400, detail="Invalid category")
     
+    instant = instant and settings.instant_mode_enabled
+    # Admission may load the day's token totals from the ledger, so it runs in the threadpool
+    if instant or not (await run_in_threadpool(activity_service.token_budget.admit, user_id))["success"]:
+        # Instant mode or over budget: serve straight from the pool, cache or offline
+        # generator rather than queueing behind the API
+        result = await activity_service.generate_activity(
+            user_id, duration, materials, objectives, category, api_allowed=False
+        )
+        if not result["success"]:
+            raise HTTPException(status_code=429, detail=result["error"])
+        logger.info(f"Served {'instant' if instant else 'over-budget'} request from user {user_id} from {result['source']}")
+        return RedirectResponse(url=f"/activities/{result['session_id']}/review", status_code=302)
+    
+    if settings.activity_streaming_enabled:
+        # Hand the selections to the streaming review page, which opens the SSE stream
+        request.session["pending_generation"] = {
+            "duration": duration,
+            "materials": materials,
+            "objectives": objectives,
+            "category": category
+        }
+        logger.info(f"Redirecting user {user_id} to streaming generation")
+        return RedirectResponse(url="/activities/stream", status_code=302)
+    
+    if generation_queue.running:
+        # Hand the generation to the worker pool and let the browser poll for it
+        result = generation_queue.submit(user_id, duration, materials, objectives, category)
+        if not result["success"]:
+            raise HTTPException(status_code=503, detail=result["error"])
+        return RedirectResponse(url=f"/activities/jobs/{result['job_id']}", status_code=302)
+    
     try:
         logger.info("Calling activity_service.generate_activity")
         # Generate activity
         result = await activity_service.generate_activity(
-            db, user_id, duration, materials, objectives, category
+            user_id, duration, materials, objectives, category
         )
         
         logger.info(f"Activity generation result: {result}")
@@ -135,8 +169,175 @@ async def generate_activity(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@router.get("/jobs/metrics")
+async def generation_queue_metrics(request: Request):
+    """Generation queue depth and wait-time metrics"""
+    user_id = request.session.get("user_id")
+    user_type = request.session.get("user_type")
+    if not user_id or user_type != "parent":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return JSONResponse(content=generation_queue.get_stats())
+
+
+@router.get("/parse/metrics")
+async def activity_parse_metrics(request: Request):
+    """Structured vs free-text parse counts, failure rate and parse latency"""
+    user_id = request.session.get("user_id")
+    user_type = request.session.get("user_type")
+    if not user_id or user_type != "parent":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return JSONResponse(content=activity_service.parse_stats.get_stats())
+
+
+@router.get("/routing/metrics")
+async def model_routing_metrics(request: Request):
+    """Per-route model choice, latency and token usage"""
+    user_id = request.session.get("user_id")
+    user_type = request.session.get("user_type")
+    if not user_id or user_type != "parent":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return JSONResponse(content=activity_service.anthropic_service.router.get_stats())
+
+
+@router.get("/budget/metrics")
+async def token_budget_metrics(request: Request):
+    """Admission decisions, today's token usage and bucket levels"""
+    user_id = request.session.get("user_id")
+    user_type = request.session.get("user_type")
+    if not user_id or user_type != "parent":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return JSONResponse(content=activity_service.token_budget.get_stats())
+
+
+@router.get("/pool/metrics")
+async def activity_pool_metrics(request: Request):
+    """Activity pool hit rate, refills, evictions and bucket sizes"""
+    user_id = request.session.get("user_id")
+    user_type = request.session.get("user_type")
+    if not user_id or user_type != "parent":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return JSONResponse(content=activity_service.pool_service.get_stats())
+
+
+@router.get("/cache/metrics")
+def generation_cache_metrics(request: Request, db: Session = Depends(get_db)):
+    """Generation cache hit rate, evictions and size"""
+    user_id = request.session.get("user_id")
+    user_type = request.session.get("user_type")
+    if not user_id or user_type != "parent":
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    return JSONResponse(content=activity_service.cache_service.get_stats(db))
+
+
+@router.get("/jobs/{job_id}", response_class=HTMLResponse)
+def generation_job_page(request: Request, job_id: str, db: Session = Depends(get_db)):
+    """Waiting page shown while a queued generation runs"""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return RedirectResponse(url="/auth/login", status_code=302)
+    
+    job_status = generation_queue.get_job_status(job_id, user_id)
+    if not job_status:
+        raise HTTPException(status_code=404, detail="Activity not found")
+    if job_status["status"] == "done":
+        return RedirectResponse(url=job_status["review_url"], status_code=302)
+    
+    banner = banner_stats_service.get(db, user_id, request)
+    daily_stats = banner["daily_stats"]
+    total_activities = banner["total_activities"]
+    total_points = banner["total_points"]
+    max_activities_per_day = settings.max_activities_per_day
+    
+    return templates.TemplateResponse("child/activity_generating.html", {
+        "request": request,
+        "job": job_status,
+        "daily_stats": daily_stats,
+        "total_activities": total_activities,
+        "total_points": total_points,
+        "max_activities_per_day": max_activities_per_day
+    })
+
+
+@router.get("/jobs/{job_id}/status")
+async def generation_job_status(request: Request, job_id: str):
+    """Current status of a queued generation: queued, running, done or failed"""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Not logged in")
+    
+    job_status = generation_queue.get_job_status(job_id, user_id)
+    if not job_status:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return JSONResponse(content=job_status)
+
+
+@router.get("/stream", response_class=HTMLResponse)
+def stream_activity_page(request: Request, db: Session = Depends(get_db)):
+    """Review page that fills in the activity while it is being generated"""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return RedirectResponse(url="/auth/login", status_code=302)
+    
+    selections = request.session.get("pending_generation")
+    if not selections:
+        return RedirectResponse(url="/activities/setup", status_code=302)
+    
+    banner = banner_stats_service.get(db, user_id, request)
+    daily_stats = banner["daily_stats"]
+    total_activities = banner["total_activities"]
+    total_points = banner["total_points"]
+    max_activities_per_day = settings.max_activities_per_day
+    
+    return templates.TemplateResponse("child/activity_stream.html", {
+        "request": request,
+        "selections": selections,
+        "daily_stats": daily_stats,
+        "total_activities": total_activities,
+        "total_points": total_points,
+        "max_activities_per_day": max_activities_per_day
+    })
+
+
+@router.get("/stream/events")
+async def stream_activity_events(request: Request):
+    """Server-Sent Events stream of the activity being generated"""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Not logged in")
+    
+    selections = request.session.pop("pending_generation", None)
+    if not selections:
+        raise HTTPException(status_code=400, detail="No activity generation pending")
+    
+    logger.info(f"User {user_id} opened generation stream: {selections}")
+    
+    async def event_stream():
+        # The service opens short-lived sessions of its own, so none is held open for the stream
+        async for event in activity_service.stream_activity(
+            user_id, selections["duration"], selections["materials"],
+            selections["objectives"], selections["category"]
+        ):
+            if event["event"] == "done":
+                event["data"]["review_url"] = f"/activities/{event['data']['session_id']}/review"
+                logger.info(f"Streamed activity saved, session_id: {event['data']['session_id']}")
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/{session_id}/review", response_class=HTMLResponse)
-async def review_activity(
+def review_activity(
     request: Request,
     session_id: int,
     db: Session = Depends(get_db)
@@ -150,10 +351,12 @@ async def review_activity(
     if not session or session.user_id != user_id:
         raise HTTPException(status_code=404, detail="Activity not found")
     
-    daily_stats = scoring_service.get_daily_stats(db, user_id)
-    total_activities = db.query(ActivitySession).filter(ActivitySession.user_id == user_id, ActivitySession.status == "scored").count()
-    total_points = db.query(func.coalesce(func.sum(DailyStats.total_points), 0)).filter(DailyStats.user_id == user_id).scalar()
+    banner = banner_stats_service.get(db, user_id, request)
+    daily_stats = banner["daily_stats"]
+    total_activities = banner["total_activities"]
+    total_points = banner["total_points"]
     max_activities_per_day = settings.max_activities_per_day
+    can_regenerate = activity_service.can_regenerate(db, session)["success"]
     
     return templates.TemplateResponse("child/activity_review.html", {
         "request": request,
@@ -162,12 +365,33 @@ async def review_activity(
         "daily_stats": daily_stats,
         "total_activities": total_activities,
         "total_points": total_points,
-        "max_activities_per_day": max_activities_per_day
+        "max_activities_per_day": max_activities_per_day,
+        "can_regenerate": can_regenerate,
+        "regenerate_status": request.query_params.get("regenerate")
     })
 
 
+@router.post("/{session_id}/regenerate")
+async def regenerate_activity(
+    request: Request,
+    session_id: int
+):
+    """Swap a not-yet-started activity for a different one"""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return RedirectResponse(url="/auth/login", status_code=302)
+    
+    result = await activity_service.regenerate_activity(session_id, user_id)
+    if result["error"] == "not_found":
+        raise HTTPException(status_code=404, detail="Activity not found")
+    
+    status = result["source"] if result["success"] else result["error"]
+    logger.info(f"User {user_id} regenerate of session {session_id}: {status}")
+    return RedirectResponse(url=f"/activities/{session_id}/review?regenerate={status}", status_code=302)
+
+
 @router.get("/{session_id}/view", response_class=HTMLResponse)
-async def view_activity(
+def view_activity(
     request: Request,
     session_id: int,
     db: Session = Depends(get_db)
@@ -195,9 +419,10 @@ async def view_activity(
             parent = db.query(Parent).filter(Parent.id == score_record.parent_id).first()
             parent_name = parent.name if parent else None
 
-    daily_stats = scoring_service.get_daily_stats(db, user_id)
-    total_activities = db.query(ActivitySession).filter(ActivitySession.user_id == user_id, ActivitySession.status == "scored").count()
-    total_points = db.query(func.coalesce(func.sum(DailyStats.total_points), 0)).filter(DailyStats.user_id == user_id).scalar()
+    banner = banner_stats_service.get(db, user_id, request)
+    daily_stats = banner["daily_stats"]
+    total_activities = banner["total_activities"]
+    total_points = banner["total_points"]
     max_activities_per_day = settings.max_activities_per_day
     
     return templates.TemplateResponse("child/activity_view.html", {
@@ -215,7 +440,7 @@ async def view_activity(
 
 
 @router.post("/{session_id}/start")
-async def start_activity(
+def start_activity(
     request: Request,
     session_id: int,
     db: Session = Depends(get_db)
@@ -238,7 +463,7 @@ async def start_activity(
 
 
 @router.get("/{session_id}/active", response_class=HTMLResponse)
-async def active_activity(
+def active_activity(
     request: Request,
     session_id: int,
     db: Session = Depends(get_db)
@@ -259,9 +484,10 @@ async def active_activity(
     
     can_extend = session_service.can_extend_activity(session)
     
-    daily_stats = scoring_service.get_daily_stats(db, user_id)
-    total_activities = db.query(ActivitySession).filter(ActivitySession.user_id == user_id, ActivitySession.status == "scored").count()
-    total_points = db.query(func.coalesce(func.sum(DailyStats.total_points), 0)).filter(DailyStats.user_id == user_id).scalar()
+    banner = banner_stats_service.get(db, user_id, request)
+    daily_stats = banner["daily_stats"]
+    total_activities = banner["total_activities"]
+    total_points = banner["total_points"]
     max_activities_per_day = settings.max_activities_per_day
     
     return templates.TemplateResponse("child/activity_active.html", {
@@ -277,7 +503,7 @@ async def active_activity(
 
 
 @router.post("/{session_id}/extend")
-async def extend_activity(
+def extend_activity(
     request: Request,
     session_id: int,
     db: Session = Depends(get_db)
@@ -299,7 +525,7 @@ async def extend_activity(
 
 
 @router.post("/{session_id}/complete")
-async def complete_activity(
+def complete_activity(
     request: Request,
     session_id: int,
     actual_duration: int = Form(...),
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import func, select, tuple_
 from app.database import get_db
 from app.services.config_service import ConfigService
+from app.services.telemetry_service import TelemetryService
+from app.services.banner_stats_service import BannerStatsService
 from app.config import settings
 from fastapi.templating import Jinja2Templates
-from typing import List
-from datetime import date
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
 import logging
 
 # Set up logging
@@ -16,10 +19,19 @@ logger = logging.getLogger('app.routers.admin')
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 config_service = ConfigService()
+telemetry_service = TelemetryService()
+
+
+def _parse_date(value: str) -> Optional[date]:
+    """A YYYY-MM-DD query parameter, or None if empty or invalid"""
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
 
 
 @router.get("/config", response_class=HTMLResponse)
-async def admin_config(request: Request, db: Session = Depends(get_db)):
+def admin_config(request: Request, db: Session = Depends(get_db)):
     """Admin configuration page"""
     user_id = request.session.get("user_id")
     user_type = request.session.get("user_type")
@@ -42,7 +54,7 @@ async def admin_config(request: Request, db: Session = Depends(get_db)):
 
 
 @router.post("/config/update")
-async def update_config(
+def update_config(
     request: Request,
     max_activities_per_day: int = Form(...),
     min_activity_duration: int = Form(...),
@@ -63,7 +75,7 @@ async def update_config(
 
 
 @router.get("/reports", response_class=HTMLResponse)
-async def admin_reports(request: Request, db: Session = Depends(get_db)):
+def admin_reports(request: Request, db: Session = Depends(get_db)):
     """Admin reports page"""
     user_id = request.session.get("user_id")
     user_type = request.session.get("user_type")
@@ -101,42 +113,104 @@ async def admin_reports(request: Request, db: Session = Depends(get_db)):
     })
 
 
+@router.get("/telemetry", response_class=HTMLResponse)
+def admin_telemetry(request: Request, days: int = 7, db: Session = Depends(get_db)):
+    """Generation latency, outcome and token cost report"""
+    user_id = request.session.get("user_id")
+    user_type = request.session.get("user_type")
+    
+    if not user_id or user_type != "parent":
+        return RedirectResponse(url="/auth/login", status_code=302)
+    
+    report = telemetry_service.report(db, days=days)
+    
+    # Get current parent for user banner
+    from app.models.parent import Parent
+    current_parent = db.query(Parent).filter(Parent.id == user_id).first()
+    
+    logger.info(f"Admin {user_id} accessed telemetry report")
+    return templates.TemplateResponse("parent/telemetry.html", {
+        "request": request,
+        "report": report,
+        "current_parent": current_parent
+    })
+
+
+@router.get("/telemetry.json")
+def admin_telemetry_json(request: Request, days: int = 7, db: Session = Depends(get_db)):
+    """The telemetry report as JSON"""
+    user_id = request.session.get("user_id")
+    user_type = request.session.get("user_type")
+    
+    if not user_id or user_type != "parent":
+        raise HTTPException(status_code=403, detail="Parent access required")
+    
+    return telemetry_service.report(db, days=days)
+
+
 @router.get("/activities", response_class=HTMLResponse)
-async def admin_activities(request: Request, db: Session = Depends(get_db)):
-    """Admin activities management page"""
+def admin_activities(
+    request: Request,
+    child: str = "",
+    status_filter: str = Query("", alias="status"),
+    date_from: str = "",
+    date_to: str = "",
+    before: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Admin activities management page, newest first, a page at a time"""
     user_id = request.session.get("user_id")
     user_type = request.session.get("user_type")
     
     if not user_id or user_type != "parent":
         return RedirectResponse(url="/auth/login", status_code=302)
     
-    # Get all activity sessions with user info
     from app.models.activity import ActivitySession
     from app.models.user import User
     from app.models.scoring import ActivityScore
-    from app.models.parent import Parent
-    
-    activities = db.query(ActivitySession).order_by(ActivitySession.created_at.desc()).all()
     
-    # Get user names and scores for each activity
+    # Filters from the query string; empty or invalid values are ignored
+    filters = {
+        "child": int(child) if child.isdigit() else None,
+        "status": status_filter if status_filter in ("active", "completed", "scored") else None,
+        "date_from": _parse_date(date_from),
+        "date_to": _parse_date(date_to)
+    }
+    
+    # Child, score and scoring parent are loaded with the page: a fixed number of queries whatever the history
+    query = db.query(ActivitySession).options(
+        joinedload(ActivitySession.user),
+        selectinload(ActivitySession.scores).joinedload(ActivityScore.parent)
+    )
+    if filters["child"]:
+        query = query.filter(ActivitySession.user_id == filters["child"])
+    if filters["status"]:
+        query = query.filter(ActivitySession.status == filters["status"])
+    if filters["date_from"]:
+        query = query.filter(ActivitySession.created_at >= datetime.combine(filters["date_from"], datetime.min.time()))
+    if filters["date_to"]:
+        query = query.filter(ActivitySession.created_at < datetime.combine(filters["date_to"] + timedelta(days=1), datetime.min.time()))
+    if before is not None:
+        # Keyset pagination: continue after the last activity of the previous page
+        cursor = select(ActivitySession.created_at).where(ActivitySession.id == before).scalar_subquery()
+        query = query.filter(tuple_(ActivitySession.created_at, ActivitySession.id) < tuple_(cursor, before))
+    
+    page_size = settings.admin_activities_page_size
+    activities = query.order_by(ActivitySession.created_at.desc(), ActivitySession.id.desc()).limit(page_size + 1).all()
+    has_more = len(activities) > page_size
+    activities = activities[:page_size]
+    
+    # Score info for scored activities
     for activity in activities:
-        activity.user = db.query(User).filter(User.id == activity.user_id).first()
-        
-        # Get score info if scored
-        if activity.status == "scored":
-            score_record = db.query(ActivityScore).filter(ActivityScore.session_id == activity.id).first()
-            if score_record:
-                activity.score = score_record.score
-                activity.scored_at = score_record.scored_at
-                activity.scored_by = db.query(Parent).filter(Parent.id == score_record.parent_id).first()
-            else:
-                activity.score = None
-                activity.scored_at = None
-                activity.scored_by = None
-        else:
-            activity.score = None
-            activity.scored_at = None
-            activity.scored_by = None
+        score_record = activity.scores[0] if activity.status == "scored" and activity.scores else None
+        activity.score = score_record.score if score_record else None
+        activity.scored_at = score_record.scored_at if score_record else None
+        activity.scored_by = score_record.parent if score_record else None
+    
+    filter_params = {key: value.isoformat() if isinstance(value, date) else value for key, value in filters.items() if value}
+    next_url = f"/admin/activities?{urlencode(dict(filter_params, before=activities[-1].id))}" if has_more else None
+    newest_url = f"/admin/activities?{urlencode(filter_params)}" if before is not None else None
+    children = db.query(User).order_by(User.name).all()
     
     # Get current parent for user banner
     from app.models.parent import Parent
@@ -146,12 +220,16 @@ async def admin_activities(request: Request, db: Session = Depends(get_db)):
     return templates.TemplateResponse("parent/activities.html", {
         "request": request,
         "activities": activities,
-        "current_parent": current_parent
+        "current_parent": current_parent,
+        "children": children,
+        "filters": filters,
+        "next_url": next_url,
+        "newest_url": newest_url
     })
 
 
 @router.post("/activities/{activity_id}/delete")
-async def delete_activity(
+def delete_activity(
     request: Request,
     activity_id: int,
     db: Session = Depends(get_db)
@@ -166,6 +244,7 @@ async def delete_activity(
     from app.models.activity import ActivitySession
     from app.models.scoring import ActivityScore
     from app.services.scoring_service import ScoringService
+    from app.services.similarity_service import SimilarityService
     
     # Get the activity
     activity = db.query(ActivitySession).filter(ActivitySession.id == activity_id).first()
@@ -182,13 +261,17 @@ async def delete_activity(
         
         # Delete the activity
         db.delete(activity)
-        db.commit()
         
-        # Recalculate daily stats for the user if activity was scored
+        # Recalculate daily stats and the points balance for the user if activity was scored,
+        # committed together with the delete
         if activity.status == "scored" and activity_date:
+            db.flush()
             scoring_service = ScoringService()
             scoring_service.recalculate_daily_stats(db, activity_user_id, activity_date)
             logger.info(f"Recalculated daily stats for user {activity_user_id} after deleting activity {activity_id}")
+        else:
+            db.commit()
+        SimilarityService.forget_user(activity_user_id)
         
         logger.info(f"Activity {activity_id} deleted by parent {user_id}")
         
@@ -201,7 +284,7 @@ async def delete_activity(
 
 
 @router.post("/recalculate-stats/{user_id}")
-async def recalculate_user_stats(
+def recalculate_user_stats(
     request: Request,
     user_id: int,
     db: Session = Depends(get_db)
@@ -242,7 +325,7 @@ async def recalculate_user_stats(
 
 
 @router.get("/users", response_class=HTMLResponse)
-async def admin_users(request: Request, db: Session = Depends(get_db)):
+def admin_users(request: Request, db: Session = Depends(get_db)):
     """Admin users management page - only accessible by 'admin' user"""
     user_id = request.session.get("user_id")
     user_type = request.session.get("user_type")
@@ -274,7 +357,7 @@ async def admin_users(request: Request, db: Session = Depends(get_db)):
 
 
 @router.post("/users/child/add")
-async def add_child(
+def add_child(
     request: Request,
     child_name: str = Form(...),
     db: Session = Depends(get_db)
@@ -309,7 +392,7 @@ async def add_child(
 
 
 @router.post("/users/child/{child_id}/delete")
-async def delete_child(
+def delete_child(
     request: Request,
     child_id: int,
     db: Session = Depends(get_db)
@@ -332,6 +415,7 @@ async def delete_child(
     from app.models.activity import ActivitySession
     from app.models.daily_stats import DailyStats
     from app.models.scoring import ActivityScore
+    from app.models.user_balance import UserBalance
     
     child = db.query(User).filter(User.id == child_id).first()
     if not child:
@@ -347,12 +431,14 @@ async def delete_child(
         # Delete activity sessions
         db.query(ActivitySession).filter(ActivitySession.user_id == child_id).delete()
         
-        # Delete daily stats
+        # Delete daily stats and the points balance
         db.query(DailyStats).filter(DailyStats.user_id == child_id).delete()
+        db.query(UserBalance).filter(UserBalance.user_id == child_id).delete()
         
         # Delete the child
         db.delete(child)
         db.commit()
+        BannerStatsService.invalidate(child_id)
         
         logger.info(f"Child '{child.name}' (ID: {child_id}) deleted by admin {user_id}")
         return RedirectResponse(url="/admin/users", status_code=302)
@@ -364,7 +450,7 @@ async def delete_child(
 
 
 @router.post("/users/parent/add")
-async def add_parent(
+def add_parent(
     request: Request,
     parent_name: str = Form(...),
     parent_password: str = Form(...),
@@ -401,7 +487,7 @@ async def add_parent(
 
 
 @router.post("/users/parent/{parent_id}/delete")
-async def delete_parent(
+def delete_parent(
     request: Request,
     parent_id: int,
     db: Session = Depends(get_db)
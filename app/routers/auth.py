@@ -18,7 +18,7 @@ scoring_service = ScoringService()
 
 
 @router.get("/login", response_class=HTMLResponse)
-async def login_page(request: Request, db: Session = Depends(get_db)):
+def login_page(request: Request, db: Session = Depends(get_db)):
     """Show login page"""
     # Get all existing children for the dropdown
     children = db.query(User).order_by(User.name).all()
@@ -34,7 +34,7 @@ async def login_page(request: Request, db: Session = Depends(get_db)):
 
 
 @router.post("/login")
-async def login(
+def login(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
@@ -88,7 +88,7 @@ async def logout(request: Request):
 
 
 @router.get("/setup", response_class=HTMLResponse)
-async def setup_page(request: Request, db: Session = Depends(get_db)):
+def setup_page(request: Request, db: Session = Depends(get_db)):
     """Show initial setup page with existing users"""
     # Get existing children and parents
     existing_children = db.query(User).all()
@@ -102,7 +102,7 @@ async def setup_page(request: Request, db: Session = Depends(get_db)):
 
 
 @router.post("/setup")
-async def setup(
+def setup(
     request: Request,
     setup_type: str = Form(...),
     parent_name: str = Form(None),
@@ -2,69 +2,68 @@ import logging
 logger = logging.getLogger('app.routers.dashboard')
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.database import get_async_db
 from app.models.user import User
 from app.models.activity import ActivitySession
-from app.models.daily_stats import DailyStats
 from app.models.scoring import ActivityScore
 from app.services.session_service import SessionService
-from app.services.scoring_service import ScoringService
+from app.services.banner_stats_service import BannerStatsService
 from app.services.config_service import ConfigService
-from app.config import settings
 from fastapi.templating import Jinja2Templates
-from datetime import date
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 session_service = SessionService()
-scoring_service = ScoringService()
+banner_stats_service = BannerStatsService()
 config_service = ConfigService()
 
 
 @router.get("/child", response_class=HTMLResponse)
-async def child_dashboard(request: Request, db: Session = Depends(get_db)):
+async def child_dashboard(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Child dashboard"""
     user_id = request.session.get("user_id")
     logger.info(f"User {user_id} accessed child dashboard")
     if not user_id:
         return RedirectResponse(url="/auth/login", status_code=302)
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         return RedirectResponse(url="/auth/login", status_code=302)
     
     # Get active session
-    active_session = session_service.get_active_session(db, user_id)
+    active_session = await session_service.get_active_session_async(db, user_id)
     
-    # Get daily stats
-    daily_stats = scoring_service.get_daily_stats(db, user_id)
-    
-    # Get total activities (scored)
-    total_activities = db.query(ActivitySession).filter(ActivitySession.user_id == user_id, ActivitySession.status == "scored").count()
-    # Get total points (sum of all days)
-    total_points = db.query(func.coalesce(func.sum(DailyStats.total_points), 0)).filter(DailyStats.user_id == user_id).scalar()
+    # Get daily stats, total activities (scored), total points and whether a new activity can start
+    banner = await banner_stats_service.get_async(db, user_id, request)
+    daily_stats = banner["daily_stats"]
+    total_activities = banner["total_activities"]
+    total_points = banner["total_points"]
     
     # Get recent activities with scores
-    recent_activities = db.query(ActivitySession)\
-        .filter(ActivitySession.user_id == user_id)\
-        .order_by(ActivitySession.created_at.desc())\
-        .limit(5)\
-        .all()
+    recent_activities = (await db.execute(
+        select(ActivitySession)
+        .filter(ActivitySession.user_id == user_id)
+        .order_by(ActivitySession.created_at.desc())
+        .limit(5)
+    )).scalars().all()
     
     # Get scores and scored_at for recent activities
+    scored_ids = [activity.id for activity in recent_activities if activity.status == "scored"]
+    score_records = {}
+    if scored_ids:
+        score_records = {
+            score.session_id: score
+            for score in (await db.execute(select(ActivityScore).filter(ActivityScore.session_id.in_(scored_ids)))).scalars()
+        }
     for activity in recent_activities:
-        if activity.status == "scored":
-            score_record = db.query(ActivityScore).filter(ActivityScore.session_id == activity.id).first()
-            activity.score = score_record.score if score_record else None
-            activity.scored_at = score_record.scored_at if score_record else None
-        else:
-            activity.score = None
-            activity.scored_at = None
+        score_record = score_records.get(activity.id)
+        activity.score = score_record.score if score_record else None
+        activity.scored_at = score_record.scored_at if score_record else None
     
     # Check if can start new activity
-    can_start_new = scoring_service.can_start_new_activity(db, user_id)
+    can_start_new = banner["can_start_new"]
     
     return templates.TemplateResponse("child/dashboard.html", {
         "request": request,
@@ -80,7 +79,7 @@ async def child_dashboard(request: Request, db: Session = Depends(get_db)):
 
 
 @router.get("/parent", response_class=HTMLResponse)
-async def parent_dashboard(request: Request, db: Session = Depends(get_db)):
+async def parent_dashboard(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Parent dashboard"""
     user_id = request.session.get("user_id")
     user_type = request.session.get("user_type")
@@ -90,19 +89,19 @@ async def parent_dashboard(request: Request, db: Session = Depends(get_db)):
         return RedirectResponse(url="/auth/login", status_code=302)
     
     # Get all users (children)
-    children = db.query(User).all()
+    children = (await db.execute(select(User))).scalars().all()
     
     # Get pending activities that need scoring
-    pending_activities = db.query(ActivitySession)\
-        .filter(ActivitySession.status == "completed")\
-        .all()
+    pending_activities = (await db.execute(
+        select(ActivitySession).filter(ActivitySession.status == "completed")
+    )).scalars().all()
     
     # Get system configuration
-    config = config_service.get_full_config(db)
+    config = await config_service.get_full_config_async(db)
     
     # Get current parent for admin check
     from app.models.parent import Parent
-    current_parent = db.query(Parent).filter(Parent.id == user_id).first()
+    current_parent = await db.get(Parent, user_id)
     
     return templates.TemplateResponse("parent/dashboard.html", {
         "request": request,
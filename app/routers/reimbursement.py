@@ -16,7 +16,7 @@ scoring_service = ScoringService()
 
 
 @router.get("/", response_class=HTMLResponse)
-async def reimbursement_page(request: Request, db: Session = Depends(get_db)):
+def reimbursement_page(request: Request, db: Session = Depends(get_db)):
     """Show reimbursement page with available items"""
     user_id = request.session.get("user_id")
     user_type = request.session.get("user_type")
@@ -50,7 +50,7 @@ async def reimbursement_page(request: Request, db: Session = Depends(get_db)):
 
 
 @router.get("/confirm/{item_name}", response_class=HTMLResponse)
-async def reimbursement_confirm_page(
+def reimbursement_confirm_page(
     request: Request, 
     item_name: str, 
     db: Session = Depends(get_db)
@@ -82,7 +82,7 @@ async def reimbursement_confirm_page(
 
 
 @router.post("/process", response_class=HTMLResponse)
-async def process_reimbursement(
+def process_reimbursement(
     request: Request,
     item_name: str = Form(...),
     db: Session = Depends(get_db)
@@ -113,7 +113,7 @@ async def process_reimbursement(
 
 
 @router.get("/history", response_class=HTMLResponse)
-async def reimbursement_history_page(request: Request, db: Session = Depends(get_db)):
+def reimbursement_history_page(request: Request, db: Session = Depends(get_db)):
     """Show reimbursement history page"""
     user_id = request.session.get("user_id")
     user_type = request.session.get("user_type")
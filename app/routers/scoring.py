@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer_group
 from app.database import get_db
 from app.models.activity import ActivitySession
 from app.models.parent import Parent
@@ -14,13 +14,14 @@ scoring_service = ScoringService()
 
 
 @router.get("/{session_id}", response_class=HTMLResponse)
-async def scoring_page(
+def scoring_page(
     request: Request,
     session_id: int,
     db: Session = Depends(get_db)
 ):
     """Show scoring page for a completed activity"""
-    session = db.query(ActivitySession).filter(ActivitySession.id == session_id).first()
+    session = db.query(ActivitySession).options(undefer_group("content"))\
+        .filter(ActivitySession.id == session_id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Activity not found")
     
@@ -37,7 +38,7 @@ async def scoring_page(
 
 
 @router.post("/{session_id}/score")
-async def submit_score(
+def submit_score(
     request: Request,
     session_id: int,
     parent_id: int = Form(...),
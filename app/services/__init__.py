@@ -5,6 +5,16 @@ from .scoring_service import ScoringService
 from .session_service import SessionService
 from .config_service import ConfigService
 from .reimbursement_service import ReimbursementService
+from .activity_pool_service import ActivityPoolService
+from .generation_cache_service import GenerationCacheService
+from .generation_queue_service import GenerationQueueService
+from .similarity_service import SimilarityService
+from .token_budget_service import TokenBudgetService
+from .offline_activity_service import OfflineActivityService
+from .telemetry_service import TelemetryService
+from .content_store_service import ContentStoreService
+from .balance_service import BalanceService
+from .banner_stats_service import BannerStatsService
 
 __all__ = [
     "ActivityService",
@@ -13,5 +23,15 @@ __all__ = [
     "ScoringService",
     "SessionService",
     "ConfigService",
-    "ReimbursementService"
+    "ReimbursementService",
+    "ActivityPoolService",
+    "GenerationCacheService",
+    "GenerationQueueService",
+    "SimilarityService",
+    "TokenBudgetService",
+    "OfflineActivityService",
+    "TelemetryService",
+    "ContentStoreService",
+    "BalanceService",
+    "BannerStatsService"
 ] 
\ No newline at end of file
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Tuple, Deque
+from app.config import settings
+from app.services.structured_activity import activity_tool
+from app.services.telemetry_service import TelemetryService
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+Bucket = Tuple[str, int]
+
+
+class ActivityPoolService:
+    """
+    Keeps a small pool of ready-made activities per (category, duration) bucket so
+    generate requests can be answered without an Anthropic round trip.
+
+    Buckets are refilled in the background from the selections children recently
+    made for them, so tokens are only spent on buckets that are actually used.
+    A pooled activity is served when its materials are a subset of the child's
+    selected materials and it shares at least one learning objective.
+    """
+
+    def __init__(
+        self,
+        anthropic_service,
+        template_service,
+        parse_activity: Callable[[str, Optional[Dict[str, Any]]], Dict[str, Any]],
+        token_budget
+    ):
+        self.anthropic_service = anthropic_service
+        self.template_service = template_service
+        self.parse_activity = parse_activity
+        self.token_budget = token_budget
+        self.telemetry = TelemetryService()
+        self.pool_size = settings.activity_pool_size_per_bucket
+        self.max_age_seconds = settings.activity_pool_max_age_minutes * 60
+        self.refill_interval = settings.activity_pool_refill_interval_seconds
+        self._pool: Dict[Bucket, Deque[Dict[str, Any]]] = {}
+        self._demand: Dict[Bucket, Dict[str, Any]] = {}
+        self._refill_event: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_failures = 0
+        self.evictions = 0
+
+    def start(self):
+        """Start the background refill worker"""
+        if not settings.activity_pool_enabled or self._worker is not None:
+            return
+        self._refill_event = asyncio.Event()
+        self._worker = asyncio.create_task(self._refill_loop())
+        logger.info(f"Activity pool started: size_per_bucket={self.pool_size}, max_age={self.max_age_seconds}s")
+
+    async def stop(self):
+        """Stop the background refill worker"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        logger.info("Activity pool stopped")
+
+    def take(
+        self,
+        selected_category: str,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        is_repeat: Callable[[Dict[str, Any]], bool]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Take a pooled activity compatible with the child's selections, or None.
+        Activities for which is_repeat returns True (near-duplicates of something
+        the child has already done) are skipped and left for other children.
+        """
+        if not settings.activity_pool_enabled:
+            return None
+
+        bucket = (selected_category, selected_duration)
+        self._record_demand(bucket, selected_materials, selected_objectives)
+
+        entries = self._pool.get(bucket)
+        self._evict_stale(bucket)
+        materials = set(selected_materials)
+        objectives = set(selected_objectives)
+
+        for entry in list(entries or []):
+            if not entry["materials"] <= materials:
+                continue
+            if not entry["objectives"] & objectives:
+                continue
+            if is_repeat(entry["activity"]):
+                continue
+            entries.remove(entry)
+            self.hits += 1
+            logger.info(f"Activity pool hit for bucket {bucket}, {len(entries)} left")
+            self._request_refill()
+            return entry
+
+        self.misses += 1
+        logger.info(f"Activity pool miss for bucket {bucket}")
+        self._request_refill()
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool sizes and hit/miss, refill and eviction counters"""
+        total = self.hits + self.misses
+        return {
+            "enabled": settings.activity_pool_enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "refills": self.refills,
+            "refill_failures": self.refill_failures,
+            "evictions": self.evictions,
+            "buckets": {
+                f"{category}:{duration}": len(entries)
+                for (category, duration), entries in self._pool.items()
+            }
+        }
+
+    def _record_demand(self, bucket: Bucket, materials: List[str], objectives: List[str]):
+        """Remember the latest selections for a bucket so refills match what children pick"""
+        self._demand[bucket] = {
+            "materials": list(materials),
+            "objectives": list(objectives),
+            "requested_at": time.monotonic()
+        }
+
+    def _request_refill(self):
+        if self._refill_event is not None:
+            self._refill_event.set()
+
+    def _evict_stale(self, bucket: Bucket):
+        entries = self._pool.get(bucket)
+        if not entries:
+            return
+        cutoff = time.monotonic() - self.max_age_seconds
+        while entries and entries[0]["created_at"] < cutoff:
+            entries.popleft()
+            self.evictions += 1
+            logger.info(f"Evicted stale pooled activity from bucket {bucket}")
+        
+        # Activities generated from an older prompt template are dropped once it is edited
+        template_id = self.template_service.template_id
+        for entry in [entry for entry in entries if entry["template_id"] != template_id]:
+            entries.remove(entry)
+            self.evictions += 1
+            logger.info(f"Evicted pooled activity from template {entry['template_id']} in bucket {bucket}")
+
+    def _buckets_needing_refill(self) -> List[Bucket]:
+        """Buckets requested within the max age window that are below the target size"""
+        cutoff = time.monotonic() - self.max_age_seconds
+        buckets = []
+        for bucket, demand in list(self._demand.items()):
+            if demand["requested_at"] < cutoff:
+                # Nobody has asked for this bucket in a while, stop spending tokens on it
+                del self._demand[bucket]
+                continue
+            self._evict_stale(bucket)
+            if len(self._pool.get(bucket, ())) < self.pool_size:
+                buckets.append(bucket)
+        return buckets
+
+    async def _refill_loop(self):
+        progressed = False
+        while True:
+            # Keep going while the last pass added activities, otherwise wait for demand
+            if not progressed:
+                try:
+                    await asyncio.wait_for(self._refill_event.wait(), timeout=self.refill_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._refill_event.clear()
+
+            progressed = False
+            # One activity per bucket per pass so busy buckets don't starve the others
+            for bucket in self._buckets_needing_refill():
+                try:
+                    progressed = await self._refill_bucket(bucket) or progressed
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error refilling activity pool bucket {bucket}: {str(e)}", exc_info=True)
+
+    async def _refill_bucket(self, bucket: Bucket) -> bool:
+        """Generate one activity for a bucket from its most recent selections"""
+        selected_category, selected_duration = bucket
+        demand = self._demand[bucket]
+        variables = {
+            "selected_duration": selected_duration,
+            "selected_materials": self.template_service.format_materials_list(demand["materials"]),
+            "selected_objectives": self.template_service.format_objectives_list(demand["objectives"]),
+            "selected_category": selected_category,
+            "min_materials_count": len(demand["materials"]) - 1,
+            "recent_activities_summary": "No recent activities"
+        }
+        prompt_parts = self.template_service.populate_template_parts(variables)
+
+        if self.anthropic_service.circuit_breaker.state != "closed":
+            # Leave upstream alone while it is failing; children's requests take priority
+            logger.info(f"Skipping activity pool refill for bucket {bucket}, circuit is not closed")
+            return False
+        if not await self.token_budget.allow_background():
+            logger.info(f"Skipping activity pool refill for bucket {bucket}, token budget is exhausted")
+            return False
+
+        logger.info(f"Refilling activity pool bucket {bucket}")
+        result = await self.anthropic_service.generate_activity(
+            prompt_parts["user"], system=prompt_parts["system"], tool=activity_tool(),
+            route=self.anthropic_service.router.choose(selected_category, selected_duration)
+        )
+        self.telemetry.record(
+            "pool_refill", "success" if result["success"] else "failed", category=selected_category,
+            duration=selected_duration, model=result.get("model"), latency_ms=result.get("latency_ms"),
+            attempts=1, usage=result.get("usage")
+        )
+        if not result["success"]:
+            self.refill_failures += 1
+            logger.warning(f"Activity pool refill failed for bucket {bucket}: {result['error']}")
+            return False
+        await self.token_budget.record(None, result["usage"])
+
+        entries = self._pool.setdefault(bucket, deque())
+        entries.append({
+            "activity": self.parse_activity(result["content"], result.get("structured")),
+            "variables": variables,
+            "template_id": self.template_service.template_id,
+            "materials": set(demand["materials"]),
+            "objectives": set(demand["objectives"]),
+            "created_at": time.monotonic()
+        })
+        self.refills += 1
+        while len(entries) > self.pool_size:
+            entries.popleft()
+            self.evictions += 1
+        logger.info(f"Activity pool bucket {bucket} now holds {len(entries)} activities")
+        return True
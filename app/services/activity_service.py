@@ -1,110 +1,988 @@
 import logging
-from typing import Dict, Any, List, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple, Callable
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, undefer_group
 from app.models.activity import ActivitySession
-from app.models.user import User
+from app.database import SessionLocal
 from app.services.anthropic_service import AnthropicService
 from app.services.template_service import TemplateService
+from app.services.activity_pool_service import ActivityPoolService
+from app.services.generation_cache_service import GenerationCacheService
+from app.services.similarity_service import SimilarityService, UserSimilarityIndex
+from app.services.token_budget_service import TokenBudgetService
+from app.services.offline_activity_service import OfflineActivityService
+from app.services.telemetry_service import TelemetryService
+from app.services.content_store_service import ContentStoreService
+from app.services.banner_stats_service import BannerStatsService
+from app.services.structured_activity import (
+    StructuredActivity, ParseStats, activity_tool, format_step, structured_to_text
+)
+from pydantic import ValidationError
 from app.config import settings
+import asyncio
 import json
-import uuid
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 import re
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+STEP_PATTERN = re.compile(r"^\s*\d+\.\s*(.*)")
+# Offline variations tried before settling for one similar to the child's history
+OFFLINE_ATTEMPTS = 3
+
+
+class ActivityStreamParser:
+    """
+    Incrementally parses streamed activity text using the same rules as
+    ActivityService._parse_generated_activity: the first non-empty line is the
+    title, lines up to the first numbered step are the description, and every
+    numbered line is a step. Events are emitted as soon as a line is complete.
+    """
+    
+    def __init__(self):
+        self.content = ""
+        self._buffer = ""
+        self._title = None
+        self._description_lines = []
+        self._description_sent = False
+    
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add a chunk of streamed text and return events for any completed lines"""
+        self.content += text
+        self._buffer += text
+        events = []
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            events.extend(self._handle_line(line))
+        return events
+    
+    def close(self) -> List[Dict[str, Any]]:
+        """Flush the final unterminated line once the stream has ended"""
+        events = []
+        if self._buffer:
+            events.extend(self._handle_line(self._buffer))
+            self._buffer = ""
+        if not self._description_sent:
+            events.extend(self._flush_description())
+        return events
+    
+    def _handle_line(self, line: str) -> List[Dict[str, Any]]:
+        if self._title is None:
+            if line.strip():
+                self._title = line.strip()
+                return [{"event": "title", "data": {"title": self._title}}]
+            return []
+        
+        step_match = STEP_PATTERN.match(line)
+        if step_match:
+            events = [] if self._description_sent else self._flush_description()
+            step = step_match.group(1).strip()
+            if step:
+                events.append({"event": "step", "data": {"step": step}})
+            return events
+        
+        if not self._description_sent and line.strip():
+            self._description_lines.append(line.strip())
+        return []
+    
+    def _flush_description(self) -> List[Dict[str, Any]]:
+        self._description_sent = True
+        if not self._description_lines:
+            return []
+        return [{"event": "description", "data": {"description": " ".join(self._description_lines)}}]
+
+
+class StructuredActivityStreamParser:
+    """
+    Emits title, description and step events from the partially parsed tool input
+    of a structured stream. A field counts as complete once the model has moved on
+    to a later field (or step); whatever is left is flushed when the stream ends.
+    """
+    
+    def __init__(self):
+        self._title_sent = False
+        self._description_sent = False
+        self._steps_sent = 0
+    
+    def feed(self, snapshot: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Return events for fields completed in the latest snapshot"""
+        if not snapshot:
+            return []
+        last_key = list(snapshot.keys())[-1]
+        events = self._fields(snapshot, last_key)
+        steps = snapshot.get("steps") if isinstance(snapshot.get("steps"), list) else []
+        # The last step may still be streaming while "steps" is the open field
+        complete = len(steps) - 1 if last_key == "steps" else len(steps)
+        events.extend(self._steps(steps[:complete]))
+        return events
+    
+    def close(self, final: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Flush the remaining fields from the final tool input"""
+        if not final:
+            return []
+        events = self._fields(final, None)
+        steps = final.get("steps") if isinstance(final.get("steps"), list) else []
+        events.extend(self._steps(steps))
+        return events
+    
+    def _fields(self, data: Dict[str, Any], open_key: Optional[str]) -> List[Dict[str, Any]]:
+        events = []
+        if not self._title_sent and data.get("title") and open_key != "title":
+            self._title_sent = True
+            events.append({"event": "title", "data": {"title": str(data["title"]).strip()}})
+        if self._title_sent and not self._description_sent and data.get("description") and open_key != "description":
+            self._description_sent = True
+            events.append({"event": "description", "data": {"description": str(data["description"]).strip()}})
+        return events
+    
+    def _steps(self, steps: List[Any]) -> List[Dict[str, Any]]:
+        events = []
+        for step in steps[self._steps_sent:]:
+            text = format_step(step)
+            if text:
+                events.append({"event": "step", "data": {"step": text}})
+        self._steps_sent = max(self._steps_sent, len(steps))
+        return events
+
+
 class ActivityService:
     def __init__(self):
         self.anthropic_service = AnthropicService()
         self.template_service = TemplateService()
+        self.token_budget = TokenBudgetService()
+        self.pool_service = ActivityPoolService(
+            self.anthropic_service, self.template_service, self._parse_activity_content, self.token_budget
+        )
+        self.cache_service = GenerationCacheService()
+        self.similarity_service = SimilarityService()
+        self.offline_service = OfflineActivityService()
+        self.telemetry = TelemetryService()
+        self.content_store = ContentStoreService()
+        # In-flight generations keyed on (user_id, selection hash) for single-flight coalescing
+        self._in_flight: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.parse_stats = ParseStats()
+        # Alternate-storing tasks, referenced so they aren't garbage collected mid-flight
+        self._background_tasks: set = set()
     
     async def generate_activity(
         self,
-        db: Session,
         user_id: int,
         selected_duration: int,
         selected_materials: List[str],
         selected_objectives: List[str],
-        selected_category: str
+        selected_category: str,
+        api_allowed: bool = True,
+        queue_wait_ms: Optional[int] = None
     ) -> Dict[str, Any]:
         """
-        Generate a new activity based on child selections
+        Generate a new activity based on child selections. Identical requests from the
+        same child (double-clicks, refreshes) share one generation and one session.
+        With api_allowed False (instant mode or over budget) the Anthropic API is never
+        called. queue_wait_ms is how long the request waited in the generation queue.
+        Database work runs in the threadpool on short-lived sessions, never on the event
+        loop or across the Anthropic call.
         """
+        key = self.selection_key(user_id, selected_duration, selected_materials, selected_objectives, selected_category)
+        in_flight = self._in_flight.get(key)
+        if in_flight:
+            logger.info(f"Coalescing duplicate generation request for user {user_id}")
+            return await asyncio.shield(in_flight)
+        
+        future = self._begin_flight(key)
+        result = None
+        try:
+            result = await self._generate_activity(
+                user_id, selected_duration, selected_materials, selected_objectives, selected_category,
+                api_allowed, queue_wait_ms
+            )
+            return result
+        finally:
+            self._end_flight(key, future, result)
+    
+    async def _generate_activity(
+        self,
+        user_id: int,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str,
+        api_allowed: bool = True,
+        queue_wait_ms: Optional[int] = None
+    ) -> Dict[str, Any]:
         logger.info(f"ActivityService.generate_activity called with user_id={user_id}, duration={selected_duration}")
         
+        plan = None
+        upstream = None
         try:
-            # Get recent activities for uniqueness check
-            logger.info("Getting recent activities")
-            recent_activities = self._get_recent_activities(db, user_id)
-            recent_activities_summary = self._format_recent_activities(recent_activities)
-            logger.info(f"Recent activities summary: {recent_activities_summary}")
-            
-            # Prepare template variables
-            variables = {
-                "selected_duration": selected_duration,
-                "selected_materials": self.template_service.format_materials_list(selected_materials),
-                "selected_objectives": self.template_service.format_objectives_list(selected_objectives),
-                "selected_category": selected_category,
-                "min_materials_count": len(selected_materials) - 1,
-                "recent_activities_summary": recent_activities_summary
-            }
-            logger.info(f"Template variables prepared: {variables}")
-            
-            # Generate prompt
-            logger.info("Generating prompt from template")
-            prompt = self.template_service.populate_template(variables)
-            logger.info(f"Generated prompt length: {len(prompt)}")
-            logger.info(f"Full generated prompt:\n{prompt}")
+            plan = await self._prepare_generation(
+                user_id, selected_duration, selected_materials, selected_objectives, selected_category, api_allowed
+            )
+            route = plan["route"]
+            result, parsed_activity = plan["result"], plan["activity"]
+            prompt_variables, template_id = plan["prompt_variables"], plan["template_id"]
             
-            # Generate activity with retry
-            logger.info("Calling anthropic service")
-            result = await self.anthropic_service.generate_activity_with_retry(prompt)
-            logger.info(f"Anthropic service result: {result}")
+            source = plan["source"] or "cache"
+            if not parsed_activity and api_allowed:
+                # Generate activity with retry, regenerating near-duplicates of the child's history
+                logger.info("Calling anthropic service")
+                upstream_start = time.monotonic()
+                result, parsed_activity = await self._generate_distinct_activity(
+                    plan["index"], user_id, plan["prompt_parts"], route
+                )
+                logger.info(f"Anthropic service result: {result}")
+                source = "anthropic"
+                # Wall time of the upstream phase, including retries and backoff
+                upstream = dict(result, latency_ms=int((time.monotonic() - upstream_start) * 1000))
+                if not result["success"]:
+                    logger.error(f"Anthropic service failed: {result['error']}")
+                    parsed_activity = None
             
-            if not result["success"]:
-                logger.error(f"Anthropic service failed: {result['error']}")
-                return {
-                    "success": False,
-                    "error": result["error"]
-                }
+            if not parsed_activity:
+                # Instant mode, over budget, or the API failed: assemble one locally
+                parsed_activity = self._offline_activity(
+                    plan["index"], user_id, selected_duration, selected_materials, selected_objectives, selected_category
+                )
+                if not parsed_activity:
+                    self._record_generation(
+                        user_id, selected_category, selected_duration, source, "failed", queue_wait_ms, upstream
+                    )
+                    return {
+                        "success": False,
+                        "error": (result or {}).get("error") or
+                        "You've made lots of activities for now! Please try again in a little while."
+                    }
+                result = {"success": True, "usage": {}}
+                prompt_variables, template_id, source = None, self.offline_service.template_id, "offline"
             
-            # Parse the generated content
-            logger.info("Parsing generated activity")
-            parsed_activity = self._parse_generated_activity(result["content"])
+            self._record_generation(
+                user_id, selected_category, selected_duration, source,
+                "fallback" if upstream and not upstream["success"] else "success", queue_wait_ms, upstream
+            )
             logger.info(f"Parsed activity: {parsed_activity}")
             
             # Create activity session
-            logger.info("Creating activity session in database")
-            session = ActivitySession(
-                user_id=user_id,
-                selected_duration=selected_duration,
-                selected_materials=selected_materials,
-                selected_objectives=selected_objectives,
-                selected_category=selected_category,
-                anthropic_prompt=prompt,
-                generated_activity=parsed_activity,
-                generation_timestamp=datetime.utcnow()
+            session_id = await self._run_in_session(
+                self._save_activity, user_id, selected_duration, selected_materials, selected_objectives,
+                selected_category, prompt_variables, template_id, parsed_activity,
+                result if source == "anthropic" else None, route
             )
             
-            db.add(session)
-            db.commit()
-            db.refresh(session)
-            logger.info(f"Activity session created with ID: {session.id}")
+            self._attach_alternates(user_id, session_id, plan.pop("alternates"))
             
             return {
                 "success": True,
-                "session_id": session.id,
+                "session_id": session_id,
                 "activity": parsed_activity,
-                "usage": result.get("usage", {})
+                "usage": result.get("usage", {}),
+                "source": source
             }
             
         except Exception as e:
             logger.error(f"Error in generate_activity: {str(e)}", exc_info=True)
+            self._record_generation(
+                user_id, selected_category, selected_duration, "anthropic", "failed", queue_wait_ms, upstream
+            )
             return {
                 "success": False,
                 "error": f"Activity generation failed: {str(e)}"
             }
+        finally:
+            # Only reached with a task still set when no session was created for it
+            if plan and plan.get("alternates"):
+                plan["alternates"].cancel()
+    
+    async def stream_activity(
+        self,
+        user_id: int,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate a new activity while streaming it. Yields raw text deltas plus the
+        title, description and numbered steps as soon as each one is complete, then
+        saves the ActivitySession and yields a final "done" event with its ID.
+        A duplicate stream for the same selections waits for the first one and
+        replays its activity and session.
+        """
+        key = self.selection_key(user_id, selected_duration, selected_materials, selected_objectives, selected_category)
+        in_flight = self._in_flight.get(key)
+        if in_flight:
+            logger.info(f"Coalescing duplicate generation stream for user {user_id}")
+            result = await asyncio.shield(in_flight)
+            if not result["success"]:
+                yield {"event": "error", "data": {"error": result["error"]}}
+                return
+            for event in self._activity_events(result["activity"]):
+                yield event
+            yield {"event": "done", "data": {"session_id": result["session_id"], "title": result["activity"]["title"]}}
+            return
+        
+        future = self._begin_flight(key)
+        result = None
+        try:
+            async for event in self._stream_activity(
+                user_id, selected_duration, selected_materials, selected_objectives, selected_category
+            ):
+                if event["event"] == "done":
+                    result = {"success": True, "session_id": event["data"]["session_id"], "activity": event["activity"]}
+                    event = {"event": "done", "data": event["data"]}
+                elif event["event"] == "error":
+                    result = {"success": False, "error": event["data"]["error"]}
+                yield event
+        finally:
+            self._end_flight(key, future, result)
+    
+    async def _stream_activity(
+        self,
+        user_id: int,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        logger.info(f"ActivityService.stream_activity called with user_id={user_id}, duration={selected_duration}")
+        
+        plan = None
+        upstream = None
+        try:
+            plan = await self._prepare_generation(
+                user_id, selected_duration, selected_materials, selected_objectives, selected_category
+            )
+            route = plan["route"]
+            result, parsed_activity = plan["result"], plan["activity"]
+            prompt_variables, template_id = plan["prompt_variables"], plan["template_id"]
+            prompt_parts = plan["prompt_parts"]
+            
+            source = plan["source"]
+            if parsed_activity:
+                for event in self._activity_events(parsed_activity):
+                    yield event
+            else:
+                parser = ActivityStreamParser()
+                structured_parser = StructuredActivityStreamParser()
+                result = None
+                streamed = False
+                upstream_start = time.monotonic()
+                try:
+                    async for chunk in self.anthropic_service.stream_activity(
+                        prompt_parts["user"], system=prompt_parts["system"], tool=activity_tool(), route=route
+                    ):
+                        streamed = True
+                        if chunk["type"] == "text":
+                            yield {"event": "token", "data": {"text": chunk["text"]}}
+                            for event in parser.feed(chunk["text"]):
+                                yield event
+                        elif chunk["type"] == "json":
+                            for event in structured_parser.feed(chunk["snapshot"]):
+                                yield event
+                        elif chunk["type"] == "done":
+                            result = chunk
+                            await self.token_budget.record(user_id, chunk["usage"])
+                except Exception as e:
+                    # Once part of an activity is on screen it can't be swapped for a different one
+                    upstream = {"success": False, "model": route["model"], "attempts": 1,
+                                "latency_ms": int((time.monotonic() - upstream_start) * 1000)}
+                    if streamed:
+                        raise
+                    parsed_activity = self._offline_activity(
+                        plan["index"], user_id, selected_duration, selected_materials, selected_objectives,
+                        selected_category
+                    )
+                    if not parsed_activity:
+                        raise
+                    logger.error(f"Streaming failed before any output, serving an offline activity: {str(e)}")
+                    prompt_variables, template_id, source = None, self.offline_service.template_id, "offline"
+                    for event in self._activity_events(parsed_activity):
+                        yield event
+                else:
+                    source = "anthropic"
+                    upstream = dict(result or {}, success=True, attempts=1)
+                    if result and result.get("structured") is not None:
+                        for event in structured_parser.close(result["structured"]):
+                            yield event
+                    else:
+                        for event in parser.close():
+                            yield event
+                    
+                    if not result:
+                        result = {"content": parser.content}
+                    
+                    # Parse the full response the same way as the blocking path so both are identical
+                    parsed_activity = self._parse_activity_content(result["content"], result.get("structured"))
+                    
+                    # The child has already watched it stream in, so a near-duplicate is kept and only logged
+                    repeat = self.similarity_service.find_similar_in(plan["index"], user_id, parsed_activity)
+                    if repeat:
+                        logger.warning(f"Streamed activity for user {user_id} is {repeat['score']:.0%} similar "
+                                       f"to session {repeat['session_id']}")
+            
+            self._record_generation(
+                user_id, selected_category, selected_duration, "stream" if source == "anthropic" else source,
+                "fallback" if source == "offline" else "success", upstream=upstream
+            )
+            session_id = await self._run_in_session(
+                self._save_activity, user_id, selected_duration, selected_materials, selected_objectives,
+                selected_category, prompt_variables, template_id, parsed_activity,
+                result if source == "anthropic" else None, route
+            )
+            self._attach_alternates(user_id, session_id, plan.pop("alternates"))
+            
+            yield {
+                "event": "done",
+                "data": {"session_id": session_id, "title": parsed_activity["title"]},
+                "activity": parsed_activity
+            }
+            
+        except Exception as e:
+            logger.error(f"Error in stream_activity: {str(e)}", exc_info=True)
+            self._record_generation(user_id, selected_category, selected_duration, "stream", "failed", upstream=upstream)
+            yield {"event": "error", "data": {"error": f"Activity generation failed: {str(e)}"}}
+        finally:
+            if plan and plan.get("alternates"):
+                plan["alternates"].cancel()
+    
+    async def _prepare_generation(
+        self,
+        user_id: int,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str,
+        api_allowed: bool = True
+    ) -> Dict[str, Any]:
+        """
+        The steps blocking and streaming generation share: serve from the pre-generated
+        pool, else from the generation cache, else build the prompt for an API call.
+        Alternates are only started in that last case, so pool and cache hits never
+        spend tokens.
+        
+        Returns the "activity" and its "source" ("pool" or "cache"), or None for both
+        when the API is needed, plus the route, prompt, cache result and the child's
+        similarity index to carry on with.
+        """
+        # Recent activities for the prompt's uniqueness hint, and the history to check repeats against
+        logger.info("Getting recent activities")
+        recent_activities, index = await self._run_in_session(self._load_history, user_id)
+        route = self.anthropic_service.router.choose(selected_category, selected_duration)
+        plan = {
+            "index": index,
+            "route": route,
+            "source": None,
+            "activity": None,
+            "result": None,
+            "prompt_parts": None,
+            "alternates": None
+        }
+        
+        # Serve instantly from the pre-generated pool when a compatible activity is ready
+        pooled = self.pool_service.take(
+            selected_category, selected_duration, selected_materials, selected_objectives,
+            lambda activity: self.similarity_service.find_similar_in(index, user_id, activity) is not None
+        )
+        if pooled:
+            return dict(
+                plan, source="pool", activity=pooled["activity"], result={"success": True, "usage": {}},
+                prompt_variables=pooled["variables"], template_id=pooled["template_id"]
+            )
+        
+        plan["prompt_variables"] = self._prompt_variables(
+            recent_activities, selected_duration, selected_materials, selected_objectives, selected_category
+        )
+        plan["template_id"] = self.template_service.template_id
+        
+        # Reuse a cached generation for the same selections when there is one
+        cache_key = self._cache_key(selected_category, selected_duration, selected_materials, selected_objectives, route)
+        plan["result"] = await self._run_in_session(
+            self.cache_service.get, cache_key, self._get_activity_titles(recent_activities)
+        )
+        plan["activity"] = self._usable_cached_activity(index, user_id, plan["result"])
+        if plan["activity"]:
+            return dict(plan, source="cache")
+        
+        plan["prompt_parts"] = self._build_prompt(plan["prompt_variables"])
+        if api_allowed:
+            # Alternates for "give me a different one" are generated alongside the main activity
+            plan["alternates"] = await self._start_alternates(user_id, plan["prompt_parts"], route)
+        return plan
+    
+    async def _run_in_session(self, work: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run work(db, *args) in the threadpool on a database session of its own, closed
+        straight after, so generation never blocks the event loop on the database or
+        keeps a session open while it waits on Anthropic
+        """
+        def run():
+            db = SessionLocal()
+            try:
+                return work(db, *args)
+            finally:
+                db.close()
+        
+        return await run_in_threadpool(run)
+    
+    def _load_history(
+        self,
+        db: Session,
+        user_id: int
+    ) -> Tuple[List[ActivitySession], Optional[UserSimilarityIndex]]:
+        """The child's recent activities and their similarity index"""
+        return self._get_recent_activities(db, user_id), self.similarity_service.load_index(db, user_id)
+    
+    def _save_activity(
+        self,
+        db: Session,
+        user_id: int,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str,
+        prompt_variables: Optional[Dict[str, Any]],
+        template_id: str,
+        parsed_activity: Dict[str, Any],
+        api_result: Optional[Dict[str, Any]],
+        route: Dict[str, Any]
+    ) -> int:
+        """Save a generated activity as a new session and cache the API result if there is one; returns the session ID"""
+        session = self._create_activity_session(
+            db, user_id, selected_duration, selected_materials, selected_objectives,
+            selected_category, prompt_variables, template_id, parsed_activity
+        )
+        if api_result:
+            # Stored under the route that produced it, which differs from the lookup key after a model fallback
+            self.cache_service.put(
+                db, self._cache_key(
+                    selected_category, selected_duration, selected_materials, selected_objectives,
+                    self._served_route(route, api_result)
+                ), selected_category, selected_duration, parsed_activity["title"], api_result
+            )
+        return session.id
+    
+    def _record_generation(
+        self,
+        user_id: Optional[int],
+        selected_category: str,
+        selected_duration: int,
+        source: str,
+        outcome: str,
+        queue_wait_ms: Optional[int] = None,
+        upstream: Optional[Dict[str, Any]] = None
+    ):
+        """Write a telemetry row, taking model, timings, attempts and usage from the upstream result if any"""
+        upstream = upstream or {}
+        self.telemetry.record(
+            source, outcome, user_id=user_id, category=selected_category, duration=selected_duration,
+            model=upstream.get("model"), queue_wait_ms=queue_wait_ms, latency_ms=upstream.get("latency_ms"),
+            ttft_ms=upstream.get("ttft_ms"), attempts=upstream.get("attempts", 0), usage=upstream.get("usage")
+        )
+    
+    def _offline_activity(
+        self,
+        index: Optional[UserSimilarityIndex],
+        user_id: int,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Assemble an activity with the offline generator, trying a few variations to
+        avoid one the child has already done; None when the generator is unavailable
+        """
+        if not self.offline_service.available(selected_category):
+            return None
+        
+        activity = None
+        for _ in range(OFFLINE_ATTEMPTS):
+            activity = self.offline_service.generate(
+                selected_category, selected_duration, selected_materials, selected_objectives
+            )
+            if not self.similarity_service.find_similar_in(index, user_id, activity):
+                break
+        return activity
+    
+    def _usable_cached_activity(
+        self,
+        index: Optional[UserSimilarityIndex],
+        user_id: int,
+        result: Optional[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """Parse a cache hit, or None if there was none or the child has done something too similar"""
+        if not result:
+            return None
+        parsed_activity = self._parse_activity_content(result["content"])
+        repeat = self.similarity_service.find_similar_in(index, user_id, parsed_activity)
+        if repeat:
+            logger.info(f"Skipping cached activity, {repeat['score']:.0%} similar to session {repeat['session_id']}")
+            return None
+        return parsed_activity
+    
+    async def _generate_distinct_activity(
+        self,
+        index: Optional[UserSimilarityIndex],
+        user_id: int,
+        prompt_parts: Dict[str, str],
+        route: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Generate and parse an activity. When it is a near-duplicate of something in the
+        child's history it is regenerated with that title called out, up to
+        activity_similarity_max_regenerations times; the last attempt is kept rather
+        than failing the request.
+        """
+        user_prompt = prompt_parts["user"]
+        max_regenerations = settings.activity_similarity_max_regenerations
+        for attempt in range(max_regenerations + 1):
+            result = await self.anthropic_service.generate_activity_with_retry(
+                user_prompt, system=prompt_parts["system"], tool=activity_tool(), route=route
+            )
+            if not result["success"]:
+                return result, None
+            await self.token_budget.record(user_id, result["usage"])
+            
+            parsed_activity = self._parse_activity_content(result["content"], result.get("structured"))
+            repeat = self.similarity_service.find_similar_in(index, user_id, parsed_activity)
+            if not repeat:
+                break
+            if attempt == max_regenerations:
+                logger.warning(f"Keeping activity {repeat['score']:.0%} similar to session {repeat['session_id']} "
+                               f"after {max_regenerations} regenerations")
+                break
+            logger.info(f"Generated activity is {repeat['score']:.0%} similar to session {repeat['session_id']}, regenerating")
+            user_prompt += (f"\n- The child has already done \"{parsed_activity['title']}\". "
+                            f"Create something completely different.")
+        
+        return result, parsed_activity
+    
+    async def _start_alternates(
+        self,
+        user_id: int,
+        prompt_parts: Dict[str, str],
+        route: Optional[Dict[str, Any]] = None
+    ) -> Optional[asyncio.Task]:
+        """Start generating alternate activities alongside the main one, if enabled and affordable"""
+        count = settings.activity_alternates_count
+        if count <= 0 or not await self.token_budget.allow_background():
+            return None
+        return asyncio.create_task(self._generate_alternates(user_id, prompt_parts, count, route))
+    
+    async def _generate_alternates(
+        self,
+        user_id: int,
+        prompt_parts: Dict[str, str],
+        count: int,
+        route: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Generate extra candidates in one parallel batch. Each is a single attempt without
+        retries, and the batch is skipped while upstream is unhealthy, so alternates never
+        add load when the main generation most needs the capacity.
+        """
+        if self.anthropic_service.circuit_breaker.state != "closed":
+            logger.info("Skipping alternate generation, circuit breaker is not closed")
+            return []
+        
+        results = await asyncio.gather(*[
+            self.anthropic_service.generate_activity(
+                prompt_parts["user"] + f"\n- This is alternate idea #{i + 1}: take the theme in a different direction.",
+                system=prompt_parts["system"],
+                tool=activity_tool(),
+                route=route
+            )
+            for i in range(count)
+        ])
+        route = route or {}
+        for result in results:
+            if result["success"]:
+                await self.token_budget.record(user_id, result["usage"])
+            self._record_generation(
+                user_id, route.get("category"), route.get("duration"), "alternate",
+                "success" if result["success"] else "failed", upstream=dict(result, attempts=1)
+            )
+        return [
+            self._parse_activity_content(result["content"], result.get("structured"))
+            for result in results if result["success"]
+        ]
+    
+    def _attach_alternates(self, user_id: int, session_id: int, alternates: Optional[asyncio.Task]):
+        """Store the alternates on the session once they finish, without holding up the response"""
+        if alternates is None:
+            return
+        task = asyncio.create_task(self._store_alternates(user_id, session_id, alternates))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+    
+    async def _store_alternates(self, user_id: int, session_id: int, alternates: asyncio.Task):
+        try:
+            candidates = await alternates
+            await self._run_in_session(self._save_alternates, user_id, session_id, candidates)
+        except Exception as e:
+            logger.error(f"Generating or storing alternates failed for session {session_id}: {str(e)}")
+    
+    def _save_alternates(self, db: Session, user_id: int, session_id: int, candidates: List[Dict[str, Any]]):
+        # The similarity index already holds the main activity, so this also drops alternates too close to it
+        distinct = [
+            activity for activity in candidates
+            if self.similarity_service.find_similar(db, user_id, activity) is None
+        ]
+        session = self.get_activity_session(db, session_id)
+        if session is None or session.start_time:
+            return
+        session.alternate_activities = [
+            dict(activity, raw_content_digest=digest)
+            for activity, digest in (self._compact_activity(db, activity) for activity in distinct)
+        ]
+        db.commit()
+        logger.info(f"Stored {len(distinct)} of {len(candidates)} alternates for session {session_id}")
+    
+    def can_regenerate(self, db: Session, session: ActivitySession) -> Dict[str, Any]:
+        """
+        Whether the child may swap this activity for a different one: only before it is
+        started, once per activity, and no more than once per regenerate_cooldown_minutes
+        """
+        if session.start_time or session.status != "active":
+            return {"success": False, "error": "started"}
+        if session.regenerated_at:
+            return {"success": False, "error": "already_regenerated"}
+        
+        cutoff = datetime.utcnow() - timedelta(minutes=settings.regenerate_cooldown_minutes)
+        recent = db.query(ActivitySession.id)\
+            .filter(ActivitySession.user_id == session.user_id)\
+            .filter(ActivitySession.regenerated_at >= cutoff)\
+            .first()
+        if recent:
+            return {"success": False, "error": "cooldown"}
+        return {"success": True, "error": None}
+    
+    async def regenerate_activity(self, session_id: int, user_id: int) -> Dict[str, Any]:
+        """
+        Replace a not-yet-started activity with a different one. A stored alternate is
+        served instantly; without one a new activity is generated the usual way, or
+        assembled offline when that isn't possible.
+        """
+        session = await self._run_in_session(self.get_activity_session, session_id)
+        if not session or session.user_id != user_id:
+            return {"success": False, "error": "not_found"}
+        
+        allowed = await self._run_in_session(self.can_regenerate, session)
+        if not allowed["success"]:
+            return allowed
+        
+        alternates = list(session.alternate_activities or [])
+        activity, error, index = None, "generation_failed", None
+        if alternates:
+            activity = alternates.pop(0)
+            source = "alternate"
+        elif (await run_in_threadpool(self.token_budget.admit, user_id))["success"]:
+            recent_activities, index = await self._run_in_session(self._load_history, user_id)
+            prompt_parts = self._build_prompt(self._prompt_variables(
+                recent_activities, session.selected_duration, session.selected_materials,
+                session.selected_objectives, session.selected_category
+            ))
+            route = self.anthropic_service.router.choose(session.selected_category, session.selected_duration)
+            upstream_start = time.monotonic()
+            result, activity = await self._generate_distinct_activity(index, user_id, prompt_parts, route)
+            source = "anthropic"
+            self._record_generation(
+                user_id, session.selected_category, session.selected_duration, "regenerate",
+                "success" if result["success"] else "failed",
+                upstream=dict(result, latency_ms=int((time.monotonic() - upstream_start) * 1000))
+            )
+        else:
+            index = await self._run_in_session(self.similarity_service.load_index, user_id)
+            error = "over_budget"
+        
+        if not activity:
+            activity = self._offline_activity(
+                index, user_id, session.selected_duration, session.selected_materials,
+                session.selected_objectives, session.selected_category
+            )
+            source = "offline"
+            if not activity:
+                return {"success": False, "error": error}
+        
+        replaced = await self._run_in_session(self._replace_activity, session_id, activity, alternates)
+        if not replaced["success"]:
+            return replaced
+        logger.info(f"Regenerated activity for session {session_id} from {source}")
+        return {"success": True, "error": None, "source": source}
+    
+    def _replace_activity(
+        self,
+        db: Session,
+        session_id: int,
+        activity: Dict[str, Any],
+        alternates: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Swap in the new activity, unless the session was started or regenerated while it was generated"""
+        session = self.get_activity_session(db, session_id)
+        allowed = self.can_regenerate(db, session)
+        if not allowed["success"]:
+            return allowed
+        
+        session.generated_activity, session.raw_content_digest = self._compact_activity(db, activity)
+        session.title = activity.get("title", "")[:255]
+        session.alternate_activities = alternates
+        session.regenerated_at = datetime.utcnow()
+        db.commit()
+        self.similarity_service.add(session.user_id, session.id, activity)
+        return {"success": True, "error": None}
+    
+    def selection_key(
+        self,
+        user_id: int,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str
+    ) -> Tuple[int, str]:
+        """Key identifying identical generation requests from the same child"""
+        selection_hash = self.cache_service.make_key(
+            selected_category, selected_duration, selected_materials, selected_objectives,
+            self.template_service.template_version
+        )
+        return (user_id, selection_hash)
+    
+    def _cache_key(
+        self,
+        selected_category: str,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        route: Dict[str, Any]
+    ) -> str:
+        """Generation cache key for the selections on a route's model and max_tokens"""
+        return self.cache_service.make_key(
+            selected_category, selected_duration, selected_materials, selected_objectives,
+            self.template_service.template_version, route["model"], route["max_tokens"]
+        )
+    
+    def _served_route(self, route: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        """The route that produced a result: the chosen one, or its fallback when a retry switched models"""
+        if result.get("model") in (None, route["model"]):
+            return route
+        return self.anthropic_service.router.fallback(route) or dict(route, model=result["model"])
+    
+    def _begin_flight(self, key: Tuple[int, str]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        return future
+    
+    def _end_flight(self, key: Tuple[int, str], future: asyncio.Future, result: Optional[Dict[str, Any]]):
+        """
+        Resolve waiting duplicates with the leader's result. Successful results stay
+        attached for a short window so a resubmit right after finishing lands on the
+        same session instead of creating a new one.
+        """
+        if result is None:
+            result = {"success": False, "error": "Activity generation was interrupted"}
+        if not future.done():
+            future.set_result(result)
+        
+        def release():
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+        
+        if result["success"] and settings.generation_coalesce_window_seconds > 0:
+            asyncio.get_running_loop().call_later(settings.generation_coalesce_window_seconds, release)
+        else:
+            release()
+    
+    def _activity_events(self, activity: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Stream events for an activity that is already complete (pooled or cached)"""
+        events = [{"event": "title", "data": {"title": activity["title"]}}]
+        if activity["description"]:
+            events.append({"event": "description", "data": {"description": activity["description"]}})
+        for step in activity["steps"]:
+            events.append({"event": "step", "data": {"step": step}})
+        return events
+    
+    def _prompt_variables(
+        self,
+        recent_activities: List[ActivitySession],
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str
+    ) -> Dict[str, Any]:
+        """Template variables for the child's selections and recent activity history"""
+        recent_activities_summary = self._format_recent_activities(recent_activities)
+        logger.info(f"Recent activities summary: {recent_activities_summary}")
+        
+        # Prepare template variables
+        variables = {
+            "selected_duration": selected_duration,
+            "selected_materials": self.template_service.format_materials_list(selected_materials),
+            "selected_objectives": self.template_service.format_objectives_list(selected_objectives),
+            "selected_category": selected_category,
+            "min_materials_count": len(selected_materials) - 1,
+            "recent_activities_summary": recent_activities_summary
+        }
+        logger.info(f"Template variables prepared: {variables}")
+        return variables
+    
+    def _build_prompt(self, variables: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Build the Anthropic prompt from template variables, split into the cacheable
+        system prefix and the per-request user suffix
+        """
+        logger.info("Generating prompt from template")
+        prompt_parts = self.template_service.populate_template_parts(variables)
+        logger.info(f"Generated prompt length: system={len(prompt_parts['system'])}, user={len(prompt_parts['user'])}")
+        logger.info(f"Per-request prompt section:\n{prompt_parts['user']}")
+        return prompt_parts
+    
+    def _create_activity_session(
+        self,
+        db: Session,
+        user_id: int,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str,
+        prompt_variables: Optional[Dict[str, Any]],
+        template_id: str,
+        parsed_activity: Dict[str, Any]
+    ) -> ActivitySession:
+        """Save a generated activity as a new ActivitySession"""
+        logger.info("Creating activity session in database")
+        activity, raw_content_digest = self._compact_activity(db, parsed_activity)
+        if template_id == self.template_service.template_id:
+            # Keep this template version's source so the prompt can be rebuilt after later edits
+            self.content_store.put(db, self.template_service.source)
+        session = ActivitySession(
+            user_id=user_id,
+            selected_duration=selected_duration,
+            selected_materials=selected_materials,
+            selected_objectives=selected_objectives,
+            selected_category=selected_category,
+            prompt_template_id=template_id,
+            prompt_variables=prompt_variables,
+            title=activity.get("title", "")[:255],
+            generated_activity=activity,
+            raw_content_digest=raw_content_digest,
+            generation_timestamp=datetime.utcnow()
+        )
+        
+        db.add(session)
+        db.commit()
+        db.refresh(session)
+        BannerStatsService.invalidate(user_id)
+        self.similarity_service.add(user_id, session.id, parsed_activity)
+        logger.info(f"Activity session created with ID: {session.id}")
+        return session
+    
+    def _compact_activity(self, db: Session, activity: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Split an activity into the JSON stored on a session and the digest of its raw_content blob"""
+        activity = dict(activity)
+        raw_content = activity.pop("raw_content", None)
+        digest = activity.pop("raw_content_digest", None)
+        if raw_content:
+            digest = self.content_store.put(db, raw_content)
+        return activity, digest
     
     def _get_recent_activities(self, db: Session, user_id: int, limit: int = 5) -> List[ActivitySession]:
         """Get recent activities for uniqueness check"""
@@ -114,6 +992,10 @@ class ActivityService:
             .limit(limit)\
             .all()
     
+    def _get_activity_titles(self, activities: List[ActivitySession]) -> List[str]:
+        """Get the titles of activities, used to avoid serving a repeat"""
+        return [activity.title or "" for activity in activities]
+    
     def _format_recent_activities(self, activities: List[ActivitySession]) -> str:
         """Format recent activities for template"""
         if not activities:
@@ -121,11 +1003,43 @@ class ActivityService:
         
         summaries = []
         for i, activity in enumerate(activities, 1):
-            title = activity.generated_activity.get("title", f"Activity {i}")
+            title = activity.title or f"Activity {i}"
             summaries.append(f"{i}. {title}")
         
         return "; ".join(summaries)
     
+    def _parse_activity_content(self, content: str, structured: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Parse a generation into the activity dict. Structured (tool use) output is
+        validated in one pass; plain text, or structured output that fails
+        validation, goes through the free-text parser.
+        """
+        start = time.perf_counter()
+        if structured is None and content.lstrip().startswith("{"):
+            # Cached generations only keep the content, which is the tool input as JSON
+            try:
+                structured = json.loads(content)
+            except ValueError:
+                structured = None
+            if not isinstance(structured, dict):
+                structured = None
+        
+        if structured is None:
+            activity = self._parse_generated_activity(content)
+            self.parse_stats.record("text", time.perf_counter() - start)
+            return activity
+        
+        try:
+            activity = StructuredActivity.model_validate(structured).to_activity(content)
+            self.parse_stats.record("structured", time.perf_counter() - start)
+            return activity
+        except ValidationError as e:
+            logger.warning(f"Structured activity failed validation, falling back to text parsing: {str(e)}")
+            activity = self._parse_generated_activity(structured_to_text(structured))
+            activity["raw_content"] = content
+            self.parse_stats.record("text", time.perf_counter() - start, failed=True)
+            return activity
+    
     def _parse_generated_activity(self, content: str) -> Dict[str, Any]:
         """
         Parse the generated activity content into structured format
@@ -168,8 +1082,32 @@ class ActivityService:
         return activity
     
     def get_activity_session(self, db: Session, session_id: int) -> Optional[ActivitySession]:
-        """Get activity session by ID"""
-        return db.query(ActivitySession).filter(ActivitySession.id == session_id).first()
+        """Get activity session by ID, with its generated content"""
+        return db.query(ActivitySession).options(undefer_group("content"))\
+            .filter(ActivitySession.id == session_id).first()
+    
+    def get_prompt(self, db: Session, session: ActivitySession) -> Optional[str]:
+        """The prompt a session was generated from, rebuilt from its template version and variables"""
+        if session.anthropic_prompt:
+            return session.anthropic_prompt
+        if session.prompt_variables is None or not session.prompt_template_id:
+            return None
+        if session.prompt_template_id == self.template_service.template_id:
+            return self.template_service.join_prompt_parts(self._build_prompt(session.prompt_variables))
+        
+        # An earlier template version, or a prompt in the legacy layout ("<stem>@<version>/legacy"):
+        # its source is stored under a digest starting with the version
+        stem, _, version = session.prompt_template_id.partition("@")
+        version, _, layout = version.partition("/")
+        source = self.content_store.find(db, version) if stem == self.template_service.template_path.stem else None
+        if source is None:
+            logger.warning(f"Template source for {session.prompt_template_id} not found, cannot rebuild prompt")
+            return None
+        return self.template_service.render_source(source, session.prompt_variables, layout or None)
+    
+    def get_raw_content(self, db: Session, session: ActivitySession) -> Optional[str]:
+        """The model's full response text for a session"""
+        return self.content_store.get(db, session.raw_content_digest) or session.generated_activity.get("raw_content")
     
     def start_activity(self, db: Session, session_id: int) -> bool:
         """Start an activity session"""
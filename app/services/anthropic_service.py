@@ -1,7 +1,11 @@
 import anthropic
+import httpx
+import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, Tuple
 from app.config import settings
+from app.services.retry_policy import RetryPolicy, LatencyTracker, CircuitBreaker
+from app.services.model_router import ModelRouter
 import asyncio
 import time
 
@@ -9,75 +13,375 @@ import time
 logger = logging.getLogger(__name__)
 
 class AnthropicService:
+    # Shared by every instance so all generations reuse one keep-alive connection pool
+    _client: Optional[anthropic.AsyncAnthropic] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _circuit_breaker: Optional[CircuitBreaker] = None
+    _latency_tracker: Optional[LatencyTracker] = None
+    _router: Optional[ModelRouter] = None
+    
     def __init__(self):
         logger.info("Initializing AnthropicService")
-        self.client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+        self.client = self._get_client()
         self.model = settings.anthropic_model
         self.max_tokens = settings.anthropic_max_tokens
         self.temperature = settings.anthropic_temperature
+        self.timeout = settings.anthropic_timeout_seconds
+        self.retry_policy = RetryPolicy()
+        if AnthropicService._circuit_breaker is None:
+            AnthropicService._circuit_breaker = CircuitBreaker()
+            AnthropicService._latency_tracker = LatencyTracker()
+            AnthropicService._router = ModelRouter()
+        self.circuit_breaker = AnthropicService._circuit_breaker
+        self.latency_tracker = AnthropicService._latency_tracker
+        self.router = AnthropicService._router
         logger.info(f"AnthropicService initialized with model={self.model}, max_tokens={self.max_tokens}")
     
-    async def generate_activity(self, prompt: str) -> Dict[str, Any]:
+    @classmethod
+    def _get_client(cls) -> anthropic.AsyncAnthropic:
+        """Get the shared async client, creating it with a pooled HTTP transport on first use"""
+        if cls._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.anthropic_max_connections,
+                    max_keepalive_connections=settings.anthropic_max_keepalive_connections,
+                    keepalive_expiry=settings.anthropic_keepalive_expiry_seconds
+                ),
+                timeout=httpx.Timeout(
+                    settings.anthropic_timeout_seconds,
+                    connect=settings.anthropic_connect_timeout_seconds
+                )
+            )
+            # Retries are handled by generate_activity_with_retry
+            cls._client = anthropic.AsyncAnthropic(
+                api_key=settings.anthropic_api_key,
+                base_url=settings.anthropic_base_url,
+                http_client=http_client,
+                max_retries=0
+            )
+            logger.info(f"Created shared Anthropic client: max_connections={settings.anthropic_max_connections}, "
+                        f"max_keepalive={settings.anthropic_max_keepalive_connections}, "
+                        f"base_url={settings.anthropic_base_url or 'default'}")
+        return cls._client
+    
+    @classmethod
+    def _get_semaphore(cls) -> asyncio.Semaphore:
+        """Get the semaphore limiting concurrent in-flight API calls"""
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(settings.anthropic_max_concurrent_requests)
+        return cls._semaphore
+    
+    @classmethod
+    async def aclose(cls):
+        """Close the shared client and its connection pool"""
+        if cls._client is not None:
+            await cls._client.close()
+            cls._client = None
+            logger.info("Closed shared Anthropic client")
+    
+    def _request_params(
+        self,
+        prompt: str,
+        system: Optional[str],
+        timeout: Optional[float],
+        tool: Optional[Dict[str, Any]] = None,
+        route: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
-        Generate an activity using Anthropic's Claude API
+        Build the Messages API parameters. The static system prefix is marked with a
+        prompt-cache breakpoint so repeat generations only process the small user suffix.
+        When a tool is given the model is forced to answer through it (structured output).
+        The route supplies the model and max_tokens.
         """
-        logger.info(f"Generating activity with prompt length: {len(prompt)}")
+        route = route or self.router.default_route()
+        params = {
+            "model": route["model"],
+            "max_tokens": route["max_tokens"],
+            "temperature": self.temperature,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "timeout": timeout or self.timeout
+        }
+        if system:
+            system_block = {"type": "text", "text": system}
+            if settings.anthropic_prompt_caching_enabled:
+                system_block["cache_control"] = {"type": "ephemeral"}
+            params["system"] = [system_block]
+        if tool:
+            params["tools"] = [tool]
+            params["tool_choice"] = {"type": "tool", "name": tool["name"]}
+        return params
+    
+    def _response_content(self, response) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """Text content of a response, plus the tool input when the model answered through a tool"""
+        for block in response.content:
+            if block.type == "tool_use":
+                return json.dumps(block.input), block.input
+        return "".join(block.text for block in response.content if block.type == "text"), None
+    
+    def _usage(self, usage) -> Dict[str, int]:
+        """Token usage including prompt-cache reads and writes"""
+        return {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0
+        }
+    
+    async def generate_activity(
+        self,
+        prompt: str,
+        timeout: Optional[float] = None,
+        system: Optional[str] = None,
+        tool: Optional[Dict[str, Any]] = None,
+        route: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate an activity using Anthropic's Claude API. With a tool, the result
+        also carries the tool input as "structured" and content is its JSON.
+        """
+        route = route or self.router.default_route()
+        logger.info(f"Generating activity with prompt length: {len(prompt)}, model={route['model']}, "
+                    f"max_tokens={route['max_tokens']}")
+        start = None
         try:
-            logger.info("Making API call to Anthropic")
-            response = await asyncio.to_thread(
-                self.client.messages.create,
-                model=self.model,
-                max_tokens=self.max_tokens,
-                temperature=self.temperature,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            )
+            async with self._get_semaphore():
+                logger.info("Making API call to Anthropic")
+                start = time.monotonic()
+                response = await self.client.messages.create(**self._request_params(prompt, system, timeout, tool, route))
+                elapsed = time.monotonic() - start
             
-            logger.info(f"API call successful, response length: {len(response.content[0].text)}")
+            self.latency_tracker.record(elapsed)
+            usage = self._usage(response.usage)
+            self.router.record(route, elapsed, usage, response.stop_reason)
+            content, structured = self._response_content(response)
+            logger.info(f"API call successful in {elapsed:.2f}s, response length: {len(content)}, usage: {usage}")
             return {
                 "success": True,
-                "content": response.content[0].text,
-                "model": self.model,
-                "usage": {
-                    "input_tokens": response.usage.input_tokens,
-                    "output_tokens": response.usage.output_tokens
-                }
+                "content": content,
+                "structured": structured,
+                "model": route["model"],
+                "usage": usage,
+                "latency_ms": int(elapsed * 1000)
             }
             
         except Exception as e:
             logger.error(f"API call failed: {str(e)}", exc_info=True)
+            if isinstance(e, anthropic.APITimeoutError) and start is not None:
+                # A timed-out call took at least this long, which counts against the model's SLO
+                self.router.record_timeout(route, time.monotonic() - start)
             return {
                 "success": False,
                 "error": str(e),
-                "content": None
+                "content": None,
+                "model": route["model"],
+                "retryable": self._is_retryable(e)
             }
     
-    async def generate_activity_with_retry(self, prompt: str, max_retries: int = 3) -> Dict[str, Any]:
+    def _is_retryable(self, error: Exception) -> bool:
+        """Client errors other than timeouts, conflicts and rate limits won't succeed on retry"""
+        if isinstance(error, anthropic.APIStatusError):
+            return error.status_code in (408, 409, 429) or error.status_code >= 500
+        return True
+    
+    async def stream_activity(
+        self,
+        prompt: str,
+        timeout: Optional[float] = None,
+        system: Optional[str] = None,
+        tool: Optional[Dict[str, Any]] = None,
+        route: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
-        Generate activity with retry logic and kid-friendly waiting messages
+        Stream an activity from Anthropic's Claude API, yielding text deltas as they
+        arrive followed by a final "done" event carrying the full content and usage.
+        With a tool, "json" events carry the partially parsed tool input instead of text.
         """
+        logger.info(f"Streaming activity with prompt length: {len(prompt)}")
+        if not self.circuit_breaker.allow_request():
+            raise RuntimeError("Activity service is temporarily unavailable, please try again soon")
+        
+        finished = False
+        try:
+            async for chunk in self._stream_activity(prompt, timeout, system, tool, route or self.router.default_route()):
+                yield chunk
+            finished = True
+            self.circuit_breaker.record_success()
+        except Exception:
+            finished = True
+            self.circuit_breaker.record_failure()
+            raise
+        finally:
+            if not finished:
+                # The reader went away mid-stream, which says nothing about upstream health
+                self.circuit_breaker.cancel_trial()
+    
+    async def _stream_activity(
+        self,
+        prompt: str,
+        timeout: Optional[float],
+        system: Optional[str],
+        tool: Optional[Dict[str, Any]],
+        route: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        async with self._get_semaphore():
+            logger.info("Opening streaming API call to Anthropic")
+            start = time.monotonic()
+            first_token_at = None
+            async with self.client.messages.stream(**self._request_params(prompt, system, timeout, tool, route)) as stream:
+                async for event in stream:
+                    if event.type not in ("text", "input_json"):
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                        logger.info(f"First token received after {first_token_at - start:.2f}s")
+                    if event.type == "text":
+                        yield {"type": "text", "text": event.text}
+                    else:
+                        yield {"type": "json", "snapshot": event.snapshot}
+                
+                response = await stream.get_final_message()
+            
+            elapsed = time.monotonic() - start
+            content, structured = self._response_content(response)
+            usage = self._usage(response.usage)
+            self.router.record(route, elapsed, usage, response.stop_reason)
+            logger.info(f"Streaming API call finished in {elapsed:.2f}s, response length: {len(content)}, usage: {usage}")
+            yield {
+                "type": "done",
+                "content": content,
+                "structured": structured,
+                "model": route["model"],
+                "usage": usage,
+                "latency_ms": int(elapsed * 1000),
+                "ttft_ms": int((first_token_at - start) * 1000) if first_token_at else None
+            }
+    
+    async def generate_activity_with_retry(
+        self,
+        prompt: str,
+        max_retries: Optional[int] = None,
+        system: Optional[str] = None,
+        tool: Optional[Dict[str, Any]] = None,
+        route: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate activity with exponential backoff, a per-request deadline, optional
+        hedging and a circuit breaker that fails fast while upstream is down. Attempts
+        after a failure move to the router's fallback model when one is configured.
+        """
+        route = route or self.router.default_route()
+        max_retries = max_retries or settings.anthropic_retry_max_attempts
+        deadline = time.monotonic() + settings.anthropic_request_deadline_seconds
+        attempts = 0
+        
         for attempt in range(max_retries):
+            if not self.circuit_breaker.allow_request():
+                logger.warning("Circuit open, failing fast without calling Anthropic")
+                return {
+                    "success": False,
+                    "error": "Activity service is temporarily unavailable, please try again soon",
+                    "content": None,
+                    "model": route["model"],
+                    "attempts": attempts
+                }
+            
             if attempt > 0:
-                # Kid-friendly waiting message
-                waiting_messages = [
-                    "Do 10 jumping jacks while we create your activity!",
-                    "Take 5 deep breaths while we prepare something amazing!",
-                    "Do a little dance while we get your activity ready!",
-                    "Count to 20 while we make something special for you!"
-                ]
-                await asyncio.sleep(2)  # Brief pause between retries
+                delay = self.retry_policy.backoff(attempt)
+                if time.monotonic() + delay >= deadline:
+                    break
+                logger.info(f"Retrying generation in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(delay)
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
             
-            result = await self.generate_activity(prompt)
+            attempts += 1
+            try:
+                result = await self._hedged_generate(
+                    prompt, system, self.router.attempt_timeout(route, remaining), tool, route
+                )
+            except asyncio.CancelledError:
+                self.circuit_breaker.cancel_trial()
+                raise
             if result["success"]:
+                self.circuit_breaker.record_success()
+                result["attempts"] = attempt + 1
                 return result
+            
+            self.circuit_breaker.record_failure()
+            if not result.get("retryable", True):
+                logger.warning(f"Not retrying non-retryable error: {result['error']}")
+                break
+            fallback = self.router.fallback(route)
+            if fallback:
+                logger.info(f"Falling back from {route['model']} to {fallback['model']}")
+                route = fallback
         
         # If all retries failed
         return {
             "success": False,
             "error": "Unable to generate activity after multiple attempts",
-            "content": None
-        } 
\ No newline at end of file
+            "content": None,
+            "model": route["model"],
+            "attempts": attempts
+        }
+    
+    def _hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging: the configured threshold, or the observed p95"""
+        if not settings.anthropic_hedging_enabled:
+            return None
+        if settings.anthropic_hedge_after_seconds > 0:
+            return settings.anthropic_hedge_after_seconds
+        return self.latency_tracker.percentile(95)
+    
+    async def _hedged_generate(
+        self,
+        prompt: str,
+        system: Optional[str],
+        remaining: float,
+        tool: Optional[Dict[str, Any]] = None,
+        route: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Run one attempt. If hedging is on and the call hasn't returned by the hedge
+        threshold, start a second call (on the fallback model when there is one), use
+        whichever succeeds first and cancel the other.
+        """
+        route = route or self.router.default_route()
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or hedge_delay >= remaining:
+            return await self.generate_activity(prompt, timeout=remaining, system=system, tool=tool, route=route)
+        
+        primary = asyncio.ensure_future(
+            self.generate_activity(prompt, timeout=remaining, system=system, tool=tool, route=route)
+        )
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+        
+        logger.info(f"No response after {hedge_delay:.2f}s, sending hedged request")
+        hedge = asyncio.ensure_future(
+            self.generate_activity(
+                prompt, timeout=remaining - hedge_delay, system=system, tool=tool,
+                route=self.router.fallback(route) or route
+            )
+        )
+        pending = {primary, hedge}
+        result = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result["success"]:
+                        return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
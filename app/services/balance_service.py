@@ -0,0 +1,111 @@
+import logging
+from typing import Dict, Any, List, Tuple
+from sqlalchemy import func, case, update
+from sqlalchemy.orm import Session
+from app.models.user import User
+from app.models.user_balance import UserBalance
+from app.models.activity import ActivitySession
+from app.models.daily_stats import DailyStats
+from app.models.reimbursement import PointDeduction
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class BalanceService:
+    """
+    Each child's points totals, kept in user_balances so reading them is a
+    primary-key lookup instead of summing their whole history.
+
+    Changes are added to the caller's transaction and never committed here, so a
+    balance is always written together with the score, stats or deduction behind it.
+    verify() compares the stored totals with the history and can rebuild them.
+    """
+
+    def get(self, db: Session, user_id: int) -> UserBalance:
+        """The child's balance; all zeros if they have never earned or spent points"""
+        return db.get(UserBalance, user_id) or self._empty(user_id)
+
+    def credit(self, db: Session, user_id: int, points: int):
+        """Add a newly scored activity and its points"""
+        self._adjust(db, user_id, earned=points, scored=1)
+
+    def debit(self, db: Session, user_id: int, points: int):
+        """Record points spent on a reimbursement"""
+        self._adjust(db, user_id, spent=points)
+
+    def rebuild(self, db: Session, user_id: int) -> UserBalance:
+        """Recompute a child's balance from daily_stats, point_deductions and their scored activities"""
+        earned, spent, scored = self._totals(db, [user_id])[user_id]
+        balance = self._row(db, user_id)
+        balance.lifetime_earned = earned
+        balance.spent = spent
+        balance.balance = max(0, earned - spent)
+        balance.scored_activities = scored
+        return balance
+
+    def verify(self, db: Session, rebuild: bool = False) -> List[Dict[str, Any]]:
+        """Children whose stored balance differs from their history; with rebuild=True they are corrected"""
+        user_ids = [user_id for (user_id,) in db.query(User.id).order_by(User.id)]
+        totals = self._totals(db, user_ids)
+        stored = {balance.user_id: balance for balance in db.query(UserBalance)}
+
+        drift = []
+        for user_id in user_ids:
+            earned, spent, scored = totals[user_id]
+            expected = {
+                "lifetime_earned": earned,
+                "spent": spent,
+                "balance": max(0, earned - spent),
+                "scored_activities": scored
+            }
+            row = stored.get(user_id)
+            actual = {key: getattr(row, key) if row else 0 for key in expected}
+            if actual != expected:
+                drift.append({"user_id": user_id, "expected": expected, "actual": actual})
+                if rebuild:
+                    self.rebuild(db, user_id)
+                    logger.info(f"Rebuilt balance for user {user_id}: {actual} -> {expected}")
+        return drift
+
+    def _adjust(self, db: Session, user_id: int, earned: int = 0, spent: int = 0, scored: int = 0):
+        # One UPDATE computed from the stored values, so concurrent changes can't overwrite each other
+        self._row(db, user_id)
+        net = UserBalance.lifetime_earned + earned - UserBalance.spent - spent
+        db.execute(
+            update(UserBalance)
+            .where(UserBalance.user_id == user_id)
+            .values(
+                lifetime_earned=UserBalance.lifetime_earned + earned,
+                spent=UserBalance.spent + spent,
+                balance=case((net > 0, net), else_=0),
+                scored_activities=UserBalance.scored_activities + scored
+            )
+        )
+
+    def _row(self, db: Session, user_id: int) -> UserBalance:
+        balance = db.get(UserBalance, user_id)
+        if balance is None:
+            balance = self._empty(user_id)
+            db.add(balance)
+            db.flush()
+        return balance
+
+    def _empty(self, user_id: int) -> UserBalance:
+        return UserBalance(user_id=user_id, lifetime_earned=0, spent=0, balance=0, scored_activities=0)
+
+    def _totals(self, db: Session, user_ids: List[int]) -> Dict[int, Tuple[int, int, int]]:
+        """(earned, spent, scored activities) per child, from their history"""
+        # Sessions use autoflush=False; the caller's pending stats and deductions must count
+        db.flush()
+        earned = dict(db.query(DailyStats.user_id, func.coalesce(func.sum(DailyStats.total_points), 0))
+                      .filter(DailyStats.user_id.in_(user_ids)).group_by(DailyStats.user_id))
+        spent = dict(db.query(PointDeduction.user_id, func.coalesce(func.sum(PointDeduction.points_deducted), 0))
+                     .filter(PointDeduction.user_id.in_(user_ids)).group_by(PointDeduction.user_id))
+        scored = dict(db.query(ActivitySession.user_id, func.count(ActivitySession.id))
+                      .filter(ActivitySession.user_id.in_(user_ids), ActivitySession.status == "scored")
+                      .group_by(ActivitySession.user_id))
+        return {
+            user_id: (int(earned.get(user_id, 0)), int(spent.get(user_id, 0)), scored.get(user_id, 0))
+            for user_id in user_ids
+        }
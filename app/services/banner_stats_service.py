@@ -0,0 +1,104 @@
+import logging
+import time
+from datetime import date
+from typing import Dict, Any, Optional, Tuple
+from fastapi import Request
+from sqlalchemy import select, exists, and_
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User
+from app.models.activity import ActivitySession
+from app.models.daily_stats import DailyStats
+from app.models.user_balance import UserBalance
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class BannerStatsService:
+    """
+    The stats in the child pages' banner: today's daily stats, scored activities and
+    points earned, plus whether the child can start a new activity. All of it comes
+    from one query.
+
+    Results are memoized on the request. When banner_stats_cache_ttl_seconds is set
+    they are also cached per child across requests, and invalidate() drops a child's
+    entry whenever a score, a new activity or a redemption changes them.
+    """
+
+    # (user_id, date) -> (expires at, stats), shared by every instance
+    _cache: Dict[Tuple[int, date], Tuple[float, Dict[str, Any]]] = {}
+
+    def get(self, db: Session, user_id: int, request: Optional[Request] = None) -> Dict[str, Any]:
+        """Banner stats for a child, from the request or child cache if there"""
+        stats = self._lookup(user_id, request)
+        if stats is None:
+            stats = self._remember(user_id, request, db.execute(self._statement(user_id)).one_or_none())
+        return stats
+
+    async def get_async(self, db: AsyncSession, user_id: int, request: Optional[Request] = None) -> Dict[str, Any]:
+        """get on an async session"""
+        stats = self._lookup(user_id, request)
+        if stats is None:
+            stats = self._remember(user_id, request, (await db.execute(self._statement(user_id))).one_or_none())
+        return stats
+
+    @classmethod
+    def invalidate(cls, user_id: int):
+        """Forget a child's cached stats after something they show has changed"""
+        for key in [key for key in cls._cache if key[0] == user_id]:
+            cls._cache.pop(key, None)
+
+    def _statement(self, user_id: int):
+        today = date.today()
+        has_unscored = exists().where(
+            ActivitySession.user_id == user_id,
+            ActivitySession.status.in_(["active", "completed"])
+        )
+        return select(
+            DailyStats.activities_completed,
+            DailyStats.total_points,
+            DailyStats.total_time_minutes,
+            UserBalance.scored_activities,
+            UserBalance.lifetime_earned,
+            has_unscored.label("has_unscored")
+        ).select_from(User)\
+            .outerjoin(DailyStats, and_(DailyStats.user_id == User.id, DailyStats.date == today))\
+            .outerjoin(UserBalance, UserBalance.user_id == User.id)\
+            .where(User.id == user_id)
+
+    def _lookup(self, user_id: int, request: Optional[Request]) -> Optional[Dict[str, Any]]:
+        if request is not None:
+            memo = getattr(request.state, "banner_stats", {})
+            if user_id in memo:
+                return memo[user_id]
+        if settings.banner_stats_cache_ttl_seconds > 0:
+            cached = self._cache.get((user_id, date.today()))
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+        return None
+
+    def _remember(self, user_id: int, request: Optional[Request], row: Any) -> Dict[str, Any]:
+        today = date.today()
+        activities_completed = (row.activities_completed if row else None) or 0
+        has_unscored = bool(row.has_unscored) if row else False
+        stats = {
+            "daily_stats": {
+                "activities_completed": activities_completed,
+                "total_points": (row.total_points if row else None) or 0,
+                "total_time_minutes": (row.total_time_minutes if row else None) or 0,
+                "date": today.isoformat()
+            },
+            "total_activities": (row.scored_activities if row else None) or 0,
+            "total_points": (row.lifetime_earned if row else None) or 0,
+            "has_unscored": has_unscored,
+            "can_start_new": activities_completed < settings.max_activities_per_day and not has_unscored
+        }
+        if request is not None:
+            if not hasattr(request.state, "banner_stats"):
+                request.state.banner_stats = {}
+            request.state.banner_stats[user_id] = stats
+        if settings.banner_stats_cache_ttl_seconds > 0:
+            self._cache[(user_id, today)] = (time.monotonic() + settings.banner_stats_cache_ttl_seconds, stats)
+        return stats
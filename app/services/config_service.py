@@ -1,5 +1,6 @@
 from typing import Dict, Any, List
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.config import SystemConfig
 from app.config import settings
 import json
@@ -76,4 +77,8 @@ class ConfigService:
             "materials": self.get_materials_config(db),
             "learning_objectives": self.get_learning_objectives(db),
             "categories": self.get_categories(db)
-        } 
\ No newline at end of file
+        }
+    
+    async def get_full_config_async(self, db: AsyncSession) -> Dict[str, Any]:
+        """get_full_config on an async session"""
+        return await db.run_sync(self.get_full_config)
@@ -0,0 +1,69 @@
+import hashlib
+import logging
+import zlib
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.content_blob import ContentBlob
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class ContentStoreService:
+    """
+    Content-addressed storage for large text payloads: activity bodies (the model's
+    raw response) and prompt template sources. A payload is keyed by the sha256 of
+    its text, so identical payloads, such as a cached generation served to several
+    children, are stored once. Payloads are zlib-compressed when that saves space.
+
+    Blobs are immutable; put() adds to the caller's transaction and never commits.
+    """
+
+    def put(self, db: Session, text: str) -> str:
+        """Store a payload if it isn't already stored and return its digest"""
+        raw = text.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        if db.get(ContentBlob, digest) is None:
+            encoding, data = self._encode(raw)
+            db.add(ContentBlob(digest=digest, encoding=encoding, data=data, size=len(raw)))
+            # Later puts of the same payload in this transaction must see it
+            db.flush()
+        return digest
+
+    def get(self, db: Session, digest: Optional[str]) -> Optional[str]:
+        """The payload stored under a digest, or None"""
+        if not digest:
+            return None
+        blob = db.get(ContentBlob, digest)
+        return self._decode(blob) if blob else None
+
+    def find(self, db: Session, digest_prefix: str) -> Optional[str]:
+        """The payload whose digest starts with a prefix, e.g. a prompt template version"""
+        blob = db.query(ContentBlob).filter(ContentBlob.digest.startswith(digest_prefix)).first()
+        return self._decode(blob) if blob else None
+
+    def get_stats(self, db: Session) -> Dict[str, Any]:
+        count, size, stored = db.query(
+            func.count(ContentBlob.digest),
+            func.coalesce(func.sum(ContentBlob.size), 0),
+            func.coalesce(func.sum(func.length(ContentBlob.data)), 0)
+        ).one()
+        return {
+            "blobs": count,
+            "bytes": size,
+            "stored_bytes": stored,
+            "compression_ratio": round(stored / size, 3) if size else None
+        }
+
+    def _encode(self, raw: bytes) -> Tuple[str, bytes]:
+        if settings.content_blob_compression_enabled and len(raw) >= settings.content_blob_compress_min_bytes:
+            compressed = zlib.compress(raw, 6)
+            if len(compressed) < len(raw):
+                return "zlib", compressed
+        return "identity", raw
+
+    def _decode(self, blob: ContentBlob) -> str:
+        data = zlib.decompress(blob.data) if blob.encoding == "zlib" else blob.data
+        return data.decode("utf-8")
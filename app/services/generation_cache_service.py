@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from sqlalchemy.orm import Session
+from app.models.generation_cache import GenerationCacheEntry
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class GenerationCacheService:
+    """
+    Persistent cache of Anthropic generations keyed on the normalized child
+    selections, so identical selections (materials and objectives in any order)
+    don't each pay for a new API call. Entries expire after a TTL and the least
+    recently used ones are evicted once the cache is full.
+    """
+    
+    def __init__(self):
+        self.ttl = timedelta(hours=settings.generation_cache_ttl_hours)
+        self.max_entries = settings.generation_cache_max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def make_key(
+        self,
+        selected_category: str,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        template_version: str,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Build a canonical hash of the prompt inputs that are shared between children.
+        model and max_tokens are the route that produced (or will produce) the
+        generation, so a fallback-model output is never served for the primary model.
+        max_tokens only counts by its bucket: the router adjusts it as observed output
+        lengths move, and small adjustments must not orphan the cached entries.
+        """
+        canonical = json.dumps({
+            "category": selected_category,
+            "duration": selected_duration,
+            "materials": sorted(set(selected_materials)),
+            "objectives": sorted(set(selected_objectives)),
+            "template_version": template_version,
+            "model": model,
+            "max_tokens": self._max_tokens_bucket(max_tokens)
+        }, sort_keys=True)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def _max_tokens_bucket(self, max_tokens: Optional[int]) -> Optional[int]:
+        """max_tokens rounded up to a multiple of generation_cache_max_tokens_step"""
+        step = settings.generation_cache_max_tokens_step
+        if max_tokens is None or step <= 0:
+            return max_tokens
+        return -(-max_tokens // step) * step
+    
+    def get(self, db: Session, cache_key: str, exclude_titles: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Get a cached generation for the key, skipping any whose title is in
+        exclude_titles so a child is never served an activity they did recently
+        """
+        if not settings.generation_cache_enabled:
+            return None
+        
+        cutoff = datetime.utcnow() - self.ttl
+        excluded = {title.strip().lower() for title in exclude_titles}
+        entries = db.query(GenerationCacheEntry).filter(
+            GenerationCacheEntry.cache_key == cache_key,
+            GenerationCacheEntry.created_at >= cutoff
+        ).order_by(GenerationCacheEntry.last_accessed_at.desc()).all()
+        
+        for entry in entries:
+            if (entry.title or "").strip().lower() in excluded:
+                continue
+            entry.hit_count += 1
+            entry.last_accessed_at = datetime.utcnow()
+            db.commit()
+            self.hits += 1
+            logger.info(f"Generation cache hit for key {cache_key[:12]} (entry {entry.id})")
+            return {
+                "success": True,
+                "content": entry.content,
+                "model": entry.model,
+                "usage": {"input_tokens": 0, "output_tokens": 0},
+                "cached": True
+            }
+        
+        self.misses += 1
+        logger.info(f"Generation cache miss for key {cache_key[:12]}")
+        return None
+    
+    def put(
+        self,
+        db: Session,
+        cache_key: str,
+        selected_category: str,
+        selected_duration: int,
+        title: str,
+        result: Dict[str, Any]
+    ):
+        """Store a successful generation and evict expired or least recently used entries"""
+        if not settings.generation_cache_enabled:
+            return
+        
+        try:
+            entry = GenerationCacheEntry(
+                cache_key=cache_key,
+                selected_category=selected_category,
+                selected_duration=selected_duration,
+                title=title,
+                content=result["content"],
+                model=result.get("model"),
+                usage=result.get("usage", {}),
+                last_accessed_at=datetime.utcnow()
+            )
+            db.add(entry)
+            db.commit()
+            self._evict(db)
+        except Exception as e:
+            # A cache write failure must never fail the generation itself
+            db.rollback()
+            logger.error(f"Error storing generation in cache: {str(e)}", exc_info=True)
+    
+    def _evict(self, db: Session):
+        """Drop expired entries, then the least recently used ones above max_entries"""
+        cutoff = datetime.utcnow() - self.ttl
+        expired = db.query(GenerationCacheEntry).filter(
+            GenerationCacheEntry.created_at < cutoff
+        ).delete(synchronize_session=False)
+        
+        overflow = db.query(GenerationCacheEntry).count() - self.max_entries
+        if overflow > 0:
+            stale_ids = [
+                row.id for row in db.query(GenerationCacheEntry.id)
+                .order_by(GenerationCacheEntry.last_accessed_at.asc())
+                .limit(overflow)
+                .all()
+            ]
+            db.query(GenerationCacheEntry).filter(
+                GenerationCacheEntry.id.in_(stale_ids)
+            ).delete(synchronize_session=False)
+        
+        db.commit()
+        self.evictions += expired + max(overflow, 0)
+        if expired or overflow > 0:
+            logger.info(f"Generation cache evicted {expired} expired and {max(overflow, 0)} LRU entries")
+    
+    def get_stats(self, db: Session) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters and cache size"""
+        total = self.hits + self.misses
+        return {
+            "enabled": settings.generation_cache_enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "entries": db.query(GenerationCacheEntry).count(),
+            "max_entries": self.max_entries
+        }
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Dict, Any, List, Optional
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class GenerationQueueService:
+    """
+    In-process job queue for activity generation. Requests are enqueued and answered
+    with a job ID straight away, a fixed pool of workers runs the generations, and
+    the browser polls the job status until the activity is ready.
+    """
+
+    def __init__(self, activity_service):
+        self.activity_service = activity_service
+        self.worker_count = settings.generation_queue_workers
+        self.max_depth = settings.generation_queue_max_depth
+        self.retention_seconds = settings.generation_job_retention_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._active_by_key: Dict[Any, str] = {}
+        self._wait_times = deque(maxlen=200)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        """Start the worker pool"""
+        if not settings.generation_queue_enabled or self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_depth)
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.worker_count)]
+        logger.info(f"Generation queue started: workers={self.worker_count}, max_depth={self.max_depth}")
+
+    async def stop(self):
+        """Stop the worker pool"""
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        if self._workers:
+            logger.info("Generation queue stopped")
+        self._workers = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def submit(
+        self,
+        user_id: int,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        selected_category: str
+    ) -> Dict[str, Any]:
+        """Enqueue a generation, or return the job already queued for the same selections"""
+        self._prune_finished_jobs()
+
+        key = self.activity_service.selection_key(
+            user_id, selected_duration, selected_materials, selected_objectives, selected_category
+        )
+        existing_id = self._active_by_key.get(key)
+        if existing_id:
+            logger.info(f"Reusing queued generation job {existing_id} for user {user_id}")
+            return {"success": True, "job_id": existing_id}
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "key": key,
+            "params": {
+                "selected_duration": selected_duration,
+                "selected_materials": selected_materials,
+                "selected_objectives": selected_objectives,
+                "selected_category": selected_category
+            },
+            "status": "queued",
+            "enqueued_at": time.monotonic(),
+            "started_at": None,
+            "finished_at": None,
+            "session_id": None,
+            "error": None
+        }
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Generation queue full ({self.max_depth}), rejecting request from user {user_id}")
+            return {
+                "success": False,
+                "error": "Lots of explorers are creating activities right now. Please try again in a minute!"
+            }
+
+        self._jobs[job["id"]] = job
+        self._active_by_key[key] = job["id"]
+        logger.info(f"Queued generation job {job['id']} for user {user_id}, depth={self._queue.qsize()}")
+        return {"success": True, "job_id": job["id"]}
+
+    def get_job_status(self, job_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get a job's public status, or None if it doesn't exist or belongs to another user"""
+        job = self._jobs.get(job_id)
+        if not job or job["user_id"] != user_id:
+            return None
+
+        status = {
+            "job_id": job["id"],
+            "status": job["status"],
+            "session_id": job["session_id"],
+            "error": job["error"]
+        }
+        if job["status"] == "queued":
+            queued = [j for j in self._jobs.values() if j["status"] == "queued"]
+            queued.sort(key=lambda j: j["enqueued_at"])
+            status["position"] = queued.index(job) + 1
+        if job["status"] == "done":
+            status["review_url"] = f"/activities/{job['session_id']}/review"
+        return status
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, worker usage and wait-time metrics"""
+        waits = sorted(self._wait_times)
+        return {
+            "enabled": settings.generation_queue_enabled,
+            "workers": self.worker_count,
+            "max_depth": self.max_depth,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "running_jobs": sum(1 for job in self._jobs.values() if job["status"] == "running"),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_seconds_avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "wait_seconds_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+            "wait_seconds_max": round(waits[-1], 3) if waits else 0.0
+        }
+
+    def _prune_finished_jobs(self):
+        cutoff = time.monotonic() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job["finished_at"] is not None and job["finished_at"] < cutoff:
+                del self._jobs[job_id]
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Generation worker {index} failed on job {job['id']}: {str(e)}", exc_info=True)
+                job["status"] = "failed"
+                job["error"] = "Activity generation failed"
+                job["finished_at"] = time.monotonic()
+                self.failed += 1
+            finally:
+                if self._active_by_key.get(job["key"]) == job["id"]:
+                    del self._active_by_key[job["key"]]
+                self._queue.task_done()
+
+    async def _run_job(self, job: Dict[str, Any]):
+        job["status"] = "running"
+        job["started_at"] = time.monotonic()
+        wait = job["started_at"] - job["enqueued_at"]
+        self._wait_times.append(wait)
+        logger.info(f"Running generation job {job['id']} after waiting {wait:.2f}s")
+
+        result = await self.activity_service.generate_activity(
+            job["user_id"], queue_wait_ms=int(wait * 1000), **job["params"]
+        )
+
+        job["finished_at"] = time.monotonic()
+        if result["success"]:
+            job["status"] = "done"
+            job["session_id"] = result["session_id"]
+            self.completed += 1
+            logger.info(f"Generation job {job['id']} done in {job['finished_at'] - job['started_at']:.2f}s, "
+                        f"session_id: {result['session_id']}")
+        else:
+            job["status"] = "failed"
+            job["error"] = result["error"]
+            self.failed += 1
+            logger.error(f"Generation job {job['id']} failed: {result['error']}")
@@ -0,0 +1,167 @@
+import logging
+from typing import Dict, Any, Optional, Tuple
+from app.config import settings
+from app.services.retry_policy import LatencyTracker
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Extra room above the observed p95 output length before max_tokens cuts a response off
+TOKEN_HEADROOM = 1.25
+# While the primary is over its SLO, every Nth request still goes to it so recovery is noticed
+PRIMARY_PROBE_EVERY = 10
+
+
+class RouteStats:
+    """Latency and token usage for one (category, duration, model) route"""
+
+    def __init__(self, window: int = 200):
+        # min_samples=1 so percentiles are reportable right away; routing checks sample counts itself
+        self.latency = LatencyTracker(window=window, min_samples=1)
+        self.output_tokens = LatencyTracker(window=window, min_samples=1)
+        self.calls = 0
+        self.truncated = 0
+        self.timeouts = 0
+        self.fallbacks = 0
+        self.input_tokens = 0
+        self.total_output_tokens = 0
+
+
+class ModelRouter:
+    """
+    Picks the model and max_tokens for each generation. max_tokens starts from a
+    budget proportional to the selected duration and grows to fit the output lengths
+    actually observed for that category and duration, so short activities don't
+    reserve the full anthropic_max_tokens. When the primary model's observed p95
+    latency is over anthropic_latency_slo_seconds, requests go to the fallback model,
+    apart from an occasional probe that keeps the primary's latency window current.
+    """
+
+    def __init__(self):
+        self.primary_model = settings.anthropic_model
+        self.fallback_model = settings.anthropic_fallback_model
+        self._routes: Dict[Tuple[str, int, str], RouteStats] = {}
+        self._models: Dict[str, LatencyTracker] = {}
+        self._fallback_routed = 0
+
+    def default_route(self) -> Dict[str, Any]:
+        """The unrouted configuration: primary model and the full token ceiling"""
+        return {
+            "category": None,
+            "duration": None,
+            "model": self.primary_model,
+            "max_tokens": settings.anthropic_max_tokens,
+            "reason": "default"
+        }
+
+    def choose(self, category: str, duration: int) -> Dict[str, Any]:
+        """Route for a generation of the given category and duration"""
+        if not settings.anthropic_routing_enabled:
+            return dict(self.default_route(), category=category, duration=duration)
+
+        model, reason = self.primary_model, "primary"
+        if self.fallback_model and self._over_slo(self.primary_model):
+            self._fallback_routed += 1
+            if self._fallback_routed % PRIMARY_PROBE_EVERY:
+                model, reason = self.fallback_model, "slo"
+            else:
+                reason = "probe"
+        return {
+            "category": category,
+            "duration": duration,
+            "model": model,
+            "max_tokens": self._max_tokens(category, duration, model),
+            "reason": reason
+        }
+
+    def fallback(self, route: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The same route on the faster model, or None if there is nothing faster to use"""
+        if not self.fallback_model or route["model"] == self.fallback_model:
+            return None
+        return dict(
+            route,
+            model=self.fallback_model,
+            max_tokens=self._max_tokens(route["category"], route["duration"], self.fallback_model),
+            reason="fallback"
+        )
+
+    def attempt_timeout(self, route: Dict[str, Any], remaining: float) -> float:
+        """
+        Time allowed for one attempt. With a fallback available the primary only gets its
+        SLO, so a slow call times out and the retry moves to the faster model.
+        """
+        if self.fallback(route) is not None:
+            return min(remaining, settings.anthropic_latency_slo_seconds)
+        return remaining
+
+    def record(self, route: Dict[str, Any], seconds: float, usage: Dict[str, int], stop_reason: Optional[str]):
+        """Record a successful call on a route"""
+        model = route["model"]
+        self._models.setdefault(model, LatencyTracker(window=200, min_samples=1)).record(seconds)
+
+        stats = self._routes.setdefault((route["category"] or "", route["duration"] or 0, model), RouteStats())
+        stats.calls += 1
+        stats.latency.record(seconds)
+        stats.output_tokens.record(usage.get("output_tokens", 0))
+        stats.input_tokens += usage.get("input_tokens", 0)
+        stats.total_output_tokens += usage.get("output_tokens", 0)
+        if route["reason"] in ("slo", "fallback"):
+            stats.fallbacks += 1
+        if stop_reason == "max_tokens":
+            stats.truncated += 1
+            logger.warning(f"Response truncated at max_tokens={route['max_tokens']} on route "
+                           f"{route['category']}/{route['duration']} ({model})")
+
+    def record_timeout(self, route: Dict[str, Any], seconds: float):
+        """Record a call that timed out; its elapsed time is a lower bound on the model's latency"""
+        self._models.setdefault(route["model"], LatencyTracker(window=200, min_samples=1)).record(seconds)
+        stats = self._routes.setdefault(
+            (route["category"] or "", route["duration"] or 0, route["model"]), RouteStats()
+        )
+        stats.timeouts += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        routes = []
+        for (category, duration, model), stats in sorted(self._routes.items()):
+            routes.append({
+                "category": category,
+                "duration": duration,
+                "model": model,
+                "calls": stats.calls,
+                "fallbacks": stats.fallbacks,
+                "truncated": stats.truncated,
+                "timeouts": stats.timeouts,
+                "latency_p50": stats.latency.percentile(50),
+                "latency_p95": stats.latency.percentile(95),
+                "output_tokens_p50": stats.output_tokens.percentile(50),
+                "output_tokens_p95": stats.output_tokens.percentile(95),
+                "avg_input_tokens": round(stats.input_tokens / stats.calls, 1) if stats.calls else 0.0,
+                "avg_output_tokens": round(stats.total_output_tokens / stats.calls, 1) if stats.calls else 0.0,
+                "max_tokens": self._max_tokens(category, duration, model) if category else None
+            })
+        return {
+            "enabled": settings.anthropic_routing_enabled,
+            "primary_model": self.primary_model,
+            "fallback_model": self.fallback_model or None,
+            "latency_slo_seconds": settings.anthropic_latency_slo_seconds,
+            "primary_over_slo": self._over_slo(self.primary_model),
+            "models": {
+                model: {"calls": len(tracker.samples), "latency_p95": tracker.percentile(95)}
+                for model, tracker in self._models.items()
+            },
+            "routes": routes
+        }
+
+    def _over_slo(self, model: str) -> bool:
+        tracker = self._models.get(model)
+        if tracker is None or len(tracker.samples) < settings.anthropic_routing_min_samples:
+            return False
+        return tracker.percentile(95) >= settings.anthropic_latency_slo_seconds
+
+    def _max_tokens(self, category: str, duration: int, model: str) -> int:
+        """Duration-based budget, raised to fit observed output lengths, capped at anthropic_max_tokens"""
+        budget = settings.anthropic_tokens_base + settings.anthropic_tokens_per_minute * (duration or 0)
+        stats = self._routes.get((category, duration, model))
+        if stats is not None and len(stats.output_tokens.samples) >= settings.anthropic_routing_min_samples:
+            budget = max(budget, int(stats.output_tokens.percentile(95) * TOKEN_HEADROOM))
+        return min(budget, settings.anthropic_max_tokens)
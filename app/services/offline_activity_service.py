@@ -0,0 +1,150 @@
+import json
+import logging
+import random
+import time
+from typing import Dict, Any, List, Optional
+from app.config import settings
+from app.services.structured_activity import format_step
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Steps other than the opening, test and closing ones
+MAX_MATERIAL_STEPS = 5
+
+
+class OfflineActivityService:
+    """
+    Assembles activities locally from app/category_materials.json and the curated
+    step templates in app/activity_step_templates.json, in a millisecond or two and
+    without calling Anthropic. Used when the API is failing or a request is over
+    budget, and for instant mode.
+
+    Activities have the same fields as _parse_generated_activity, and raw_content is
+    laid out the same way (title, description, numbered steps) so it parses back
+    to the same activity.
+    """
+
+    def __init__(self):
+        self.category_materials_path = "app/category_materials.json"
+        self.step_templates_path = "app/activity_step_templates.json"
+        self.category_materials = self._load_json(self.category_materials_path) or {}
+        self.library = self._load_json(self.step_templates_path) or {"version": 0, "categories": {}}
+        self.generated = 0
+
+    @property
+    def template_id(self) -> str:
+        """Recorded as the session's prompt_template_id so offline activities are identifiable"""
+        return f"offline@{self.library.get('version', 0)}"
+
+    def available(self, selected_category: str) -> bool:
+        return settings.offline_generator_enabled and selected_category in self.library["categories"]
+
+    def generate(
+        self,
+        selected_category: str,
+        selected_duration: int,
+        selected_materials: List[str],
+        selected_objectives: List[str],
+        seed: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Build an activity from the child's selections, or None if the category has no templates"""
+        templates = self.library["categories"].get(selected_category)
+        if templates is None:
+            return None
+
+        start = time.perf_counter()
+        rng = random.Random(seed)
+        theme = rng.choice(templates["themes"])
+        words = {"theme": theme, "theme_lower": theme.lower(), "materials": self._join(selected_materials)}
+
+        steps = [rng.choice(templates["opening"]).format(**words)]
+        for material in self._ordered_materials(selected_category, selected_materials)[:MAX_MATERIAL_STEPS]:
+            template = templates["material_steps"].get(material, templates["generic_step"])
+            steps.append(template.format(material=self._display(material), **words))
+        steps.append(templates["test_step"].format(**words))
+        steps.append(rng.choice(templates["closing"]).format(**words))
+
+        encouragements = [
+            self.library["objective_encouragement"][objective]
+            for objective in selected_objectives if objective in self.library["objective_encouragement"]
+        ]
+        minutes = self._step_minutes(selected_duration, len(steps))
+        steps = [
+            format_step({
+                "instruction": instruction,
+                "minutes": minutes[i] if minutes else None,
+                "encouragement": encouragements[i % len(encouragements)] if encouragements and i % 2 else ""
+            })
+            for i, instruction in enumerate(steps)
+        ]
+
+        title = rng.choice(templates["titles"]).format(**words)
+        description = rng.choice(templates["descriptions"]).format(**words)
+        activity = {
+            "title": title,
+            "description": description,
+            "steps": steps,
+            "materials_used": [self._display(material) for material in selected_materials],
+            "safety_notes": self._safety_notes(selected_materials),
+            "estimated_time": f"{selected_duration} minutes",
+            "bonus_challenge": rng.choice(templates["bonus"]).format(**words),
+            "closing_message": rng.choice(self.library["closing_messages"]),
+            "output_format": "offline",
+            "raw_content": "\n".join([title, "", description, ""] + [f"{i}. {step}" for i, step in enumerate(steps, 1)])
+        }
+        self.generated += 1
+        logger.info(f"Assembled offline {selected_category} activity '{title}' in "
+                    f"{(time.perf_counter() - start) * 1000:.2f}ms")
+        return activity
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.offline_generator_enabled,
+            "template_id": self.template_id,
+            "categories": sorted(self.library["categories"]),
+            "generated": self.generated
+        }
+
+    def _ordered_materials(self, selected_category: str, selected_materials: List[str]) -> List[str]:
+        """Selected materials, those typical for the category first"""
+        typical = set(self.category_materials.get(selected_category, []))
+        return sorted(selected_materials, key=lambda material: material not in typical)
+
+    def _step_minutes(self, selected_duration: int, step_count: int) -> Optional[List[int]]:
+        """Whole minutes per step adding up to the duration, or None if it is too short to split"""
+        if selected_duration < step_count:
+            return None
+        minutes = [selected_duration // step_count] * step_count
+        # The middle, hands-on steps get the leftover minutes
+        for i in range(selected_duration % step_count):
+            minutes[1 + i % max(1, step_count - 2)] += 1
+        return minutes
+
+    def _safety_notes(self, selected_materials: List[str]) -> List[str]:
+        notes = []
+        for material in selected_materials:
+            note = self.library["safety_notes"].get(material)
+            if note and note not in notes:
+                notes.append(note)
+        return notes or [self.library["default_safety"]]
+
+    def _join(self, selected_materials: List[str]) -> str:
+        names = [self._display(material) for material in selected_materials]
+        if len(names) <= 1:
+            return "".join(names)
+        return f"{', '.join(names[:-1])} and {names[-1]}"
+
+    def _display(self, material: str) -> str:
+        return material.replace("_", " ")
+
+    def _load_json(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            logger.error(f"Offline activity data file not found: {path}")
+            return None
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parsing offline activity data {path}: {e}")
+            return None
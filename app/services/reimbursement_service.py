@@ -3,11 +3,11 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from app.models.reimbursement import ReimbursementHistory, WeeklyReimbursementStatus, PointDeduction
 from app.models.user import User
-from app.models.daily_stats import DailyStats
 from app.services.scoring_service import ScoringService
+from app.services.balance_service import BalanceService
+from app.services.banner_stats_service import BannerStatsService
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +16,7 @@ class ReimbursementService:
     def __init__(self):
         self.json_file_path = "app/reimbursement_items.json"
         self.scoring_service = ScoringService()
+        self.balance_service = BalanceService()
     
     def _load_reimbursement_items(self) -> List[Dict[str, Any]]:
         """Load reimbursement items from JSON file"""
@@ -43,25 +44,8 @@ class ReimbursementService:
         return None
     
     def get_user_total_points(self, db: Session, user_id: int) -> int:
-        """Get total points earned by user (after reimbursements)"""
-        # Get total points from daily stats
-        total_points = db.query(func.coalesce(func.sum(DailyStats.total_points), 0)).filter(
-            DailyStats.user_id == user_id
-        ).scalar()
-        
-        # Get total deductions from reimbursements
-        total_deductions = db.query(func.coalesce(func.sum(PointDeduction.points_deducted), 0)).filter(
-            PointDeduction.user_id == user_id
-        ).scalar()
-        
-        # Calculate final total
-        final_points = total_points - total_deductions
-        
-        # Ensure points don't go negative
-        if final_points < 0:
-            final_points = 0
-            
-        return int(final_points)
+        """Get total points earned by user (after reimbursements, never negative)"""
+        return self.balance_service.get(db, user_id).balance
     
     def can_user_reimburse_this_week(self, db: Session, user_id: int) -> bool:
         """Check if user can reimburse this week (Friday reset)"""
@@ -170,8 +154,10 @@ class ReimbursementService:
                 reimbursement_id=history.id
             )
             db.add(point_deduction)
+            self.balance_service.debit(db, user_id, item["points_cost"])
             
             db.commit()
+            BannerStatsService.invalidate(user_id)
             
             logger.info(f"Reimbursement processed: user_id={user_id}, item={item['name']}, points={item['points_cost']}")
             
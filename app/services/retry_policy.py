@@ -0,0 +1,94 @@
+import logging
+import random
+import time
+from collections import deque
+from typing import Optional
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by a maximum delay"""
+
+    def __init__(self):
+        self.base_delay = settings.anthropic_retry_base_delay_seconds
+        self.max_delay = settings.anthropic_retry_max_delay_seconds
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (1 for the first retry)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class LatencyTracker:
+    """Keeps a window of recent successful call latencies to derive a hedging threshold"""
+
+    def __init__(self, window: int = 100, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Observed latency percentile, or None until enough samples are collected"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    Fails fast once upstream looks down. After `failure_threshold` consecutive
+    failures the circuit opens for `reset_seconds`; then a single trial call is
+    allowed through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self):
+        self.failure_threshold = settings.anthropic_circuit_failure_threshold
+        self.reset_seconds = settings.anthropic_circuit_reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        """Whether a call may go upstream right now"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_progress:
+            self._trial_in_progress = True
+            logger.info("Circuit half-open, allowing a trial request")
+            return True
+        return False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("Circuit closed after successful trial request")
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_progress = False
+
+    def cancel_trial(self):
+        """Release a half-open trial that ended without a verdict (e.g. cancelled)"""
+        self._trial_in_progress = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._trial_in_progress or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_progress:
+                logger.warning(f"Circuit opened after {self.consecutive_failures} consecutive failures")
+            self.opened_at = time.monotonic()
+        self._trial_in_progress = False
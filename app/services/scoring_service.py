@@ -4,7 +4,8 @@ from app.models.scoring import ActivityScore
 from app.models.activity import ActivitySession
 from app.models.daily_stats import DailyStats
 from app.models.parent import Parent
-from app.config import settings
+from app.services.balance_service import BalanceService
+from app.services.banner_stats_service import BannerStatsService
 from datetime import datetime, date
 import bcrypt
 from sqlalchemy import func
@@ -12,7 +13,8 @@ from sqlalchemy import func
 
 class ScoringService:
     def __init__(self):
-        pass
+        self.balance_service = BalanceService()
+        self.banner_stats = BannerStatsService()
     
     def verify_parent_password(self, db: Session, parent_id: int, password: str) -> bool:
         """Verify parent password"""
@@ -57,8 +59,10 @@ class ScoringService:
         
         # Update daily stats
         self._update_daily_stats(db, session.user_id, score, session.actual_duration or 0)
+        self.balance_service.credit(db, session.user_id, score)
         
         db.commit()
+        BannerStatsService.invalidate(session.user_id)
         
         return {
             "success": True,
@@ -154,16 +158,8 @@ class ScoringService:
     
     def can_start_new_activity(self, db: Session, user_id: int) -> bool:
         """Check if user can start a new activity today and has no unscored session"""
-        # Check daily limit
-        today_stats = self.get_daily_stats(db, user_id)
-        if today_stats["activities_completed"] >= settings.max_activities_per_day:
-            return False
-        # Check for any unscored session
-        unscored = db.query(ActivitySession).filter(
-            ActivitySession.user_id == user_id,
-            ActivitySession.status.in_(["active", "completed"])
-        ).first()
-        return unscored is None
+        # Daily limit and unscored session come with the banner stats, in the same query
+        return self.banner_stats.get(db, user_id)["can_start_new"]
     
     def recalculate_daily_stats(self, db: Session, user_id: int, target_date: date = None):
         """Recalculate daily statistics for a user based on actual scored activities"""
@@ -208,7 +204,11 @@ class ScoringService:
             )
             db.add(stats)
         
+        # Points earned are the sum of daily stats, so the balance follows the recalculation
+        self.balance_service.rebuild(db, user_id)
+        
         db.commit()
+        BannerStatsService.invalidate(user_id)
         return {
             "activities_completed": activities_count,
             "total_points": total_points,
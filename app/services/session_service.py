@@ -1,5 +1,7 @@
 from typing import Dict, Any, Optional
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
 from app.models.activity import ActivitySession
 from app.models.user import User
 from datetime import datetime, timedelta
@@ -17,6 +19,13 @@ class SessionService:
             ActivitySession.status.in_(["active", "completed"])
         ).order_by(ActivitySession.created_at.desc()).first()
     
+    async def get_active_session_async(self, db: AsyncSession, user_id: int) -> Optional[ActivitySession]:
+        """get_active_session on an async session"""
+        return (await db.execute(select(ActivitySession).filter(
+            ActivitySession.user_id == user_id,
+            ActivitySession.status.in_(["active", "completed"])
+        ).order_by(ActivitySession.created_at.desc()).limit(1))).scalars().first()
+    
     def create_session_data(self, session: ActivitySession) -> Dict[str, Any]:
         """Create session data for frontend storage"""
         return {
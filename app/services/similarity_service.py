@@ -0,0 +1,195 @@
+import hashlib
+import logging
+import re
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from app.models.activity import ActivitySession
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+NUM_BINS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_BINS // BANDS
+SHINGLE_SIZE = 3
+# Bin values are below 2**58; densified bins add multiples of this so they can't collide with real ones
+DENSIFY_OFFSET = 1 << 58
+
+Signature = Tuple[int, ...]
+
+
+class UserSimilarityIndex:
+    """MinHash signatures of one child's activities, bucketed by LSH band for fast lookups"""
+
+    def __init__(self):
+        self.signatures: Dict[int, Signature] = {}
+        self.titles: Dict[str, int] = {}
+        self.buckets: Dict[Tuple[int, Signature], Set[int]] = {}
+
+    def add(self, session_id: int, title: str, signature: Signature):
+        self.signatures[session_id] = signature
+        if title:
+            self.titles[title] = session_id
+        for band in range(BANDS):
+            key = (band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+            self.buckets.setdefault(key, set()).add(session_id)
+
+    def candidates(self, signature: Signature) -> Set[int]:
+        """Sessions sharing at least one band with the signature"""
+        found = set()
+        for band in range(BANDS):
+            key = (band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+            found.update(self.buckets.get(key, ()))
+        return found
+
+
+class SimilarityService:
+    """
+    Near-duplicate detection over a child's whole activity history. Each activity's
+    title, description and steps are shingled into overlapping word triples and
+    reduced to a MinHash signature; LSH banding finds candidates without comparing
+    against every past activity, and the fraction of matching signature slots
+    estimates the Jaccard similarity of the two activities.
+
+    Signatures use one-permutation hashing (each shingle is hashed once into one of
+    NUM_BINS bins, keeping the minimum per bin) with rotation densification for
+    empty bins, which costs one hash per shingle instead of one per permutation.
+    """
+
+    # Shared by every instance so an admin delete can invalidate the same indexes generation uses
+    _indexes: Dict[int, UserSimilarityIndex] = {}
+
+    def __init__(self):
+        self.threshold = settings.activity_similarity_threshold
+        self.checks = 0
+        self.duplicates = 0
+
+    def signature(self, activity: Dict[str, Any]) -> Signature:
+        """MinHash signature of an activity's text"""
+        bins: List[Optional[int]] = [None] * NUM_BINS
+        for shingle in self._shingles(activity) or {""}:
+            # blake2b rather than hash() so signatures are identical across restarts and processes
+            h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            slot, value = h % NUM_BINS, h // NUM_BINS
+            current = bins[slot]
+            if current is None or value < current:
+                bins[slot] = value
+
+        if None not in bins:
+            return tuple(bins)
+        # Short texts leave bins empty; borrow from the next filled bin to the right
+        signature = []
+        for slot in range(NUM_BINS):
+            distance = 0
+            while bins[(slot + distance) % NUM_BINS] is None:
+                distance += 1
+            signature.append(bins[(slot + distance) % NUM_BINS] + distance * DENSIFY_OFFSET)
+        return tuple(signature)
+
+    def find_similar(self, db: Session, user_id: int, activity: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        The child's past activity most similar to this one, if it is at or above the
+        similarity threshold, as {"session_id", "score"}; otherwise None
+        """
+        if not settings.activity_similarity_enabled:
+            return None
+        return self.find_similar_in(self._index_for(db, user_id), user_id, activity)
+
+    def load_index(self, db: Session, user_id: int) -> Optional[UserSimilarityIndex]:
+        """
+        The child's index, loaded from the database if it isn't already, for checks
+        made with find_similar_in away from a database session; None when disabled
+        """
+        if not settings.activity_similarity_enabled:
+            return None
+        return self._index_for(db, user_id)
+
+    def find_similar_in(
+        self,
+        index: Optional[UserSimilarityIndex],
+        user_id: int,
+        activity: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """find_similar against an index from load_index"""
+        if index is None:
+            return None
+
+        start = time.perf_counter()
+        self.checks += 1
+
+        title = self._normalize_title(activity.get("title", ""))
+        if title in index.titles:
+            self.duplicates += 1
+            return {"session_id": index.titles[title], "score": 1.0}
+
+        signature = self.signature(activity)
+        best_id, best_score = None, 0.0
+        for session_id in index.candidates(signature):
+            other = index.signatures[session_id]
+            score = sum(1 for x, y in zip(signature, other) if x == y) / NUM_BINS
+            if score > best_score:
+                best_id, best_score = session_id, score
+
+        logger.info(f"Similarity check for user {user_id} over {len(index.signatures)} activities "
+                    f"took {(time.perf_counter() - start) * 1000:.2f}ms, best score {best_score:.2f}")
+        if best_id is not None and best_score >= self.threshold:
+            self.duplicates += 1
+            return {"session_id": best_id, "score": round(best_score, 3)}
+        return None
+
+    def add(self, user_id: int, session_id: int, activity: Dict[str, Any]):
+        """Index a newly stored activity; users whose index isn't loaded pick it up on first use"""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            index.add(session_id, self._normalize_title(activity.get("title", "")), self.signature(activity))
+
+    @classmethod
+    def forget_user(cls, user_id: int):
+        """Drop a child's index so it is rebuilt from the database, e.g. after activities are deleted"""
+        cls._indexes.pop(user_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.activity_similarity_enabled,
+            "threshold": self.threshold,
+            "indexed_users": len(self._indexes),
+            "indexed_activities": sum(len(index.signatures) for index in self._indexes.values()),
+            "checks": self.checks,
+            "duplicates": self.duplicates
+        }
+
+    def _index_for(self, db: Session, user_id: int) -> UserSimilarityIndex:
+        """Load the child's full history into an index the first time it is needed"""
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+
+        start = time.perf_counter()
+        index = UserSimilarityIndex()
+        rows = db.query(ActivitySession.id, ActivitySession.generated_activity)\
+            .filter(ActivitySession.user_id == user_id)\
+            .all()
+        for session_id, activity in rows:
+            activity = activity or {}
+            index.add(session_id, self._normalize_title(activity.get("title", "")), self.signature(activity))
+        self._indexes[user_id] = index
+        logger.info(f"Built similarity index for user {user_id}: {len(rows)} activities in "
+                    f"{(time.perf_counter() - start) * 1000:.1f}ms")
+        return index
+
+    def _shingles(self, activity: Dict[str, Any]) -> Set[str]:
+        text = " ".join([
+            activity.get("title", ""),
+            activity.get("description", ""),
+            " ".join(activity.get("steps", []))
+        ]).lower()
+        words = WORD_PATTERN.findall(text)
+        if len(words) < SHINGLE_SIZE:
+            return {" ".join(words)} if words else set()
+        return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+    def _normalize_title(self, title: str) -> str:
+        return (title or "").strip().lower()
@@ -0,0 +1,161 @@
+from collections import deque
+from typing import Dict, Any, List, Optional
+from pydantic import BaseModel, Field
+from app.config import settings
+
+# Tool the model is forced to call, so the activity comes back as JSON matching this schema
+ACTIVITY_TOOL = {
+    "name": "record_activity",
+    "description": "Record the finished activity for the child. Fill in every field following the output and safety requirements.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "title": {
+                "type": "string",
+                "description": "Exciting theme-appropriate title"
+            },
+            "description": {
+                "type": "string",
+                "description": "Fun encouraging description of what the child will create and why it is awesome"
+            },
+            "materials": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Materials needed, with kid-friendly names and quantities"
+            },
+            "steps": {
+                "type": "array",
+                "description": "Clear steps in simple friendly language, in order",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "instruction": {"type": "string"},
+                        "minutes": {"type": "integer", "description": "Suggested time for this step"},
+                        "encouragement": {"type": "string"}
+                    },
+                    "required": ["instruction", "minutes"]
+                }
+            },
+            "safety_notes": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Safety reminders for an 8-year-old working with these materials"
+            },
+            "bonus_challenge": {
+                "type": "string",
+                "description": "Bonus challenge or creative twist for kids who finish early"
+            },
+            "closing_message": {
+                "type": "string",
+                "description": "Short motivational message"
+            }
+        },
+        "required": ["title", "description", "materials", "steps", "safety_notes"]
+    }
+}
+
+
+class ActivityStep(BaseModel):
+    instruction: str = Field(min_length=1)
+    minutes: Optional[int] = Field(default=None, ge=0)
+    encouragement: str = ""
+
+
+class StructuredActivity(BaseModel):
+    """An activity as returned through ACTIVITY_TOOL"""
+    title: str = Field(min_length=1)
+    description: str = ""
+    materials: List[str] = []
+    steps: List[ActivityStep] = Field(min_length=1)
+    safety_notes: List[str] = []
+    bonus_challenge: str = ""
+    closing_message: str = ""
+
+    def to_activity(self, raw_content: str) -> Dict[str, Any]:
+        """Convert to the generated_activity dict stored on ActivitySession"""
+        minutes = [step.minutes for step in self.steps if step.minutes is not None]
+        return {
+            "title": self.title.strip(),
+            "description": self.description.strip(),
+            "steps": [format_step(step.model_dump()) for step in self.steps],
+            "materials_used": [material.strip() for material in self.materials if material.strip()],
+            "safety_notes": [note.strip() for note in self.safety_notes if note.strip()],
+            "estimated_time": f"{sum(minutes)} minutes" if minutes else "",
+            "bonus_challenge": self.bonus_challenge.strip(),
+            "closing_message": self.closing_message.strip(),
+            "output_format": "structured",
+            "raw_content": raw_content
+        }
+
+
+def activity_tool() -> Optional[Dict[str, Any]]:
+    """The tool to request structured output with, or None when structured output is off"""
+    return ACTIVITY_TOOL if settings.activity_structured_output_enabled else None
+
+
+def format_step(step: Any) -> str:
+    """
+    Render a step as text in the "instruction (N minutes) encouragement" layout the
+    templates already display. Tolerates partial or malformed steps.
+    """
+    if not isinstance(step, dict):
+        return str(step).strip()
+    text = str(step.get("instruction") or "").strip()
+    if step.get("minutes") is not None:
+        text = f"{text} ({step['minutes']} minutes)"
+    encouragement = str(step.get("encouragement") or "").strip()
+    if encouragement:
+        text = f"{text} {encouragement}"
+    return text
+
+
+def structured_to_text(data: Dict[str, Any]) -> str:
+    """Lay out tool input that failed validation as plain activity text for the free-text parser"""
+    lines = [str(data.get("title") or "").strip(), "", str(data.get("description") or "").strip(), ""]
+    steps = data.get("steps") if isinstance(data.get("steps"), list) else []
+    for i, step in enumerate(steps, 1):
+        lines.append(f"{i}. {format_step(step)}")
+    return "\n".join(lines)
+
+
+class ParseStats:
+    """Counts how generated activities were parsed and how long parsing took"""
+
+    def __init__(self, window: int = 500):
+        self.structured = 0
+        self.text = 0
+        self.failures = 0
+        self._latencies = deque(maxlen=window)
+
+    def record(self, output_format: str, seconds: float, failed: bool = False):
+        """Record one parse; failed marks structured output that fell back to text parsing"""
+        if output_format == "structured":
+            self.structured += 1
+        else:
+            self.text += 1
+        if failed:
+            self.failures += 1
+        self._latencies.append(seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.structured + self.text
+        # Structured responses that failed validation were parsed as text instead
+        attempts = self.structured + self.failures
+        ordered = sorted(self._latencies)
+
+        def percentile(pct: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 3)
+
+        return {
+            "structured_output_enabled": settings.activity_structured_output_enabled,
+            "parsed": total,
+            "structured": self.structured,
+            "text": self.text,
+            "structured_failures": self.failures,
+            "failure_rate": round(self.failures / attempts, 4) if attempts else 0.0,
+            "parse_ms_p50": percentile(50),
+            "parse_ms_p95": percentile(95),
+            "parse_ms_max": round(ordered[-1] * 1000, 3) if ordered else 0.0
+        }
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Optional, Set
+from sqlalchemy import case, func, literal, or_
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, AsyncSessionLocal
+from app.models.generation_telemetry import GenerationTelemetry
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# USD per million input and output tokens; prompt-cache writes cost 1.25x input and reads 0.1x
+MODEL_PRICES = {
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+    "claude-3-opus-20240229": (15.00, 75.00)
+}
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.1
+
+TOKEN_COLUMNS = ["input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"]
+PERCENTILE_METRICS = ["latency_ms", "ttft_ms", "queue_wait_ms"]
+PERCENTILES = [50, 95, 99]
+PERCENTILE_NAMES = ["p50", "p95", "p99"]
+# Report counter for each outcome
+OUTCOME_COUNTS = {"success": "succeeded", "failed": "failed", "fallback": "fallbacks"}
+
+
+class TelemetryService:
+    """
+    One generation_telemetry row per activity generation: where it was served from,
+    queue wait, upstream latency and time to first token, retry attempts, token usage
+    and outcome. Reports aggregate the rows into latency percentiles and token cost.
+    
+    Rows are written in the background on the async engine, so recording never
+    blocks the event loop in the middle of a generation.
+    """
+
+    # In-flight writes, shared by every instance so shutdown can wait for them
+    _pending: Set[asyncio.Task] = set()
+
+    def record(
+        self,
+        source: str,
+        outcome: str,
+        user_id: Optional[int] = None,
+        category: Optional[str] = None,
+        duration: Optional[int] = None,
+        model: Optional[str] = None,
+        queue_wait_ms: Optional[int] = None,
+        latency_ms: Optional[int] = None,
+        ttft_ms: Optional[int] = None,
+        attempts: int = 0,
+        usage: Optional[Dict[str, int]] = None
+    ):
+        """Queue one telemetry row for writing; failures are logged and never affect the generation"""
+        usage = usage or {}
+        row = GenerationTelemetry(
+            user_id=user_id,
+            category=category,
+            duration=duration,
+            source=source,
+            model=model,
+            outcome=outcome,
+            queue_wait_ms=queue_wait_ms,
+            latency_ms=latency_ms,
+            ttft_ms=ttft_ms,
+            attempts=attempts,
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+            cache_read_input_tokens=usage.get("cache_read_input_tokens", 0),
+            cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0)
+        )
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_sync(row)
+            return
+        task = loop.create_task(self._write(row))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    @classmethod
+    async def flush(cls):
+        """Wait for background writes still in flight"""
+        if cls._pending:
+            await asyncio.gather(*cls._pending, return_exceptions=True)
+
+    async def _write(self, row: GenerationTelemetry):
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add(row)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Failed to record generation telemetry: {str(e)}")
+
+    def _write_sync(self, row: GenerationTelemetry):
+        db = SessionLocal()
+        try:
+            db.add(row)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to record generation telemetry: {str(e)}")
+        finally:
+            db.close()
+
+    def report(self, db: Session, days: int = 7) -> Dict[str, Any]:
+        """
+        Latency percentiles, outcomes and token cost over the last `days` days (at most
+        telemetry_report_max_days), overall and per day, category and model. Aggregated
+        in SQL, so the report costs a few grouped queries however many rows there are.
+        """
+        days = max(1, min(days, settings.telemetry_report_max_days))
+        since = datetime.utcnow() - timedelta(days=days)
+        groupings = {
+            "overall": literal("all"),
+            "by_day": func.date(GenerationTelemetry.created_at),
+            "by_category": func.coalesce(GenerationTelemetry.category, "none"),
+            "by_model": func.coalesce(GenerationTelemetry.model, GenerationTelemetry.source)
+        }
+
+        report: Dict[str, Any] = {"days": days}
+        for name, key in groupings.items():
+            summaries = self._summarize(db, key, since)
+            if name == "overall":
+                report[name] = summaries.get("all") or self._empty_summary()
+            else:
+                report[name] = dict(sorted(summaries.items(), reverse=name == "by_day"))
+        return report
+
+    def _summarize(self, db: Session, key: Any, since: datetime) -> Dict[str, Dict[str, Any]]:
+        """One summary per value of the grouping key"""
+        t = GenerationTelemetry
+        group_key = key.label("group_key")
+        # Per model as well, since cost is priced per model; per source and outcome for their counts
+        rows = db.query(
+            group_key, t.model, t.source, t.outcome,
+            func.count(t.id).label("generations"),
+            func.sum(case((t.attempts > 1, t.attempts - 1), else_=0)).label("retries"),
+            *[func.coalesce(func.sum(getattr(t, column)), 0).label(column) for column in TOKEN_COLUMNS]
+        ).filter(t.created_at >= since).group_by(group_key, t.model, t.source, t.outcome).all()
+
+        summaries: Dict[str, Dict[str, Any]] = defaultdict(self._empty_summary)
+        for row in rows:
+            summary = summaries[self._group_label(row.group_key)]
+            summary["generations"] += row.generations
+            if row.outcome in OUTCOME_COUNTS:
+                summary[OUTCOME_COUNTS[row.outcome]] += row.generations
+            summary["sources"][row.source] = summary["sources"].get(row.source, 0) + row.generations
+            summary["retries"] += row.retries or 0
+            for column in TOKEN_COLUMNS:
+                summary[column] += getattr(row, column)
+            # Rows for models without a known price are left out of the cost
+            summary["cost_usd"] += self._cost(row) or 0
+
+        for metric in PERCENTILE_METRICS:
+            for group, percentiles in self._percentiles(db, key, getattr(t, metric), since).items():
+                summaries[group][metric] = percentiles
+        for summary in summaries.values():
+            summary["cost_usd"] = round(summary["cost_usd"], 4)
+        return dict(summaries)
+
+    def _percentiles(self, db: Session, key: Any, metric: Any, since: datetime) -> Dict[str, Dict[str, Optional[int]]]:
+        """
+        p50/p95/p99 of a metric per group: the values are ranked within each group by a window
+        function and only the rows at the percentile ranks come back
+        """
+        ranked = db.query(
+            key.label("group_key"),
+            metric.label("value"),
+            func.row_number().over(partition_by=key, order_by=metric).label("position"),
+            func.count().over(partition_by=key).label("size")
+        ).filter(GenerationTelemetry.created_at >= since, metric.isnot(None)).subquery()
+        # The percentile's 1-based position in a group of `size` values: size * pct / 100, rounded down, plus one
+        positions = [ranked.c.size * pct // 100 + 1 for pct in PERCENTILES]
+        rows = db.query(ranked.c.group_key, ranked.c.position, ranked.c.size, ranked.c.value)\
+            .filter(or_(*[ranked.c.position == position for position in positions])).all()
+
+        result: Dict[str, Dict[str, Optional[int]]] = {}
+        for row in rows:
+            percentiles = result.setdefault(self._group_label(row.group_key), dict.fromkeys(PERCENTILE_NAMES))
+            for pct, name in zip(PERCENTILES, PERCENTILE_NAMES):
+                if row.position == row.size * pct // 100 + 1:
+                    percentiles[name] = row.value
+        return result
+
+    def _group_label(self, value: Any) -> str:
+        # func.date() gives a string on SQLite and a date elsewhere
+        return value.isoformat() if isinstance(value, date) else str(value)
+
+    def _empty_summary(self) -> Dict[str, Any]:
+        summary = {
+            "generations": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "fallbacks": 0,
+            "sources": {},
+            "retries": 0,
+            "cost_usd": 0.0
+        }
+        summary.update({metric: dict.fromkeys(PERCENTILE_NAMES) for metric in PERCENTILE_METRICS})
+        summary.update({column: 0 for column in TOKEN_COLUMNS})
+        return summary
+
+    def _cost(self, row: Any) -> Optional[float]:
+        prices = MODEL_PRICES.get(row.model)
+        if prices is None:
+            return None
+        input_price, output_price = prices
+        return ((row.input_tokens or 0) * input_price
+                + (row.cache_creation_input_tokens or 0) * input_price * CACHE_WRITE_MULTIPLIER
+                + (row.cache_read_input_tokens or 0) * input_price * CACHE_READ_MULTIPLIER
+                + (row.output_tokens or 0) * output_price) / 1_000_000
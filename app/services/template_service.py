@@ -1,26 +1,26 @@
 import configparser
-from typing import Dict, Any, List
+import hashlib
+import logging
+import re
+from string import Formatter
+from typing import Dict, Any, List, Optional
 from pathlib import Path
 
+# Set up logging
+logger = logging.getLogger(__name__)
 
-class TemplateService:
-    def __init__(self):
-        self.template_path = Path("templates/activity_prompt.ini")
-        self._load_template()
-    
-    def _load_template(self):
-        """Load the activity prompt template"""
-        if not self.template_path.exists():
-            self._create_default_template()
-        
-        self.config = configparser.ConfigParser(interpolation=None)
-        self.config.read(self.template_path)
-    
-    def _create_default_template(self):
-        """Create the default activity prompt template"""
-        self.template_path.parent.mkdir(exist_ok=True)
-        
-        template_content = """[base_prompt]
+# Placeholders the activity prompt template may use
+TEMPLATE_VARIABLES = {
+    "selected_duration",
+    "selected_materials",
+    "selected_objectives",
+    "selected_category",
+    "min_materials_count",
+    "recent_activities_summary"
+}
+
+# Written to templates/activity_prompt.ini when the file is missing
+DEFAULT_TEMPLATE = """[base_prompt]
 system_role = You are an expert children's activity coordinator at a space-themed summer academy
 target_audience = 8-year-old children with developing fine motor skills and creativity
 confidence_level = You must have 95 percent confidence this activity is safe and appropriate
@@ -47,59 +47,211 @@ completion_confidence = Child should feel proud and accomplished when finished
 avoid_repetition = Do NOT create activities similar to these recent activities: {recent_activities_summary}
 ensure_variety = Make this activity distinctly different in approach, final product, and techniques used
 """
-        
-        with open(self.template_path, 'w') as f:
-            f.write(template_content)
+
+# Layout of prompts rendered before the system prefix was split out: every section in
+# one prompt, with ACTIVITY REQUIREMENTS ahead of OUTPUT FORMAT and SAFETY AND QUALITY.
+# Sessions rebuilt from it carry a template id ending in "/legacy".
+LEGACY_LAYOUT = "legacy"
+
+
+class TemplateService:
+    """
+    Compiles templates/activity_prompt.ini into a render plan: the static system
+    prompt is built once and the per-request sections are joined into a single
+    format string, so populating a prompt is one str.format_map call. The file's
+    mtime is checked on every render and edits are picked up without a restart.
+    """
     
-    def populate_template(self, variables: Dict[str, Any]) -> str:
-        """
-        Populate the template with the given variables
-        """
-        prompt_parts = []
-        
-        # Add base prompt section
-        prompt_parts.append(f"System Role: {self.config['base_prompt']['system_role']}")
-        prompt_parts.append(f"Target Audience: {self.config['base_prompt']['target_audience']}")
-        prompt_parts.append(f"Confidence Level: {self.config['base_prompt']['confidence_level']}")
-        prompt_parts.append("")
+    def __init__(self):
+        self.template_path = Path("templates/activity_prompt.ini")
+        self._mtime_ns: Optional[int] = None
+        self._load_template()
+    
+    @property
+    def template_id(self) -> str:
+        """Versioned identifier stored on each ActivitySession"""
+        return f"{self.template_path.stem}@{self.template_version}"
+    
+    def _load_template(self):
+        """Load and compile the activity prompt template"""
+        if not self.template_path.exists():
+            self._create_default_template()
         
-        # Add activity framework
-        create_instruction = self.config['activity_framework']['create_instruction'].format(**variables)
-        materials_instruction = self.config['activity_framework']['materials_instruction'].format(**variables)
-        learning_focus = self.config['activity_framework']['learning_focus'].format(**variables)
-        theme_integration = self.config['activity_framework']['theme_integration']
+        raw = self.template_path.read_bytes()
+        config = configparser.ConfigParser(interpolation=None)
+        config.read_string(raw.decode("utf-8"))
+        system_prompt, user_template = self._compile(config)
         
-        prompt_parts.append("ACTIVITY REQUIREMENTS:")
-        prompt_parts.append(f"- {create_instruction}")
-        prompt_parts.append(f"- {materials_instruction}")
-        prompt_parts.append(f"- {learning_focus}")
-        prompt_parts.append(f"- {theme_integration}")
-        prompt_parts.append("")
+        self.config = config
+        self.source = raw.decode("utf-8")
+        self.template_version = hashlib.sha256(raw).hexdigest()[:12]
+        self._system_prompt = system_prompt
+        self._user_template = user_template
+        self._mtime_ns = self.template_path.stat().st_mtime_ns
+        logger.info(f"Compiled prompt template {self.template_id}")
+    
+    def _reload_if_changed(self):
+        """Recompile when the template file has been edited; keep the old plan if the edit is invalid"""
+        try:
+            mtime_ns = self.template_path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns == self._mtime_ns:
+            return
         
-        # Add output structure
-        prompt_parts.append("OUTPUT FORMAT:")
-        for key, value in self.config['output_structure'].items():
-            prompt_parts.append(f"- {value}")
-        prompt_parts.append("")
+        previous_id = self.template_id
+        try:
+            self._load_template()
+            logger.info(f"Prompt template reloaded: {previous_id} -> {self.template_id}")
+        except (configparser.Error, KeyError, ValueError) as e:
+            # Don't retry a broken file on every request, wait for the next edit
+            self._mtime_ns = mtime_ns
+            logger.error(f"Invalid prompt template edit ignored, still using {previous_id}: {str(e)}")
+    
+    def _compile(self, config: configparser.ConfigParser):
+        """Build the static system prompt and the per-request format string, validating placeholders"""
+        base, requirements, instructions, uniqueness, closing = self._compile_sections(config)
+        system_parts = base + instructions
+        user_parts = requirements + uniqueness + closing
+        # The system prefix holds literal lines only, formatting just unescapes their braces
+        return "\n".join(system_parts[:-1]).format(), "\n".join(user_parts)
+    
+    def _compile_legacy(self, config: configparser.ConfigParser) -> str:
+        """Build the single format string of the legacy layout, see LEGACY_LAYOUT"""
+        base, requirements, instructions, uniqueness, closing = self._compile_sections(config)
+        return "\n".join(base + requirements + instructions + uniqueness + closing)
+    
+    def _compile_sections(self, config: configparser.ConfigParser):
+        """Build each prompt section as lines ending in a blank separator, validating placeholders"""
+        base = [
+            f"System Role: {self._literal_line(config['base_prompt']['system_role'])}",
+            f"Target Audience: {self._literal_line(config['base_prompt']['target_audience'])}",
+            f"Confidence Level: {self._literal_line(config['base_prompt']['confidence_level'])}",
+            ""
+        ]
         
-        # Add safety and quality
-        prompt_parts.append("SAFETY AND QUALITY:")
-        for key, value in self.config['safety_and_quality'].items():
-            prompt_parts.append(f"- {value}")
-        prompt_parts.append("")
+        framework = config['activity_framework']
+        requirements = [
+            "ACTIVITY REQUIREMENTS:",
+            f"- {self._placeholder_line(framework['create_instruction'])}",
+            f"- {self._placeholder_line(framework['materials_instruction'])}",
+            f"- {self._placeholder_line(framework['learning_focus'])}",
+            f"- {self._literal_line(framework['theme_integration'])}",
+            ""
+        ]
         
-        # Add uniqueness requirements
-        avoid_repetition = self.config['uniqueness_requirement']['avoid_repetition'].format(**variables)
-        ensure_variety = self.config['uniqueness_requirement']['ensure_variety']
+        # Output structure, then safety and quality
+        instructions = ["OUTPUT FORMAT:"]
+        instructions += [f"- {self._literal_line(value)}" for value in config['output_structure'].values()]
+        instructions += ["", "SAFETY AND QUALITY:"]
+        instructions += [f"- {self._literal_line(value)}" for value in config['safety_and_quality'].values()]
+        instructions.append("")
         
-        prompt_parts.append("UNIQUENESS REQUIREMENTS:")
-        prompt_parts.append(f"- {avoid_repetition}")
-        prompt_parts.append(f"- {ensure_variety}")
-        prompt_parts.append("")
+        uniqueness_config = config['uniqueness_requirement']
+        uniqueness = [
+            "UNIQUENESS REQUIREMENTS:",
+            f"- {self._placeholder_line(uniqueness_config['avoid_repetition'])}",
+            f"- {self._literal_line(uniqueness_config['ensure_variety'])}",
+            ""
+        ]
         
-        prompt_parts.append("Please generate a complete activity following all the above requirements.")
+        closing = ["Please generate a complete activity following all the above requirements."]
+        return base, requirements, instructions, uniqueness, closing
+    
+    def _placeholder_line(self, line: str) -> str:
+        """Validate a line's {placeholders} against the known template variables"""
+        for _, field, format_spec, conversion in Formatter().parse(line):
+            if field is None:
+                continue
+            if field not in TEMPLATE_VARIABLES:
+                raise ValueError(f"Unknown template variable {{{field}}} in: {line}")
+            if format_spec or conversion:
+                raise ValueError(f"Format specs are not supported in template variable {{{field}}}")
+        return line
+    
+    def _literal_line(self, line: str) -> str:
+        """Escape braces in a line that is used as-is"""
+        return line.replace("{", "{{").replace("}", "}}")
+    
+    def _create_default_template(self):
+        """Create the default activity prompt template"""
+        self.template_path.parent.mkdir(exist_ok=True)
         
-        return "\n".join(prompt_parts)
+        with open(self.template_path, 'w') as f:
+            f.write(DEFAULT_TEMPLATE)
+    
+    def populate_template(self, variables: Dict[str, Any]) -> str:
+        """
+        Populate the template with the given variables
+        """
+        parts = self.populate_template_parts(variables)
+        return self.join_prompt_parts(parts)
+    
+    def populate_template_parts(self, variables: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Populate the template split into a static "system" prefix, identical for every
+        request and therefore cacheable, and a small per-request "user" suffix
+        """
+        self._reload_if_changed()
+        return {
+            "system": self._system_prompt,
+            "user": self._user_template.format_map(variables)
+        }
+    
+    def join_prompt_parts(self, parts: Dict[str, str]) -> str:
+        """Join prompt parts back into the single prompt text"""
+        return f"{parts['system']}\n\n{parts['user']}"
+    
+    def source_template_id(self, source: str, layout: Optional[str] = None) -> str:
+        """Versioned identifier of a given template source, rendered in the current or another layout"""
+        version = hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+        template_id = f"{self.template_path.stem}@{version}"
+        return f"{template_id}/{layout}" if layout else template_id
+    
+    def render_source(self, source: str, variables: Dict[str, Any], layout: Optional[str] = None) -> str:
+        """Render the prompt a given template source produces, e.g. an earlier version of the template"""
+        config = configparser.ConfigParser(interpolation=None)
+        config.read_string(source)
+        if layout == LEGACY_LAYOUT:
+            return self._compile_legacy(config).format_map(variables)
+        system_prompt, user_template = self._compile(config)
+        return self.join_prompt_parts({"system": system_prompt, "user": user_template.format_map(variables)})
+    
+    def match_prompt(self, prompt: str) -> Optional[Dict[str, str]]:
+        """
+        Recover the variables a stored prompt was rendered with, if the current template
+        version produced it; None otherwise
+        """
+        self._reload_if_changed()
+        prefix = f"{self._system_prompt}\n\n"
+        if not prompt.startswith(prefix):
+            return None
+        return self._match_format(self._user_template, prompt[len(prefix):])
+    
+    def match_legacy_prompt(self, prompt: str, source: str) -> Optional[Dict[str, str]]:
+        """
+        Recover the variables a stored prompt was rendered with, if the given template
+        source produced it in the legacy layout; None otherwise
+        """
+        config = configparser.ConfigParser(interpolation=None)
+        config.read_string(source)
+        return self._match_format(self._compile_legacy(config), prompt)
+    
+    def _match_format(self, template: str, text: str) -> Optional[Dict[str, str]]:
+        """Match text against a format string, capturing each placeholder's value"""
+        pattern, seen = [], set()
+        for literal, field, _, _ in Formatter().parse(template):
+            pattern.append(re.escape(literal))
+            if field is not None:
+                pattern.append(f"(?P={field})" if field in seen else f"(?P<{field}>.*?)")
+                seen.add(field)
+        match = re.fullmatch("".join(pattern), text, re.DOTALL)
+        return match.groupdict() if match else None
+    
+    def get_system_prompt(self) -> str:
+        """The static instruction blocks shared by every request"""
+        self._reload_if_changed()
+        return self._system_prompt
     
     def format_materials_list(self, materials: List[str]) -> str:
         """Format materials list for template"""
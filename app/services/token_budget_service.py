@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import time
+from datetime import date
+from typing import Dict, Any, List, Optional, Set, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import SessionLocal, AsyncSessionLocal
+from app.models.token_ledger import TokenLedgerEntry, SHARED_USER_ID
+from app.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity`, refilled continuously at `rate` per second"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def available(self) -> float:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        return self.level
+
+    def take(self, amount: float):
+        """Remove `amount`; may go negative, which blocks admission until it refills"""
+        self.available()
+        self.level -= amount
+
+
+class TokenBudgetService:
+    """
+    Admission control for Anthropic generations. Every API call's token usage is
+    written to a per-child, per-day ledger; a generate request is admitted only
+    while the child and the whole app are within their daily token budgets and
+    their request-rate and token-rate buckets have room. Requests that aren't
+    admitted must be served from the pool or cache instead of the API.
+
+    Buckets and the day's totals live in memory and are shared by every instance;
+    totals are loaded from the ledger on first use each day, so they survive
+    restarts. admit() is blocking and runs in the threadpool; record() and
+    allow_background() read and write the ledger on the async engine.
+    """
+
+    _child_buckets: Dict[int, TokenBucket] = {}
+    _global_requests: Optional[TokenBucket] = None
+    _global_tokens: Optional[TokenBucket] = None
+    # (day, user_id) -> tokens used that day; user_id None is the global total
+    _daily_totals: Dict[Tuple[date, Optional[int]], int] = {}
+    # In-flight ledger writes; the lock stops two of them both inserting a day's first row
+    _pending: Set[asyncio.Task] = set()
+    # Created on first use: an asyncio.Lock made at import time binds to the wrong loop on Python 3.9
+    _ledger_lock: Optional[asyncio.Lock] = None
+    _ledger_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __init__(self):
+        if TokenBudgetService._global_requests is None:
+            TokenBudgetService._global_requests = TokenBucket(
+                settings.global_request_burst, settings.global_requests_per_minute / 60
+            )
+            TokenBudgetService._global_tokens = TokenBucket(
+                settings.global_tokens_per_minute, settings.global_tokens_per_minute / 60
+            )
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+
+    def admit(self, user_id: int) -> Dict[str, Any]:
+        """
+        Decide whether a child's generate request may call the API. On success one
+        request is taken from the child's and the global request buckets.
+        Blocking: reads the ledger on the first request of the day.
+        """
+        if not settings.token_budget_enabled:
+            return {"success": True, "error": None}
+
+        today = date.today()
+        for key in self._unloaded(today, user_id):
+            db = SessionLocal()
+            try:
+                self._remember_total(key, db.execute(self._total_statement(*key)).scalar())
+            finally:
+                db.close()
+
+        reason = self._over_budget(user_id)
+        if reason:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            logger.warning(f"Generation for user {user_id} not admitted: {reason}")
+            return {"success": False, "error": "You've made lots of activities! Here's one we prepared earlier.",
+                    "reason": reason}
+
+        self._child_bucket(user_id).take(1)
+        self._global_requests.take(1)
+        self.admitted += 1
+        return {"success": True, "error": None}
+
+    async def allow_background(self) -> bool:
+        """Whether optional work (pool refills, alternates) may spend tokens right now"""
+        if not settings.token_budget_enabled:
+            return True
+        await self._load_daily_totals(None)
+        return self._global_tokens.available() > 0 and not self._over_daily(None, settings.global_daily_token_budget)
+
+    async def record(self, user_id: Optional[int], usage: Dict[str, int]):
+        """
+        Add one API call's usage to the token buckets now and to the ledger in the
+        background; user_id None is usage not made for a particular child
+        """
+        if not usage:
+            return
+        tokens = self.billable_tokens(usage)
+        today = date.today()
+        await self._load_daily_totals(user_id)
+        self._global_tokens.take(tokens)
+        for key in {(today, user_id), (today, None)}:
+            self._daily_totals[key] += tokens
+
+        task = asyncio.get_running_loop().create_task(self._write_ledger(user_id, today, usage))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    @classmethod
+    async def flush(cls):
+        """Wait for ledger writes still in flight"""
+        if cls._pending:
+            await asyncio.gather(*cls._pending, return_exceptions=True)
+
+    @classmethod
+    def _get_ledger_lock(cls) -> asyncio.Lock:
+        """The ledger lock for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if cls._ledger_lock is None or cls._ledger_lock_loop is not loop:
+            cls._ledger_lock = asyncio.Lock()
+            cls._ledger_lock_loop = loop
+        return cls._ledger_lock
+
+    async def _write_ledger(self, user_id: Optional[int], day: date, usage: Dict[str, int]):
+        async with self._get_ledger_lock():
+            try:
+                async with AsyncSessionLocal() as db:
+                    try:
+                        await self._add_to_ledger(db, user_id, day, usage)
+                    except IntegrityError:
+                        # Another process inserted the day's row first, add to it instead
+                        await db.rollback()
+                        await self._add_to_ledger(db, user_id, day, usage)
+            except Exception as e:
+                logger.error(f"Failed to record token usage for user {user_id}: {str(e)}")
+
+    async def _add_to_ledger(self, db: AsyncSession, user_id: Optional[int], day: date, usage: Dict[str, int]):
+        entry = (await db.execute(select(TokenLedgerEntry).filter(*self._ledger_key(user_id, day))))\
+            .scalars().first()
+        if entry is None:
+            entry = self._new_entry(user_id, day)
+            db.add(entry)
+        self._add_usage(entry, usage)
+        await db.commit()
+
+    def _ledger_key(self, user_id: Optional[int], day: date):
+        return (
+            TokenLedgerEntry.user_id == (SHARED_USER_ID if user_id is None else user_id),
+            TokenLedgerEntry.date == day
+        )
+
+    def _new_entry(self, user_id: Optional[int], day: date) -> TokenLedgerEntry:
+        return TokenLedgerEntry(
+            user_id=SHARED_USER_ID if user_id is None else user_id, date=day, requests=0, input_tokens=0, output_tokens=0,
+            cache_read_input_tokens=0, cache_creation_input_tokens=0
+        )
+
+    def _add_usage(self, entry: TokenLedgerEntry, usage: Dict[str, int]):
+        entry.requests += 1
+        entry.input_tokens += usage.get("input_tokens", 0)
+        entry.output_tokens += usage.get("output_tokens", 0)
+        entry.cache_read_input_tokens += usage.get("cache_read_input_tokens", 0)
+        entry.cache_creation_input_tokens += usage.get("cache_creation_input_tokens", 0)
+
+    def billable_tokens(self, usage: Dict[str, int]) -> int:
+        """Tokens counted against budgets; prompt-cache reads are excluded as they are billed at a fraction"""
+        return (usage.get("input_tokens", 0) + usage.get("cache_creation_input_tokens", 0)
+                + usage.get("output_tokens", 0))
+
+    def get_stats(self) -> Dict[str, Any]:
+        today = date.today()
+        return {
+            "enabled": settings.token_budget_enabled,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "tokens_today": self._daily_total(today, None),
+            "global_daily_token_budget": settings.global_daily_token_budget,
+            "global_requests_available": round(self._global_requests.available(), 2),
+            "global_tokens_available": round(self._global_tokens.available()),
+            "children_today": {
+                user_id: tokens for (day, user_id), tokens in self._daily_totals.items()
+                if day == today and user_id is not None
+            }
+        }
+
+    def _over_budget(self, user_id: int) -> Optional[str]:
+        """Name of the first limit the request would break, or None"""
+        if self._over_daily(user_id, settings.child_daily_token_budget):
+            return "child_daily_tokens"
+        if self._over_daily(None, settings.global_daily_token_budget):
+            return "global_daily_tokens"
+        if settings.child_requests_per_minute > 0 and self._child_bucket(user_id).available() < 1:
+            return "child_request_rate"
+        if settings.global_requests_per_minute > 0 and self._global_requests.available() < 1:
+            return "global_request_rate"
+        if settings.global_tokens_per_minute > 0 and self._global_tokens.available() <= 0:
+            return "global_token_rate"
+        return None
+
+    def _over_daily(self, user_id: Optional[int], budget: int) -> bool:
+        return budget > 0 and self._daily_total(date.today(), user_id) >= budget
+
+    def _daily_total(self, day: date, user_id: Optional[int]) -> int:
+        """Tokens used on a day by a child (or by everyone, for None), as far as loaded"""
+        return self._daily_totals.get((day, user_id), 0)
+
+    async def _load_daily_totals(self, user_id: Optional[int]):
+        """Load today's totals for a child and for everyone from the ledger, if not loaded yet"""
+        today = date.today()
+        for key in self._unloaded(today, user_id):
+            async with AsyncSessionLocal() as db:
+                self._remember_total(key, (await db.execute(self._total_statement(*key))).scalar())
+
+    def _unloaded(self, day: date, user_id: Optional[int]) -> List[Tuple[date, Optional[int]]]:
+        return [key for key in {(day, user_id), (day, None)} if key not in self._daily_totals]
+
+    def _total_statement(self, day: date, user_id: Optional[int]):
+        statement = select(func.coalesce(func.sum(
+            TokenLedgerEntry.input_tokens + TokenLedgerEntry.cache_creation_input_tokens
+            + TokenLedgerEntry.output_tokens
+        ), 0)).filter(TokenLedgerEntry.date == day)
+        if user_id is not None:
+            statement = statement.filter(TokenLedgerEntry.user_id == user_id)
+        return statement
+
+    def _remember_total(self, key: Tuple[date, Optional[int]], tokens: int):
+        # A concurrent load may have finished first and had usage recorded on top since
+        self._daily_totals.setdefault(key, tokens)
+        # Earlier days are never consulted again
+        for stale in [k for k in self._daily_totals if k[0] != key[0]]:
+            del self._daily_totals[stale]
+
+    def _child_bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._child_buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(settings.child_request_burst, settings.child_requests_per_minute / 60)
+            self._child_buckets[user_id] = bucket
+        return bucket
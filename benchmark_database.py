@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark SQLite read/write concurrency with SQLite's default settings and with the
+storage profile from app/database.py (WAL, synchronous, busy timeout, cache, mmap).
+
+Reader threads run the child dashboard queries while writer threads score
+activities the way ScoringService does, against a fresh database file per profile.
+
+    python benchmark_database.py --readers 4 --writers 2 --seconds 5
+"""
+
+import sys
+import os
+import argparse
+import random
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date
+
+# Add the app directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, make_engine, sqlite_pragmas
+from app.models.user import User
+from app.models.parent import Parent
+from app.models.activity import ActivitySession
+from app.models.scoring import ActivityScore
+from app.models.daily_stats import DailyStats
+
+CHILDREN = 4
+
+
+def seed(Session, rows: int):
+    """Children with today's stats, a parent and a history of completed activities waiting to be scored"""
+    db = Session()
+    db.add_all([User(name=f"child{i}") for i in range(CHILDREN)] + [Parent(name="parent", password_hash="x")])
+    db.flush()
+    db.add_all([
+        DailyStats(user_id=1 + i, date=date.today(), activities_completed=0, total_points=0, total_time_minutes=0)
+        for i in range(CHILDREN)
+    ])
+    for i in range(rows):
+        db.add(ActivitySession(
+            user_id=1 + i % CHILDREN, status="completed", selected_duration=30, selected_materials=["paper"],
+            selected_objectives=["creativity"], selected_category="crafting", title=f"Activity {i}",
+            generated_activity={"title": f"Activity {i}", "steps": ["Do a thing"] * 8}
+        ))
+    db.commit()
+    db.close()
+
+
+def reader(Session, stop: threading.Event, latencies: list, errors: list):
+    """Child dashboard: scored count, points total and the recent activity list"""
+    while not stop.is_set():
+        user_id = random.randint(1, CHILDREN)
+        start = time.perf_counter()
+        db = Session()
+        try:
+            db.query(func.count(ActivitySession.id)).filter(
+                ActivitySession.user_id == user_id, ActivitySession.status == "scored"
+            ).scalar()
+            db.query(func.coalesce(func.sum(DailyStats.total_points), 0)).filter(DailyStats.user_id == user_id).scalar()
+            db.query(ActivitySession.id, ActivitySession.title).filter(ActivitySession.user_id == user_id)\
+                .order_by(ActivitySession.created_at.desc()).limit(5).all()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError as e:
+            errors.append(str(e.orig))
+        finally:
+            db.close()
+
+
+def writer(Session, stop: threading.Event, latencies: list, errors: list):
+    """Score one completed activity: insert the score, mark the session scored, update daily stats"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        db = Session()
+        try:
+            session = db.query(ActivitySession).filter(ActivitySession.status == "completed")\
+                .order_by(func.random()).first()
+            if session is None:
+                break
+            db.add(ActivityScore(session_id=session.id, parent_id=1, score=random.randint(50, 100)))
+            session.status = "scored"
+            stats = db.query(DailyStats).filter(
+                DailyStats.user_id == session.user_id, DailyStats.date == date.today()
+            ).one()
+            stats.activities_completed += 1
+            stats.total_points += 10
+            db.commit()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError as e:
+            db.rollback()
+            errors.append(str(e.orig))
+        finally:
+            db.close()
+
+
+def run(name: str, pragmas: dict, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+    engine = make_engine(f"sqlite:///{path}", pragmas=pragmas)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    seed(Session, args.rows)
+
+    stop = threading.Event()
+    reads, writes, read_errors, write_errors = [], [], [], []
+    threads = [threading.Thread(target=reader, args=(Session, stop, reads, read_errors)) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(Session, stop, writes, write_errors)) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    def p95(samples):
+        return statistics.quantiles(samples, n=20)[-1] * 1000 if len(samples) >= 2 else 0.0
+
+    return {
+        "profile": name,
+        "reads_per_second": len(reads) / args.seconds,
+        "writes_per_second": len(writes) / args.seconds,
+        "read_p95_ms": p95(reads),
+        "write_p95_ms": p95(writes),
+        "lock_errors": len(read_errors) + len(write_errors)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite storage profile")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=2000, help="completed activities to seed")
+    args = parser.parse_args()
+
+    print(f"📊 SQLite concurrency: {args.readers} readers, {args.writers} writers, {args.seconds}s per profile")
+    print("=" * 78)
+    # SQLite's own defaults: rollback journal, synchronous=FULL, and pysqlite's 5s busy timeout
+    results = [run("default", {}, args), run("tuned", sqlite_pragmas(), args)]
+    print(f"{'profile':<10}{'reads/s':>10}{'writes/s':>10}{'read p95 ms':>14}{'write p95 ms':>14}{'lock errors':>13}")
+    for result in results:
+        print(f"{result['profile']:<10}{result['reads_per_second']:>10.0f}{result['writes_per_second']:>10.0f}"
+              f"{result['read_p95_ms']:>14.1f}{result['write_p95_ms']:>14.1f}{result['lock_errors']:>13}")
+    print(f"\n⚙️  Tuned pragmas: {', '.join(f'{k}={v}' for k, v in sqlite_pragmas().items() if v not in (None, ''))}")
+
+
+if __name__ == "__main__":
+    main()
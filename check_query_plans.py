@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Check that the hot queries use the indexes added by the Alembic migrations.
+Runs EXPLAIN QUERY PLAN for each query against a SQLite database migrated to head
+(a fresh temporary one unless --database is given) and exits non-zero if a query
+doesn't search with the index it is meant to use.
+
+    python check_query_plans.py
+    python check_query_plans.py --database galactic_academy.db
+"""
+
+import sys
+import os
+import argparse
+import tempfile
+from datetime import date
+
+# Add the app directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from alembic import command
+from sqlalchemy import select, func, tuple_
+
+from app.database import make_engine, alembic_config
+from app.models.activity import ActivitySession
+from app.models.scoring import ActivityScore
+from app.models.reimbursement import ReimbursementHistory, WeeklyReimbursementStatus, PointDeduction
+from app.models.user_balance import UserBalance
+
+# (description, statement, index it should use), mirroring the services' queries;
+# "PRIMARY KEY" is a lookup on the table's integer primary key
+CHECKS = [
+    (
+        "Active or unscored session (SessionService.get_active_session)",
+        select(ActivitySession.id).filter(
+            ActivitySession.user_id == 1, ActivitySession.status.in_(["active", "completed"])
+        ).order_by(ActivitySession.created_at.desc()).limit(1),
+        "ix_activity_sessions_user_status_created"
+    ),
+    (
+        "Scored count (child dashboard)",
+        select(func.count(ActivitySession.id)).filter(
+            ActivitySession.user_id == 1, ActivitySession.status == "scored"
+        ),
+        "ix_activity_sessions_user_status_created"
+    ),
+    (
+        "Recent activities (child dashboard, uniqueness check)",
+        select(ActivitySession.id, ActivitySession.title).filter(ActivitySession.user_id == 1)
+        .order_by(ActivitySession.created_at.desc()).limit(5),
+        "ix_activity_sessions_user_status_created"
+    ),
+    (
+        "Next page of all activities (admin activities, keyset on created_at)",
+        select(ActivitySession.id).filter(
+            tuple_(ActivitySession.created_at, ActivitySession.id)
+            < tuple_(select(ActivitySession.created_at).where(ActivitySession.id == 100).scalar_subquery(), 100)
+        ).order_by(ActivitySession.created_at.desc(), ActivitySession.id.desc()).limit(51),
+        "ix_activity_sessions_created_at"
+    ),
+    (
+        "Score for a session (activity view, admin)",
+        select(ActivityScore.score).filter(ActivityScore.session_id == 1),
+        "ix_activity_scores_session_id"
+    ),
+    (
+        "Points balance (ReimbursementService.get_user_total_points)",
+        select(UserBalance.balance).filter(UserBalance.user_id == 1),
+        "PRIMARY KEY"
+    ),
+    (
+        "Points spent per child (BalanceService.rebuild and verify)",
+        select(PointDeduction.user_id, func.coalesce(func.sum(PointDeduction.points_deducted), 0))
+        .filter(PointDeduction.user_id.in_([1])).group_by(PointDeduction.user_id),
+        "ix_point_deductions_user_id"
+    ),
+    (
+        "Redemption history (ReimbursementService.get_user_reimbursement_history)",
+        select(ReimbursementHistory.id).filter(ReimbursementHistory.user_id == 1)
+        .order_by(ReimbursementHistory.redeemed_at.desc()),
+        "ix_reimbursement_history_user_redeemed"
+    ),
+    (
+        "Weekly status (ReimbursementService.can_user_reimburse_this_week)",
+        select(WeeklyReimbursementStatus.id).filter(
+            WeeklyReimbursementStatus.user_id == 1, WeeklyReimbursementStatus.week_start_date == date(2026, 1, 2)
+        ),
+        "ix_weekly_reimbursement_status_user_week"
+    )
+]
+
+
+def explain(connection, statement) -> list:
+    """The EXPLAIN QUERY PLAN detail lines for a statement"""
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")]
+
+
+def check_query_plans(database: str = None) -> bool:
+    path = database or os.path.join(tempfile.mkdtemp(), "query_plans.db")
+    engine = make_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        command.upgrade(alembic_config(connection), "head")
+
+    failures = 0
+    with engine.connect() as connection:
+        connection.exec_driver_sql("ANALYZE")
+        for description, statement, index in CHECKS:
+            plan = explain(connection, statement)
+            uses_index = any(line.startswith("SEARCH") and index in line for line in plan)
+            failures += not uses_index
+            print(f"{'✅' if uses_index else '❌'} {description}")
+            for line in plan:
+                print(f"     {line}")
+    engine.dispose()
+
+    print(f"\n📊 {len(CHECKS) - failures}/{len(CHECKS)} queries use their index")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the hot queries use their indexes")
+    parser.add_argument("--database", help="SQLite database file to check (default: a fresh migrated database)")
+    args = parser.parse_args()
+
+    print("🔍 Query Plan Check")
+    print("=" * 50)
+    sys.exit(0 if check_query_plans(args.database) else 1)
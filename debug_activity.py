@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Debug script to show what an activity session was generated from: the full prompt
+(rebuilt from its template version and stored variables) and the model's full
+response (from the content store).
+
+    python debug_activity.py 42
+"""
+
+import sys
+import os
+import argparse
+
+# Add the app directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.services.activity_service import ActivityService
+
+
+def debug_activity(session_id: int) -> bool:
+    """Print a session's prompt and raw response; returns False if the session doesn't exist"""
+    db = SessionLocal()
+    try:
+        activity_service = ActivityService()
+        session = activity_service.get_activity_session(db, session_id)
+        if not session:
+            print(f"❌ Activity session {session_id} not found")
+            return False
+
+        print(f"📋 Session {session.id}: {session.title or 'Untitled'}")
+        print(f"  - User ID: {session.user_id}, Status: {session.status}, Created: {session.created_at}")
+        print(f"  - Template: {session.prompt_template_id or 'unknown'}")
+
+        prompt = activity_service.get_prompt(db, session)
+        print("\n📝 Prompt:")
+        print(prompt if prompt is not None else "  (not available: the template version or variables were not stored)")
+
+        raw_content = activity_service.get_raw_content(db, session)
+        print("\n🤖 Response:")
+        print(raw_content if raw_content is not None else "  (not available)")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the prompt and response behind an activity session")
+    parser.add_argument("session_id", type=int, help="activity session ID")
+    args = parser.parse_args()
+
+    print("🔍 Activity Debug Tool")
+    print("=" * 50)
+    sys.exit(0 if debug_activity(args.session_id) else 1)
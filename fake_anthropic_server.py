@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Anthropic Messages API, for offline load and latency testing.
+
+Serves POST /v1/messages in the same shape AnthropicService uses (plain and streaming)
+and answers with canned numbered-step activities that _parse_generated_activity
+understands, or with a tool_use block when the request forces a tool (structured
+output). Latency, token pacing and error rates are configurable so throughput,
+retries, hedging and the circuit breaker can be exercised without spending tokens.
+
+Usage:
+    python fake_anthropic_server.py --port 8765 --latency lognormal --latency-median 2.0 --error-rate 0.05
+
+Then point the app at it in .env:
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765
+    ANTHROPIC_API_KEY=fake-key
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+ACTIVITIES = [
+    {
+        "title": "Safari Explorer Binoculars",
+        "description": "Build your own pair of explorer binoculars and go on a wildlife spotting mission around your home! Real safari guides use binoculars to find animals hiding in the grass.",
+        "steps": [
+            "Gather your materials and set up your explorer station on a clear table. (2 minutes) You're ready for adventure!",
+            "Cut two equal tubes from your cardboard and tape them side by side. (5 minutes) Great teamwork, hands!",
+            "Decorate the tubes with stripes and spots like your favorite safari animal. (8 minutes) So colorful!",
+            "Punch a hole on each side and tie on a string strap. (3 minutes) Now they're ready to wear!",
+            "Hide five toy animals around the room and use your binoculars to spot them all. (5 minutes) Amazing explorer work!"
+        ]
+    },
+    {
+        "title": "Dino Fossil Dig Site",
+        "description": "Become a real paleontologist and create your own fossil dig site! You'll make a dinosaur fossil and then carefully excavate it just like scientists do.",
+        "steps": [
+            "Clear a space and lay down paper to make your dig site. (2 minutes) Every scientist needs a lab!",
+            "Draw a dinosaur skeleton on cardboard and cut out the bones. (8 minutes) Your dino is taking shape!",
+            "Hide the bones under crumpled paper layers in a box. (4 minutes) Sneaky fossil hiding!",
+            "Use a paintbrush to gently uncover each bone one at a time. (6 minutes) Careful hands make great scientists!",
+            "Arrange the bones to rebuild your dinosaur and give it a name. (5 minutes) You discovered a new species!"
+        ]
+    },
+    {
+        "title": "Sweet Scoops Ice Cream Shop",
+        "description": "Open your very own ice cream shop! Design colorful paper scoops, build a cone stand and invent your own secret flavors for your customers.",
+        "steps": [
+            "Set up your shop counter with a box and a sign. (3 minutes) Your business is open!",
+            "Cut out circles from colored paper to make ice cream scoops. (6 minutes) Yummy colors!",
+            "Roll paper into cones and tape them closed. (5 minutes) Perfect cones, chef!",
+            "Invent three secret flavors and write them on a menu card. (6 minutes) What creative recipes!",
+            "Serve a family member and take their order with a smile. (5 minutes) Best shop owner ever!"
+        ]
+    },
+    {
+        "title": "Deep Sea Submarine Mission",
+        "description": "Build a submarine and dive into the deep ocean to discover amazing sea creatures! Marine biologists explore places where sunlight never reaches.",
+        "steps": [
+            "Find a bottle or box to be the body of your submarine. (2 minutes) Welcome aboard, captain!",
+            "Cover it with foil and add round windows with markers. (7 minutes) So shiny and strong!",
+            "Make a periscope from a paper roll and attach it on top. (5 minutes) Now you can see the surface!",
+            "Draw three deep sea creatures you want to discover. (6 minutes) What incredible animals!",
+            "Take your submarine on a mission and tell the story of what you find. (5 minutes) Mission accomplished!"
+        ]
+    }
+]
+
+BONUS_LINES = [
+    "Bonus challenge: add a secret compartment to hide a tiny treasure!",
+    "Bonus challenge: teach someone in your family how you made it!",
+    "Bonus challenge: give your creation a name and a backstory!"
+]
+
+
+class FakeConfig:
+    """Latency, pacing and error injection knobs, set from the command line"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.latency = args.latency
+        self.latency_median = args.latency_median
+        self.latency_sigma = args.latency_sigma
+        self.latency_min = args.latency_min
+        self.latency_max = args.latency_max
+        self.token_delay = args.token_delay
+        self.error_rate = args.error_rate
+        self.error_status = args.error_status
+        self.hang_rate = args.hang_rate
+        self.stream_break_rate = args.stream_break_rate
+        self.seed = args.seed
+
+    def time_to_first_token(self) -> float:
+        """Sample how long the fake model 'thinks' before answering"""
+        if self.latency == "fixed":
+            return self.latency_median
+        if self.latency == "uniform":
+            return random.uniform(self.latency_min, self.latency_max)
+        # lognormal: long tail like real upstream latency, median at latency_median
+        sample = random.lognormvariate(math.log(max(self.latency_median, 0.001)), self.latency_sigma)
+        return min(max(sample, self.latency_min), self.latency_max)
+
+
+app = FastAPI(title="Fake Anthropic Messages API")
+config: FakeConfig = None
+seen_system_prompts = set()
+stats = {"requests": 0, "streams": 0, "errors": 0, "hangs": 0}
+
+
+def count_tokens(text: str) -> int:
+    """Rough token estimate, good enough for usage accounting"""
+    return max(1, len(text) // 4)
+
+
+def prompt_text(body: dict) -> str:
+    parts = []
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get("text", "") for block in content or [])
+    return "\n".join(parts)
+
+
+def system_text(body: dict) -> str:
+    system = body.get("system") or ""
+    if isinstance(system, str):
+        return system
+    return "\n".join(block.get("text", "") for block in system)
+
+
+def pick_activity(prompt: str) -> dict:
+    """Pick a canned activity and tailor its title to the requested category"""
+    activity = dict(random.choice(ACTIVITIES))
+    category_match = re.search(r"Create a fun (?:detailed and imaginative )?(\w+) activity", prompt)
+    title = activity["title"]
+    if category_match:
+        title = f"{title}: {category_match.group(1).replace('_', ' ').title()} Edition"
+    # Short suffix keeps titles distinct so uniqueness checks and caches behave like production
+    activity["title"] = f"{title} #{random.randint(100, 999)}"
+    duration_match = re.search(r"takes approximately (\d+) minutes", prompt)
+    activity["duration"] = duration_match.group(1) if duration_match else None
+    activity["bonus"] = random.choice(BONUS_LINES)
+    return activity
+
+
+def build_activity(activity: dict) -> str:
+    """Canned activity in the title / description / numbered steps layout the app parses"""
+    lines = [activity["title"], "", activity["description"]]
+    if activity["duration"]:
+        lines.append(f"This adventure takes about {activity['duration']} minutes.")
+    lines.append("")
+    lines.extend(f"{i}. {step}" for i, step in enumerate(activity["steps"], 1))
+    lines.extend(["", activity["bonus"], "", "You did an amazing job, explorer! Be proud of what you created!"])
+    return "\n".join(lines)
+
+
+def build_tool_input(activity: dict) -> dict:
+    """Canned activity as the JSON input of the app's record_activity tool"""
+    steps = []
+    for step in activity["steps"]:
+        match = re.match(r"(.*?)\s*\((\d+) minutes?\)\s*(.*)", step)
+        if match:
+            steps.append({"instruction": match.group(1), "minutes": int(match.group(2)), "encouragement": match.group(3)})
+        else:
+            steps.append({"instruction": step, "minutes": 5, "encouragement": ""})
+    return {
+        "title": activity["title"],
+        "description": activity["description"],
+        "materials": ["cardboard", "markers", "tape", "scissors"],
+        "steps": steps,
+        "safety_notes": ["Ask a grown-up for help with scissors.", "Keep small pieces away from little siblings."],
+        "bonus_challenge": activity["bonus"].replace("Bonus challenge: ", ""),
+        "closing_message": "You did an amazing job, explorer! Be proud of what you created!"
+    }
+
+
+def forced_tool(body: dict):
+    """Name of the tool the request forces, if any"""
+    tool_choice = body.get("tool_choice") or {}
+    if tool_choice.get("type") == "tool" and body.get("tools"):
+        return tool_choice["name"]
+    return None
+
+
+def usage_for(body: dict, output_text: str) -> dict:
+    """Report prompt caching the way the real API does: the first sighting of a cached system prompt writes, later ones read"""
+    system = system_text(body)
+    system_blocks = body.get("system") if isinstance(body.get("system"), list) else []
+    cached = any(block.get("cache_control") for block in system_blocks)
+    usage = {
+        "input_tokens": count_tokens(prompt_text(body)),
+        "output_tokens": count_tokens(output_text),
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 0
+    }
+    if cached:
+        digest = hashlib.sha256(system.encode()).hexdigest()
+        if digest in seen_system_prompts:
+            usage["cache_read_input_tokens"] = count_tokens(system)
+        else:
+            seen_system_prompts.add(digest)
+            usage["cache_creation_input_tokens"] = count_tokens(system)
+    else:
+        usage["input_tokens"] += count_tokens(system) if system else 0
+    return usage
+
+
+def error_response(status: int) -> JSONResponse:
+    error_types = {
+        400: "invalid_request_error",
+        429: "rate_limit_error",
+        500: "api_error",
+        529: "overloaded_error"
+    }
+    error_type = error_types.get(status, "api_error")
+    return JSONResponse(
+        status_code=status,
+        content={"type": "error", "error": {"type": error_type, "message": f"Injected {error_type}"}}
+    )
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def chunk_text(text: str):
+    """Split text into word-sized deltas, roughly one per token"""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+@app.post("/v1/messages")
+async def create_message(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    if random.random() < config.hang_rate:
+        # Never answers, so client timeouts and hedging kick in
+        stats["hangs"] += 1
+        await asyncio.sleep(3600)
+
+    await asyncio.sleep(config.time_to_first_token())
+
+    if random.random() < config.error_rate:
+        stats["errors"] += 1
+        return error_response(random.choice(config.error_status))
+
+    activity = pick_activity(prompt_text(body))
+    tool_name = forced_tool(body)
+    if tool_name:
+        tool_input = build_tool_input(activity)
+        text = json.dumps(tool_input)
+        content_block = {"type": "tool_use", "id": f"toolu_fake_{uuid.uuid4().hex[:24]}", "name": tool_name, "input": tool_input}
+        stop_reason = "tool_use"
+    else:
+        text = build_activity(activity)
+        content_block = {"type": "text", "text": text}
+        stop_reason = "end_turn"
+    usage = usage_for(body, text)
+    message_id = f"msg_fake_{uuid.uuid4().hex[:24]}"
+    model = body.get("model", "claude-fake")
+
+    if not body.get("stream"):
+        # Plain responses still pay for generating every token
+        await asyncio.sleep(config.token_delay * usage["output_tokens"])
+        return JSONResponse(content={
+            "id": message_id,
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [content_block],
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage
+        })
+
+    stats["streams"] += 1
+    break_stream = random.random() < config.stream_break_rate
+
+    async def events():
+        start_usage = dict(usage, output_tokens=1)
+        yield sse("message_start", {
+            "type": "message_start",
+            "message": {
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [],
+                "stop_reason": None,
+                "stop_sequence": None,
+                "usage": start_usage
+            }
+        })
+        start_block = dict(content_block, input={}) if tool_name else {"type": "text", "text": ""}
+        yield sse("content_block_start", {"type": "content_block_start", "index": 0, "content_block": start_block})
+        yield sse("ping", {"type": "ping"})
+
+        chunks = chunk_text(text)
+        for i, chunk in enumerate(chunks):
+            if break_stream and i == len(chunks) // 2:
+                stats["errors"] += 1
+                yield sse("error", {"type": "error", "error": {"type": "overloaded_error", "message": "Injected mid-stream error"}})
+                return
+            if tool_name:
+                delta = {"type": "input_json_delta", "partial_json": chunk}
+            else:
+                delta = {"type": "text_delta", "text": chunk}
+            yield sse("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta})
+            await asyncio.sleep(config.token_delay)
+
+        yield sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+        yield sse("message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+            "usage": {"output_tokens": usage["output_tokens"]}
+        })
+        yield sse("message_stop", {"type": "message_stop"})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def get_stats():
+    """Request, stream, error and hang counters since startup"""
+    return stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Anthropic Messages API for offline testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="lognormal",
+                        help="Distribution of time before the first token")
+    parser.add_argument("--latency-median", type=float, default=1.0, help="Seconds (fixed value or lognormal median)")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Lognormal spread; larger means a longer tail")
+    parser.add_argument("--latency-min", type=float, default=0.0, help="Lower bound in seconds")
+    parser.add_argument("--latency-max", type=float, default=30.0, help="Upper bound in seconds")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, nargs="+", default=[529, 500, 429],
+                        help="Status codes picked from for injected errors")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that never answer")
+    parser.add_argument("--stream-break-rate", type=float, default=0.0,
+                        help="Fraction of streams that fail halfway through")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for repeatable runs")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = FakeConfig(args)
+    if config.seed is not None:
+        random.seed(config.seed)
+    print(f"🧪 Fake Anthropic API listening on http://{args.host}:{args.port}")
+    print(f"   latency={config.latency} median={config.latency_median}s token_delay={config.token_delay}s "
+          f"error_rate={config.error_rate} hang_rate={config.hang_rate}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
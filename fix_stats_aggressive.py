@@ -17,6 +17,7 @@ from app.models.user import User
 from app.models.activity import ActivitySession
 from app.models.scoring import ActivityScore
 from app.models.daily_stats import DailyStats
+from app.services.balance_service import BalanceService
 
 def clear_and_recalculate_all_stats():
     """Clear all daily stats and recalculate from actual scored activities"""
@@ -28,6 +29,7 @@ def clear_and_recalculate_all_stats():
         # Get all users
         users = db.query(User).all()
         print(f"Found {len(users)} users")
+        balance_service = BalanceService()
         
         for user in users:
             print(f"\n👤 Processing user: {user.name} (ID: {user.id})")
@@ -77,6 +79,9 @@ def clear_and_recalculate_all_stats():
                 total_points += daily_points
                 print(f"    📅 {activity_date}: {len(activities)} activities, {daily_points} points")
             
+            # Points earned follow the new daily stats
+            balance_service.rebuild(db, user.id)
+            
             # Commit changes
             db.commit()
             print(f"  ✅ Total points after fix: {total_points}")
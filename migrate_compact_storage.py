@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Utility script to convert activity sessions to compact storage.
+The rendered prompt is replaced by the template variables it was rendered from, and
+each activity's raw_content moves into the content-addressed content_blobs table.
+Prompts are matched against the current template, then against the legacy layout used
+before the system prefix was split out (rendered from the current or the default
+template file). Prompts neither can reproduce exactly are left as they are.
+Safe to run more than once.
+"""
+
+import sys
+import os
+import configparser
+from sqlalchemy import or_, func
+from sqlalchemy.orm import undefer_group
+
+# Add the app directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal, run_migrations
+from app.models.activity import ActivitySession
+from app.services.activity_service import ActivityService
+from app.services.template_service import DEFAULT_TEMPLATE, LEGACY_LAYOUT
+
+BATCH_SIZE = 200
+
+
+def match_prompt(template_service, prompt: str):
+    """
+    (variables, template id, template source) of a stored prompt, or None. A match only
+    counts when rebuilding the prompt from it gives back exactly the same text.
+    """
+    variables = template_service.match_prompt(prompt)
+    if variables is not None and \
+            template_service.join_prompt_parts(template_service.populate_template_parts(variables)) == prompt:
+        return variables, template_service.template_id, template_service.source
+
+    for source in dict.fromkeys([template_service.source, DEFAULT_TEMPLATE]):
+        variables = template_service.match_legacy_prompt(prompt, source)
+        if variables is not None and template_service.render_source(source, variables, LEGACY_LAYOUT) == prompt:
+            return variables, template_service.source_template_id(source, LEGACY_LAYOUT), source
+    return None
+
+
+def render_baseline_prompt(source: str, variables: dict) -> str:
+    """A prompt exactly as TemplateService.populate_template rendered it before the system prefix split"""
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_string(source)
+    parts = [
+        f"System Role: {config['base_prompt']['system_role']}",
+        f"Target Audience: {config['base_prompt']['target_audience']}",
+        f"Confidence Level: {config['base_prompt']['confidence_level']}",
+        "",
+        "ACTIVITY REQUIREMENTS:",
+        f"- {config['activity_framework']['create_instruction'].format(**variables)}",
+        f"- {config['activity_framework']['materials_instruction'].format(**variables)}",
+        f"- {config['activity_framework']['learning_focus'].format(**variables)}",
+        f"- {config['activity_framework']['theme_integration']}",
+        "",
+        "OUTPUT FORMAT:"
+    ]
+    parts += [f"- {value}" for value in config['output_structure'].values()]
+    parts += ["", "SAFETY AND QUALITY:"]
+    parts += [f"- {value}" for value in config['safety_and_quality'].values()]
+    parts += [
+        "",
+        "UNIQUENESS REQUIREMENTS:",
+        f"- {config['uniqueness_requirement']['avoid_repetition'].format(**variables)}",
+        f"- {config['uniqueness_requirement']['ensure_variety']}",
+        "",
+        "Please generate a complete activity following all the above requirements."
+    ]
+    return "\n".join(parts)
+
+
+def check_legacy_round_trip(db, activity_service) -> bool:
+    """Compact a prompt rendered the pre-split way and check get_prompt rebuilds it exactly"""
+    variables = {
+        "selected_category": "Arts & Crafts",
+        "selected_duration": "30",
+        "selected_materials": "paper, glue, {glitter}",
+        "selected_objectives": "Creativity, Fine motor skills",
+        "min_materials_count": "2",
+        "recent_activities_summary": "Rocket Builder\nStar Map"
+    }
+    prompt = render_baseline_prompt(DEFAULT_TEMPLATE, variables)
+    session = ActivitySession(anthropic_prompt=prompt, generated_activity={})
+    try:
+        converted = compact_session(db, activity_service, session)
+        return converted["prompt"] and activity_service.get_prompt(db, session) == prompt
+    finally:
+        # The check must leave nothing behind, not even the template source
+        db.rollback()
+
+
+def compact_session(db, activity_service, session) -> dict:
+    """Compact one session in place; returns what was converted"""
+    converted = {"prompt": False, "activity": False}
+    template_service = activity_service.template_service
+
+    if session.anthropic_prompt:
+        matched = match_prompt(template_service, session.anthropic_prompt)
+        if matched is not None:
+            session.prompt_variables, session.prompt_template_id, source = matched
+            activity_service.content_store.put(db, source)
+            session.anthropic_prompt = None
+            converted["prompt"] = True
+
+    if "raw_content" in (session.generated_activity or {}):
+        session.generated_activity, session.raw_content_digest = activity_service._compact_activity(
+            db, session.generated_activity
+        )
+        converted["activity"] = True
+
+    if any("raw_content" in alternate for alternate in session.alternate_activities or []):
+        session.alternate_activities = [
+            dict(activity, raw_content_digest=digest)
+            for activity, digest in (
+                activity_service._compact_activity(db, alternate) for alternate in session.alternate_activities
+            )
+        ]
+    return converted
+
+
+def migrate_compact_storage():
+    """Compact every activity session still holding a rendered prompt or raw_content"""
+    print("🗜️  Compacting activity session storage...")
+
+    # Adds the content_blobs table and the new activity_sessions columns
+    run_migrations()
+    activity_service = ActivityService()
+    db = SessionLocal()
+
+    try:
+        if not check_legacy_round_trip(db, activity_service):
+            print("❌ A prompt in the legacy layout doesn't round-trip, nothing was changed")
+            return
+        print("  ✅ Legacy layout prompts round-trip")
+
+        before = db.query(
+            func.coalesce(func.sum(func.length(ActivitySession.anthropic_prompt)), 0)
+            + func.coalesce(func.sum(func.length(ActivitySession.generated_activity)), 0)
+        ).scalar()
+
+        prompts, activities, kept, last_id = 0, 0, 0, 0
+        while True:
+            sessions = db.query(ActivitySession).options(undefer_group("content")).filter(
+                ActivitySession.id > last_id,
+                or_(ActivitySession.anthropic_prompt.isnot(None), ActivitySession.raw_content_digest.is_(None))
+            ).order_by(ActivitySession.id).limit(BATCH_SIZE).all()
+            if not sessions:
+                break
+
+            for session in sessions:
+                converted = compact_session(db, activity_service, session)
+                prompts += converted["prompt"]
+                activities += converted["activity"]
+                kept += bool(session.anthropic_prompt)
+            last_id = sessions[-1].id
+            db.commit()
+            print(f"  ✅ Processed sessions up to ID {last_id}")
+
+        after = db.query(
+            func.coalesce(func.sum(func.length(ActivitySession.anthropic_prompt)), 0)
+            + func.coalesce(func.sum(func.length(ActivitySession.generated_activity)), 0)
+        ).scalar()
+        blobs = activity_service.content_store.get_stats(db)
+
+        print(f"\n📝 Prompts replaced by template variables: {prompts}")
+        print(f"⚠️  Prompts kept (no template reproduces them): {kept}")
+        print(f"📦 Activity bodies moved to content_blobs: {activities}")
+        print(f"💾 Session prompt/activity bytes: {before} -> {after}")
+        print(f"🗄️  Content blobs: {blobs['blobs']} holding {blobs['bytes']} bytes in {blobs['stored_bytes']}")
+
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {str(e)}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    print("🗜️  Compact Activity Storage Migration")
+    print("=" * 50)
+    migrate_compact_storage()
@@ -2,7 +2,7 @@
 
 # Step 0: Check if the app is already running and stop it if needed
 APP_PATTERN="uvicorn app.main:app"
-echo "[0/3] Checking for existing Uvicorn app process..."
+echo "[0/4] Checking for existing Uvicorn app process..."
 PIDS=$(ps aux | grep "$APP_PATTERN" | grep -v grep | awk '{print $2}')
 if [ -n "$PIDS" ]; then
     echo "Existing Uvicorn app found (PID(s): $PIDS). Stopping it..."
@@ -19,17 +19,22 @@ fi
 
 # Step 1: Change directory
 APP_DIR="/home/pi/CreativeSummerAcademy"
-echo "[1/3] Changing directory to $APP_DIR..."
+echo "[1/4] Changing directory to $APP_DIR..."
 cd "$APP_DIR" || { echo "Failed to cd to $APP_DIR"; exit 1; }
-echo "[1/3] Directory changed successfully."
+echo "[1/4] Directory changed successfully."
 
 # Step 2: Activate virtual environment
-echo "[2/3] Activating virtual environment..."
+echo "[2/4] Activating virtual environment..."
 source .venv/bin/activate || { echo "Failed to activate virtual environment"; exit 1; }
-echo "[2/3] Virtual environment activated."
+echo "[2/4] Virtual environment activated."
 
-# Step 3: Run the application in the background with nohup
-echo "[3/3] Starting the application with Uvicorn in the background..."
+# Step 3: Bring the database schema up to date
+echo "[3/4] Running database migrations..."
+python -m alembic upgrade head || { echo "Database migration failed"; exit 1; }
+echo "[3/4] Database is up to date."
+
+# Step 4: Run the application in the background with nohup
+echo "[4/4] Starting the application with Uvicorn in the background..."
 echo "Command: nohup python -m uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 > app.log 2>&1 &"
 nohup python -m uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 > app.log 2>&1 &
 echo "Uvicorn app started in the background (PID: $!). Log: app.log" 
\ No newline at end of file
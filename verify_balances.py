@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Utility script to check the user_balances table against each child's history:
+points earned (daily stats), points spent (reimbursements) and scored activities.
+Reports any child whose stored balance has drifted; --rebuild corrects them.
+
+    python verify_balances.py
+    python verify_balances.py --rebuild
+"""
+
+import sys
+import os
+import argparse
+
+# Add the app directory to the path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import SessionLocal
+from app.services.balance_service import BalanceService
+
+
+def verify_balances(rebuild: bool = False) -> bool:
+    """Compare stored balances with history; returns True if they match (or were rebuilt to)"""
+    print("🔍 Checking points balances against history...")
+
+    db = SessionLocal()
+    try:
+        drift = BalanceService().verify(db, rebuild=rebuild)
+        for entry in drift:
+            print(f"\n⚠️  User {entry['user_id']}:")
+            for key, expected in entry["expected"].items():
+                actual = entry["actual"][key]
+                marker = "  " if actual == expected else "❌"
+                print(f"  {marker} {key}: stored {actual}, history {expected}")
+
+        if not drift:
+            print("✅ All balances match their history")
+        elif rebuild:
+            db.commit()
+            print(f"\n✅ Rebuilt {len(drift)} balance(s)")
+        else:
+            print(f"\n❌ {len(drift)} balance(s) drifted; run with --rebuild to correct them")
+        return not drift or rebuild
+
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error: {str(e)}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify and rebuild children's points balances")
+    parser.add_argument("--rebuild", action="store_true", help="correct balances that have drifted")
+    args = parser.parse_args()
+
+    print("⚡ Points Balance Check")
+    print("=" * 50)
+    sys.exit(0 if verify_balances(args.rebuild) else 1)